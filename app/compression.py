@@ -0,0 +1,155 @@
+from __future__ import annotations
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import LargeBinary, select
+from sqlalchemy.types import TypeDecorator
+
+# One-byte format tag at the start of every stored value
+_RAW = b"r"
+_ZLIB = b"z"
+_DICT = b"d"  # followed by a 4-byte dictionary id
+MIN_COMPRESS_BYTES = 64
+MAX_DICT_BYTES = 32 * 1024
+
+
+class DictionaryRegistry:
+	"""zlib preset dictionaries by id, plus the one currently used per column.
+
+	Dictionaries are immutable once stored, since rows reference them by id.
+	Unknown ids are fetched from the compression_dictionaries table on first use.
+	"""
+
+	def __init__(self):
+		self._by_id: Dict[int, bytes] = {}
+		self._active: Dict[str, int] = {}
+		self._lock = threading.Lock()
+
+	def register(self, dict_id: int, data: bytes, column: Optional[str] = None) -> None:
+		with self._lock:
+			self._by_id[dict_id] = data
+			if column:
+				self._active[column] = dict_id
+
+	def active_for(self, column: str) -> tuple[int, bytes] | None:
+		dict_id = self._active.get(column)
+		return (dict_id, self._by_id[dict_id]) if dict_id is not None else None
+
+	def get(self, dict_id: int) -> bytes:
+		data = self._by_id.get(dict_id)
+		if data is None:
+			self._fetch(dict_id)
+			data = self._by_id[dict_id]
+		return data
+
+	def _fetch(self, dict_id: int) -> None:
+		from app.models import CompressionDictionary
+
+		with self._bind().connect() as conn:
+			data = conn.execute(select(CompressionDictionary.data).where(CompressionDictionary.id == dict_id)).scalar_one()
+		self.register(dict_id, data)
+
+	def load(self, bind=None) -> int:
+		# Newest dictionary per column becomes the active one for writes
+		from app.models import CompressionDictionary
+
+		t = CompressionDictionary.__table__
+		with (bind or self._bind()).connect() as conn:
+			rows = conn.execute(select(t.c.id, t.c.column, t.c.data).order_by(t.c.id)).all()
+		for dict_id, column, data in rows:
+			self.register(dict_id, data, column)
+		return len(rows)
+
+	@staticmethod
+	def _bind():
+		from app.db import engine
+
+		return engine
+
+
+registry = DictionaryRegistry()
+
+
+def compress(text: str, column: Optional[str] = None, level: int = 6) -> bytes:
+	raw = text.encode("utf-8")
+	if len(raw) < MIN_COMPRESS_BYTES:
+		return _RAW + raw
+	active = registry.active_for(column) if column else None
+	if active is not None:
+		dict_id, zdict = active
+		c = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict)
+		packed = _DICT + dict_id.to_bytes(4, "big") + c.compress(raw) + c.flush()
+	else:
+		c = zlib.compressobj(level, zlib.DEFLATED, -15)
+		packed = _ZLIB + c.compress(raw) + c.flush()
+	# Never store something bigger than the input
+	return packed if len(packed) < len(raw) + 1 else _RAW + raw
+
+
+def decompress(data: bytes | str) -> str:
+	if isinstance(data, str):
+		# Legacy row written before the column was compressed
+		return data
+	data = bytes(data)
+	tag = data[:1]
+	if tag == _RAW:
+		return data[1:].decode("utf-8")
+	if tag == _ZLIB:
+		return zlib.decompressobj(-15).decompress(data[1:]).decode("utf-8")
+	if tag == _DICT:
+		zdict = registry.get(int.from_bytes(data[1:5], "big"))
+		return zlib.decompressobj(-15, zdict=zdict).decompress(data[5:]).decode("utf-8")
+	return data.decode("utf-8")
+
+
+def train_dictionary(samples: Iterable[str], size: int = MAX_DICT_BYTES) -> bytes:
+	"""Build a zlib preset dictionary from representative values.
+
+	Frequent lines and tokens are packed with the most common last, where
+	deflate can reach them with the shortest distances.
+	"""
+	counts: Counter = Counter()
+	for text in samples:
+		for line in set(text.splitlines()):
+			if len(line) >= 4:
+				counts[line] += 1
+		for token in set(text.replace(",", " ").replace('"', " ").split()):
+			if len(token) >= 4:
+				counts[token] += 1
+	chosen = []
+	total = 0
+	for piece, n in counts.most_common():
+		if n < 2:
+			break
+		blob = piece.encode("utf-8")
+		if total + len(blob) + 1 > size:
+			continue
+		chosen.append(blob)
+		total += len(blob) + 1
+	return b"\n".join(reversed(chosen))
+
+
+class CompressedText(TypeDecorator):
+	"""Text stored compressed; reads and writes look like plain str to the ORM.
+
+	``column`` names the dictionary slot (e.g. "email_sends.body").
+	"""
+
+	impl = LargeBinary
+	cache_ok = True
+
+	def __init__(self, column: str, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.column = column
+
+	def process_bind_param(self, value, dialect):
+		if value is None:
+			return None
+		return compress(value, self.column)
+
+	def process_result_value(self, value, dialect):
+		if value is None:
+			return None
+		return decompress(value)
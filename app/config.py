@@ -1,4 +1,5 @@
 import os
+import socket
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,3 +21,97 @@ WARMUP_RAMP_DAYS = int(os.getenv("WARMUP_RAMP_DAYS", "30"))
 
 # Dashboard settings
 DASHBOARD_TITLE = os.getenv("DASHBOARD_TITLE", "Mystrika-Inspired Outreach Simulator")
+
+# Sending pipeline (select -> render -> persist -> deliver -> record)
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "64"))
+PIPELINE_RENDER_WORKERS = int(os.getenv("PIPELINE_RENDER_WORKERS", "2"))
+PIPELINE_PERSIST_WORKERS = int(os.getenv("PIPELINE_PERSIST_WORKERS", "1"))
+PIPELINE_DELIVER_WORKERS = int(os.getenv("PIPELINE_DELIVER_WORKERS", "4"))
+PIPELINE_RECORD_WORKERS = int(os.getenv("PIPELINE_RECORD_WORKERS", "1"))
+
+# Scheduler tick supervision / circuit breaker
+# Ticks are scheduled adaptively: back to back while work is due, at most TICK_INTERVAL_SECONDS apart when idle
+TICK_INTERVAL_SECONDS = int(os.getenv("TICK_INTERVAL_SECONDS", "10"))
+TICK_MIN_SECONDS = float(os.getenv("TICK_MIN_SECONDS", "1"))
+# Cycles are sized from measured per-item cost to take about this long
+TICK_TARGET_CYCLE_SECONDS = float(os.getenv("TICK_TARGET_CYCLE_SECONDS", "5"))
+TICK_BREAKER_THRESHOLD = int(os.getenv("TICK_BREAKER_THRESHOLD", "3"))
+TICK_BACKOFF_MAX_SECONDS = int(os.getenv("TICK_BACKOFF_MAX_SECONDS", "600"))
+TICK_ERROR_ROWS_PER_CYCLE = int(os.getenv("TICK_ERROR_ROWS_PER_CYCLE", "20"))
+
+# Admin endpoints and on-demand profiling
+# Unset keeps the admin endpoints (profiling, bounce ingest) closed
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Bounce handling
+SOFT_BOUNCE_LIMIT = int(os.getenv("SOFT_BOUNCE_LIMIT", "3"))
+
+# Public links embedded in messages (unsubscribe, tracking)
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://localhost:8000")
+# Required: signs unsubscribe links and (via a derived key) tracking tokens; the app will not start without it
+UNSUBSCRIBE_SECRET = os.getenv("UNSUBSCRIBE_SECRET", "")
+UNSUBSCRIBE_FLUSH_SECONDS = int(os.getenv("UNSUBSCRIBE_FLUSH_SECONDS", "2"))
+# Optional mailto: target offered alongside the URL in List-Unsubscribe
+UNSUBSCRIBE_MAILTO = os.getenv("UNSUBSCRIBE_MAILTO", "")
+
+# MX resolution: "relay" sends everything via SMTP_HOST, "dns" resolves live, "static" reads MX_ZONE_FILE
+MX_BACKEND = os.getenv("MX_BACKEND", "relay")
+MX_ZONE_FILE = os.getenv("MX_ZONE_FILE", "")
+MX_CACHE_PATH = os.getenv("MX_CACHE_PATH", "mx_cache.json")
+MX_NEGATIVE_TTL = int(os.getenv("MX_NEGATIVE_TTL", "300"))
+
+# Per-destination-domain delivery limits; DOMAIN_LIMITS overrides as "domain=connections:per_minute,..."
+DOMAIN_MAX_CONNECTIONS = int(os.getenv("DOMAIN_MAX_CONNECTIONS", "2"))
+DOMAIN_MAX_PER_MINUTE = float(os.getenv("DOMAIN_MAX_PER_MINUTE", "120"))
+DOMAIN_BURST = int(os.getenv("DOMAIN_BURST", "10"))
+DOMAIN_LIMITS = os.getenv("DOMAIN_LIMITS", "")
+
+# Delivery-attempt log
+ATTEMPT_LOG_BATCH = int(os.getenv("ATTEMPT_LOG_BATCH", "500"))
+
+# Engagement events are stored in monthly partitions; 0 keeps every month
+EVENT_RETENTION_MONTHS = int(os.getenv("EVENT_RETENTION_MONTHS", "0"))
+
+# Tracking-event ingestion: accepted in memory, spooled to EVENT_SPOOL_DIR ("" = memory only), bulk-inserted
+EVENT_SPOOL_DIR = os.getenv("EVENT_SPOOL_DIR", "event_spool")
+EVENT_BUFFER_MAX = int(os.getenv("EVENT_BUFFER_MAX", "100000"))
+EVENT_FLUSH_BATCH = int(os.getenv("EVENT_FLUSH_BATCH", "2000"))
+EVENT_FLUSH_SECONDS = float(os.getenv("EVENT_FLUSH_SECONDS", "1"))
+
+# Click tracking: campaign links are rewritten to PUBLIC_BASE_URL/c/<code>/<token>
+CLICK_TRACKING = os.getenv("CLICK_TRACKING", "true").lower() == "true"
+LINK_CACHE_SIZE = int(os.getenv("LINK_CACHE_SIZE", "10000"))
+
+# Per-campaign / per-sender stats: counter deltas are buffered and upserted every STATS_FLUSH_SECONDS
+STATS_FLUSH_SECONDS = int(os.getenv("STATS_FLUSH_SECONDS", "5"))
+STATS_PAGE_SIZE = int(os.getenv("STATS_PAGE_SIZE", "30"))
+
+# Live dashboard: one shared snapshot pushed over SSE; DB counts re-read every DASHBOARD_RESYNC_SECONDS
+DASHBOARD_PUSH_SECONDS = float(os.getenv("DASHBOARD_PUSH_SECONDS", "2"))
+DASHBOARD_RESYNC_SECONDS = float(os.getenv("DASHBOARD_RESYNC_SECONDS", "60"))
+
+# HTTP response cache: entries live until the send-path counters move or this many seconds pass
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+
+# Daily sender allowances are spread evenly over this local-time window (TIMEZONE)
+SEND_WINDOW_START_HOUR = int(os.getenv("SEND_WINDOW_START_HOUR", "0"))
+SEND_WINDOW_END_HOUR = int(os.getenv("SEND_WINDOW_END_HOUR", "24"))
+
+# Recipient-local sending hours: a recipient is only selected while its own timezone is inside this window
+RECIPIENT_WINDOW_START_HOUR = int(os.getenv("RECIPIENT_WINDOW_START_HOUR", "0"))
+RECIPIENT_WINDOW_END_HOUR = int(os.getenv("RECIPIENT_WINDOW_END_HOUR", "24"))
+RECIPIENT_ZONES_REFRESH_SECONDS = float(os.getenv("RECIPIENT_ZONES_REFRESH_SECONDS", "3600"))
+
+# Sharding: recipients are split into SHARD_COUNT slices by a stable hash of their email (run
+# shard_recipients.py after changing it). Each worker holds DB leases on its slices; a lease
+# not renewed within LEASE_SECONDS is taken over by another worker. Unsharded, a single
+# leader lease lets exactly one process run send cycles however many are started
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+LEASE_SECONDS = float(os.getenv("LEASE_SECONDS", "30"))
+LEASE_HEARTBEAT_SECONDS = float(os.getenv("LEASE_HEARTBEAT_SECONDS", "10"))
+# An interrupted claim is resumed at most this many times, then marked failed, so a
+# message that keeps killing its cycle (or its worker) cannot come back forever
+MAX_CLAIM_RESUMES = int(os.getenv("MAX_CLAIM_RESUMES", "3"))
@@ -20,3 +20,33 @@ def get_db():
 		yield db
 	finally:
 		db.close()
+
+
+def add_missing_columns(bind=engine, metadata=None) -> list[str]:
+	# create_all() never alters existing tables; add new nullable/defaulted columns in place
+	from sqlalchemy import inspect, literal, text
+
+	inspector = inspect(bind)
+	added: list[str] = []
+	with bind.begin() as conn:
+		for table in (metadata or Base.metadata).sorted_tables:
+			if not inspector.has_table(table.name):
+				continue
+			existing = {c["name"] for c in inspector.get_columns(table.name)}
+			for column in table.columns:
+				if column.name in existing:
+					continue
+				ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=bind.dialect)}"
+				default = getattr(column.default, "arg", None)
+				if isinstance(default, (bool, int, float, str)):
+					# Rendered by the dialect: Postgres wants TRUE/FALSE for BOOLEAN, SQLite 1/0
+					value = literal(default, column.type).compile(dialect=bind.dialect, compile_kwargs={"literal_binds": True})
+					ddl += f" DEFAULT {value}"
+				conn.execute(text(ddl))
+				added.append(f"{table.name}.{column.name}")
+	# Indexes declared later (often on the columns just added) are not created by create_all() either
+	for table in (metadata or Base.metadata).sorted_tables:
+		if inspector.has_table(table.name):
+			for index in table.indexes:
+				index.create(bind, checkfirst=True)
+	return added
@@ -1,17 +1,40 @@
-from fastapi import FastAPI, Depends, Request
-from fastapi.responses import HTMLResponse
+import hmac
+import json
+from urllib.parse import urlencode
+from fastapi import FastAPI, Depends, Request, Header, HTTPException, Query
+from fastapi.responses import HTMLResponse, Response, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-from app.db import Base, engine, get_db
-from app.models import SenderAccount, Recipient, Campaign, EmailSend, EngagementEvent
-from app.config import DASHBOARD_TITLE
-from app.scheduler import start_scheduler
+from pydantic import BaseModel
+from app.db import Base, engine, get_db, add_missing_columns, SessionLocal
+from app.models import SenderAccount, Campaign
+from app.config import DASHBOARD_TITLE, ADMIN_TOKEN, STATS_PAGE_SIZE
+from app.scheduler import start_scheduler, supervisor, flush_unsubscribes, flush_stats, release_leases
+from app.services.metrics import REGISTRY, CONTENT_TYPE
+from app.services.profiling import profiler
+from app.services.bounces import parse_dsn_bytes
+from app.services.suppression import apply_bounces
+from app.services.compliance import require_secret, verify_unsubscribe_token
+from app.services.unsubscribe import unsubscribes
+from app.services.mx import resolver
+from app.services.events import events
+from app.services.ingest import tracking_events, BufferFull
+from app.services.tracking import verify_tracking_token
+from app.services.links import links
+from app.services.stats import stats, CAMPAIGN, SENDER, STATS_FLUSHES
+from app.services.cache import response_cache
+from app.services.live import DashboardFeed
+from app.services.leases import coordinator, leader
+from app.compression import registry as compression_dictionaries
 from pathlib import Path
 
 app = FastAPI(title=DASHBOARD_TITLE)
 
 # Ensure database tables exist
 Base.metadata.create_all(bind=engine)
+add_missing_columns(engine)
+
+feed = DashboardFeed(SessionLocal)
 
 # Templates
 TEMPLATES_DIR = Path(__file__).parent / "templates"
@@ -20,53 +43,199 @@ templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
 @app.on_event("startup")
 async def on_startup():
+	# Refuse to run with a forgeable signing secret
+	require_secret()
+	resolver.load()
+	compression_dictionaries.load()
+	events.prepare()
+	tracking_events.start(SessionLocal)
+	feed.start()
 	start_scheduler()
 
 
+@app.on_event("shutdown")
+async def on_shutdown():
+	feed.stop()
+	flush_unsubscribes()
+	tracking_events.stop(SessionLocal)
+	flush_stats()
+	release_leases()
+	resolver.save()
+
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request, db: Session = Depends(get_db)):
-	campaigns = db.query(Campaign).all()
-	senders = db.query(SenderAccount).all()
-	recipients_count = db.query(Recipient).count()
-	sends = db.query(EmailSend).count()
-	opens = db.query(EngagementEvent).filter(EngagementEvent.type == "opened").count()
-	replies = db.query(EngagementEvent).filter(EngagementEvent.type == "replied").count()
-	bounces = db.query(EngagementEvent).filter(EngagementEvent.type == "bounced").count()
-	unsubs = db.query(EngagementEvent).filter(EngagementEvent.type == "unsubscribed").count()
-
-	# Success % as inbox placement over total sends where placement known
-	inbox_known = db.query(EmailSend).filter(EmailSend.inbox_placement != None).count()
-	inbox_success = db.query(EmailSend).filter(EmailSend.inbox_placement == True).count()
-	success_pct = round((inbox_success / inbox_known) * 100, 2) if inbox_known else None
-
-	return templates.TemplateResponse(
-		"index.html",
-		{
-			"request": request,
-			"title": DASHBOARD_TITLE,
-			"campaigns": campaigns,
-			"senders": senders,
-			"recipients_count": recipients_count,
-			"sends": sends,
-			"opens": opens,
-			"replies": replies,
-			"bounces": bounces,
-			"unsubs": unsubs,
-			"success_pct": success_pct,
-		},
+	def render():
+		# Counts come from the shared live snapshot, not per-request COUNT queries
+		return templates.TemplateResponse(
+			"index.html",
+			{
+				"request": request,
+				"title": DASHBOARD_TITLE,
+				"campaigns": db.query(Campaign).all(),
+				"senders": db.query(SenderAccount).all(),
+				**feed.snapshot(),
+			},
+		)
+
+	return response_cache.serve(request, render)
+
+
+@app.get("/dashboard/stream")
+async def dashboard_stream(request: Request):
+	return StreamingResponse(
+		feed.stream(request.is_disconnected),
+		media_type="text/event-stream",
+		headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
 	)
 
 
 @app.get("/health")
 async def health():
-	return {"status": "ok"}
+	tick = supervisor.status()
+	tick["leader"] = leader.is_leader
+	if coordinator.enabled:
+		tick["shards"] = coordinator.shards()
+	return {"status": "degraded" if tick["consecutive_failures"] else "ok", "scheduler": tick}
+
+
+@app.get("/metrics")
+async def metrics():
+	return Response(content=REGISTRY.expose(), media_type=CONTENT_TYPE)
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)):
+	# Admin endpoints stay closed until ADMIN_TOKEN is configured
+	if not ADMIN_TOKEN or not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+		raise HTTPException(status_code=403, detail="admin token required")
+
+
+@app.post("/admin/profile", dependencies=[Depends(require_admin)])
+async def arm_profiler(cycles: int = 1):
+	# Profile the next N scheduler cycles; results land in PROFILE_DIR as .pstats
+	profiler.arm(cycles)
+	return profiler.status()
+
+
+@app.get("/admin/profile", dependencies=[Depends(require_admin)])
+async def profiler_status():
+	return profiler.status()
+
+
+@app.post("/bounces", dependencies=[Depends(require_admin)])
+async def post_bounce(request: Request, db: Session = Depends(get_db)):
+	# Body is one raw RFC 3464 delivery status notification (message/rfc822)
+	bounces = parse_dsn_bytes(await request.body())
+	result = apply_bounces(db, bounces, record_events=True) if bounces else {"suppressed": 0, "soft": 0}
+	return {"bounces": [{"email": b.email, "kind": b.kind, "status": b.status} for b in bounces], **result}
+
+
+def _accept_unsubscribe(token: str) -> dict:
+	rid = verify_unsubscribe_token(token)
+	if rid is None:
+		raise HTTPException(status_code=400, detail="invalid unsubscribe token")
+	unsubscribes.add(rid)
+	return {"status": "unsubscribed"}
+
+
+@app.get("/unsubscribe", response_class=HTMLResponse)
+async def unsubscribe_page(request: Request, t: str):
+	# GET only asks: link scanners and prefetchers follow links, so opting out takes a POST (RFC 8058)
+	if verify_unsubscribe_token(t) is None:
+		raise HTTPException(status_code=400, detail="invalid unsubscribe token")
+	return templates.TemplateResponse("unsubscribe.html", {"request": request, "action": f"/unsubscribe?{urlencode({'t': t})}"})
+
+
+@app.post("/unsubscribe")
+async def unsubscribe(t: str):
+	# The confirmation form, and RFC 8058 one-click: mailbox providers POST "List-Unsubscribe=One-Click" here
+	return _accept_unsubscribe(t)
+
+
+# Smallest transparent GIF, served for every open-pixel request
+_PIXEL = bytes.fromhex("47494638396101000100800000000000ffffff21f90401000000002c00000000010001000002024401003b")
+TRACKED_TYPES = {"opened", "clicked", "replied"}
+
+
+class TrackedEvent(BaseModel):
+	t: str
+	type: str
+	k: str | None = None
+	details: str | None = None
+
+
+@app.get("/t/open")
+async def open_pixel(t: str = ""):
+	ids = verify_tracking_token(t)
+	if ids is not None:
+		try:
+			tracking_events.add(ids[0], ids[1], "opened")
+		except BufferFull:
+			# Never break the image; the rejection shows up in metrics
+			pass
+	return Response(content=_PIXEL, media_type="image/gif", headers={"Cache-Control": "no-store"})
+
+
+@app.post("/t/events")
+async def post_events(batch: list[TrackedEvent]):
+	# Callers retry on 503 with the same k values; duplicates are dropped at flush time
+	accepted = []
+	for e in batch:
+		ids = verify_tracking_token(e.t)
+		if ids is None or e.type not in TRACKED_TYPES:
+			raise HTTPException(status_code=400, detail="invalid tracking token or event type")
+		try:
+			accepted.append(tracking_events.add(ids[0], ids[1], e.type, e.details, e.k))
+		except BufferFull:
+			raise HTTPException(status_code=503, detail="event buffer full", headers={"Retry-After": "1"})
+	return {"accepted": accepted}
+
+
+@app.get("/c/{code}/{token}")
+async def click(code: str, token: str):
+	url = links.resolve(code)
+	if url is None:
+		raise HTTPException(status_code=404, detail="unknown link")
+	ids = verify_tracking_token(token)
+	if ids is not None:
+		try:
+			tracking_events.add(ids[0], ids[1], "clicked", details=code)
+		except BufferFull:
+			# The redirect matters more to the recipient than the click record
+			pass
+	return RedirectResponse(url, status_code=302)
+
+
+def _stats_response(request: Request, db: Session, model, kind: str, entity_id: int, page: int, per_page: int) -> Response:
+	def render():
+		if db.get(model, entity_id) is None:
+			raise HTTPException(status_code=404, detail=f"{kind} not found")
+		return Response(
+			content=json.dumps(stats.report(db, kind, entity_id, page, per_page), separators=(",", ":")),
+			media_type="application/json",
+		)
+
+	# stats_daily only changes when the aggregator flushes, so that is the cache version
+	return response_cache.serve(request, render, version=lambda: STATS_FLUSHES.value)
+
+
+@app.get("/api/campaigns/{campaign_id}/stats")
+async def campaign_stats(
+	campaign_id: int,
+	request: Request,
+	page: int = Query(1, ge=1),
+	per_page: int = Query(STATS_PAGE_SIZE, ge=1, le=366),
+	db: Session = Depends(get_db),
+):
+	return _stats_response(request, db, Campaign, CAMPAIGN, campaign_id, page, per_page)
 
 
-@app.get("/unsubscribe")
-async def unsubscribe(rid: int, db: Session = Depends(get_db)):
-	rec = db.query(Recipient).filter(Recipient.id == rid).first()
-	if not rec:
-		return {"status": "not_found"}
-	rec.unsubscribed = True
-	db.commit()
-	return {"status": "unsubscribed", "recipient": rec.email}
+@app.get("/api/senders/{sender_id}/stats")
+async def sender_stats(
+	sender_id: int,
+	request: Request,
+	page: int = Query(1, ge=1),
+	per_page: int = Query(STATS_PAGE_SIZE, ge=1, le=366),
+	db: Session = Depends(get_db),
+):
+	return _stats_response(request, db, SenderAccount, SENDER, sender_id, page, per_page)
@@ -1,7 +1,10 @@
-from datetime import datetime
-from sqlalchemy import Integer, String, Boolean, DateTime, ForeignKey, Text, Float
+from datetime import date, datetime
+from sqlalchemy import Integer, BigInteger, SmallInteger, String, Boolean, Date, DateTime, ForeignKey, Text, Float, LargeBinary, UniqueConstraint, Index
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from app.db import Base
+from app.config import TIMEZONE
+from app.compression import CompressedText
+from app.sharding import default_shard
 
 
 class SenderAccount(Base):
@@ -21,6 +24,10 @@ class SenderAccount(Base):
 
 class Recipient(Base):
 	__tablename__ = "recipients"
+	__table_args__ = (
+		Index("ix_recipients_timezone_id", "timezone", "id"),
+		Index("ix_recipients_shard_timezone_id", "shard", "timezone", "id"),
+	)
 
 	id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
 	email: Mapped[str] = mapped_column(String(255), unique=True, index=True, nullable=False)
@@ -29,6 +36,13 @@ class Recipient(Base):
 	company: Mapped[str | None] = mapped_column(String(255), nullable=True)
 	industry: Mapped[str | None] = mapped_column(String(255), nullable=True)
 	unsubscribed: Mapped[bool] = mapped_column(Boolean, default=False)
+	# Set from the suppressions table (hard bounces, repeated soft bounces)
+	suppressed: Mapped[bool] = mapped_column(Boolean, default=False)
+	soft_bounces: Mapped[int] = mapped_column(Integer, default=0)
+	# IANA zone name; selection only takes recipients whose local sending window is open
+	timezone: Mapped[str] = mapped_column(String(64), default=TIMEZONE)
+	# Stable hash of the email modulo SHARD_COUNT; the worker leasing a shard selects its recipients
+	shard: Mapped[int | None] = mapped_column(SmallInteger, default=default_shard, nullable=True)
 	created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 	events: Mapped[list["EngagementEvent"]] = relationship("EngagementEvent", back_populates="recipient")
@@ -41,22 +55,40 @@ class Campaign(Base):
 	id: Mapped[int] = mapped_column(Integer, primary_key=True)
 	name: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
 	subject_template: Mapped[str] = mapped_column(String(255), nullable=False)
-	body_template: Mapped[str] = mapped_column(Text, nullable=False)
+	body_template: Mapped[str] = mapped_column(CompressedText("campaigns.body_template"), nullable=False)
 	active: Mapped[bool] = mapped_column(Boolean, default=True)
+	# Relative share of each cycle's capacity among active campaigns
+	weight: Mapped[int] = mapped_column(Integer, default=1)
+	# Highest recipient id claimed before per-zone cursors existed; seeds campaign_cursors
+	cursor_recipient_id: Mapped[int] = mapped_column(Integer, default=0)
 	created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 	sends: Mapped[list["EmailSend"]] = relationship("EmailSend", back_populates="campaign")
 
 
+class BodyTemplate(Base):
+	__tablename__ = "body_templates"
+
+	# Content-addressed: one row per distinct template text, shared by all sends
+	id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	sha256: Mapped[str] = mapped_column(String(64), unique=True, index=True, nullable=False)
+	content: Mapped[str] = mapped_column(Text, nullable=False)
+
+
 class EmailSend(Base):
 	__tablename__ = "email_sends"
+	# Opt-outs and DSN bounces are attributed to a recipient's latest send
+	__table_args__ = (Index("ix_email_sends_recipient", "recipient_id", "id"),)
 
 	id: Mapped[int] = mapped_column(Integer, primary_key=True)
 	sender_id: Mapped[int] = mapped_column(Integer, ForeignKey("sender_accounts.id"))
 	recipient_id: Mapped[int] = mapped_column(Integer, ForeignKey("recipients.id"))
 	campaign_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("campaigns.id"), nullable=True)
 	subject: Mapped[str] = mapped_column(String(255))
-	body: Mapped[str] = mapped_column(Text)
+	# Legacy full copy; empty when the body is stored as template + substitution values
+	body: Mapped[str] = mapped_column(CompressedText("email_sends.body"), default="")
+	template_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("body_templates.id"), nullable=True)
+	body_vars: Mapped[str | None] = mapped_column(CompressedText("email_sends.body_vars"), nullable=True)
 	personalization_score: Mapped[float] = mapped_column(Float, default=0.0)
 	spam_score: Mapped[float] = mapped_column(Float, default=0.0)
 	inbox_placement: Mapped[bool | None] = mapped_column(Boolean, nullable=True)
@@ -70,13 +102,145 @@ class EmailSend(Base):
 
 class EngagementEvent(Base):
 	__tablename__ = "engagement_events"
+	# created_at is in the key because Postgres requires the partition column in unique indexes
+	# once the table is partitioned; it therefore only rejects exact replays of a row
+	__table_args__ = (Index("ux_engagement_events_dedup", "dedup_key", "created_at", unique=True),)
 
 	id: Mapped[int] = mapped_column(Integer, primary_key=True)
 	send_id: Mapped[int] = mapped_column(Integer, ForeignKey("email_sends.id"))
 	recipient_id: Mapped[int] = mapped_column(Integer, ForeignKey("recipients.id"))
 	type: Mapped[str] = mapped_column(String(50))
-	details: Mapped[str | None] = mapped_column(Text, nullable=True)
+	details: Mapped[str | None] = mapped_column(CompressedText("engagement_events.details"), nullable=True)
+	# Set by the ingestion buffer so replayed events are inserted at most once
+	dedup_key: Mapped[str | None] = mapped_column(String(32), nullable=True)
 	created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 	send: Mapped[EmailSend] = relationship("EmailSend", back_populates="events")
 	recipient: Mapped[Recipient] = relationship("Recipient", back_populates="events")
+
+
+class TrackedLink(Base):
+	__tablename__ = "tracked_links"
+
+	# One row per distinct URL in a campaign body; code is the public short id
+	id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	campaign_id: Mapped[int] = mapped_column(Integer, ForeignKey("campaigns.id"), index=True)
+	url: Mapped[str] = mapped_column(Text, nullable=False)
+	code: Mapped[str] = mapped_column(String(16), unique=True, index=True, nullable=False)
+	created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class CampaignRecipient(Base):
+	__tablename__ = "campaign_recipients"
+	__table_args__ = (
+		UniqueConstraint("campaign_id", "recipient_id", name="uq_campaign_recipient"),
+		Index("ix_campaign_recipients_state", "campaign_id", "state"),
+	)
+
+	# States: pending (claimed) -> queued (send row written) -> sent | failed; pending | queued -> skipped
+	id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	campaign_id: Mapped[int] = mapped_column(Integer, ForeignKey("campaigns.id"), nullable=False)
+	recipient_id: Mapped[int] = mapped_column(Integer, ForeignKey("recipients.id"), nullable=False)
+	state: Mapped[str] = mapped_column(String(16), default="pending")
+	send_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("email_sends.id"), nullable=True)
+	# Times this claim was picked up again after an interrupted cycle
+	resumes: Mapped[int] = mapped_column(SmallInteger, default=0)
+	updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class CampaignCursor(Base):
+	__tablename__ = "campaign_cursors"
+
+	# Highest recipient id claimed per (campaign, shard, recipient timezone); selection resumes after it.
+	# shard is -1 while sharding is off
+	campaign_id: Mapped[int] = mapped_column(Integer, ForeignKey("campaigns.id"), primary_key=True)
+	shard: Mapped[int] = mapped_column(SmallInteger, primary_key=True, default=-1)
+	timezone: Mapped[str] = mapped_column(String(64), primary_key=True)
+	recipient_id: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class Lease(Base):
+	__tablename__ = "leases"
+
+	# Expiring ownership of a named resource ("worker:<id>", "shard:<n>"); epoch grows on every takeover
+	name: Mapped[str] = mapped_column(String(128), primary_key=True)
+	owner: Mapped[str] = mapped_column(String(128), nullable=False)
+	epoch: Mapped[int] = mapped_column(Integer, default=1)
+	expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+	acquired_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class DailyStats(Base):
+	__tablename__ = "stats_daily"
+	__table_args__ = (UniqueConstraint("kind", "entity_id", "day", name="uq_stats_daily_entity_day"),)
+
+	# Incrementally maintained per campaign and per sender; rebuild_stats.py recomputes from raw rows
+	id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	kind: Mapped[str] = mapped_column(String(16))
+	entity_id: Mapped[int] = mapped_column(Integer)
+	day: Mapped[date] = mapped_column(Date)
+	sends: Mapped[int] = mapped_column(Integer, default=0)
+	delivered: Mapped[int] = mapped_column(Integer, default=0)
+	opens: Mapped[int] = mapped_column(Integer, default=0)
+	clicks: Mapped[int] = mapped_column(Integer, default=0)
+	replies: Mapped[int] = mapped_column(Integer, default=0)
+	bounces: Mapped[int] = mapped_column(Integer, default=0)
+	unsubscribes: Mapped[int] = mapped_column(Integer, default=0)
+	updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class Suppression(Base):
+	__tablename__ = "suppressions"
+
+	id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	email: Mapped[str] = mapped_column(String(255), unique=True, index=True, nullable=False)
+	reason: Mapped[str] = mapped_column(String(50))
+	status: Mapped[str | None] = mapped_column(String(16), nullable=True)
+	detail: Mapped[str | None] = mapped_column(Text, nullable=True)
+	created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class CompressionDictionary(Base):
+	__tablename__ = "compression_dictionaries"
+
+	# zlib preset dictionaries for CompressedText columns; rows are never updated
+	id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	column: Mapped[str] = mapped_column(String(100), index=True)
+	data: Mapped[bytes] = mapped_column(LargeBinary)
+	created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class RelayHost(Base):
+	__tablename__ = "relay_hosts"
+
+	id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	host: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
+
+
+class DeliveryAttempt(Base):
+	__tablename__ = "delivery_attempts"
+
+	# Append-only and deliberately narrow: integer timestamps, codes and ids only
+	id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	send_id: Mapped[int] = mapped_column(Integer, index=True)
+	ts_ms: Mapped[int] = mapped_column(BigInteger)
+	relay_id: Mapped[int] = mapped_column(SmallInteger)
+	attempt: Mapped[int] = mapped_column(SmallInteger, default=1)
+	outcome: Mapped[int] = mapped_column(SmallInteger)
+	smtp_code: Mapped[int | None] = mapped_column(SmallInteger, nullable=True)
+	latency_us: Mapped[int] = mapped_column(Integer)
+
+
+class TickError(Base):
+	__tablename__ = "tick_errors"
+
+	id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	cycle_id: Mapped[str] = mapped_column(String(32), index=True)
+	source: Mapped[str] = mapped_column(String(50))
+	error_class: Mapped[str] = mapped_column(String(255))
+	message: Mapped[str] = mapped_column(Text)
+	stack_trace: Mapped[str] = mapped_column(Text)
+	sender_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+	campaign_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+	consecutive_failures: Mapped[int] = mapped_column(Integer, default=1)
+	created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
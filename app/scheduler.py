@@ -1,28 +1,177 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from sqlalchemy.orm import Session
-from app.db import SessionLocal
+from datetime import datetime, timedelta
+from app.config import TICK_INTERVAL_SECONDS, UNSUBSCRIBE_FLUSH_SECONDS, EVENT_RETENTION_MONTHS, STATS_FLUSH_SECONDS, LEASE_HEARTBEAT_SECONDS
+from app.db import SessionLocal, engine
 from app.services.send import run_sending_cycle
+from app.services.pacing import pacer, capacity, next_tick_delay
+from app.services.pipeline import PipelineError
+from app.services.leases import coordinator, leader
+from app.services.supervisor import TickSupervisor
+from app.services.profiling import profiler
+from app.services.unsubscribe import unsubscribes
+from app.services.stats import stats
+from app.services.metrics import count_error
+from app.services.mx import resolver
+from app.services.events import events, month_start
 
+# Guards against starting twice in one process; across processes and hosts the leases decide who sends
 _scheduler: BackgroundScheduler | None = None
+supervisor = TickSupervisor(SessionLocal, engine)
+# Today's sends by the previous leader are not in this process's counts. Registered on the
+# election itself, since the side jobs elect too and may be the ones that win the lease
+leader.on_gain(pacer.reset)
+
+
+def _cycle(db, outcome: dict):
+	shards = None
+	authority = None
+	if coordinator.enabled:
+		# Handovers only between cycles; during one, shards whose leases lapse are dropped
+		shards = coordinator.rebalance(db)
+		authority = coordinator.shards
+		if not shards:
+			return
+	else:
+		# One active scheduler across all processes and hosts; the rest stay on standby
+		if not leader.elect(db):
+			return
+		# Re-checked before every claim batch and delivery: a heartbeat failing mid-cycle stops the cycle
+		authority = lambda: None if leader.is_leader else []
+	outcome["budget"] = budget = capacity.budget()
+	try:
+		result = run_sending_cycle(db, budget, shards, authority)
+	except PipelineError as exc:
+		capacity.observe(exc.result)
+		raise
+	capacity.observe(result)
+	outcome["selected"] = result.stages[0].processed if result.stages else 0
+	return result
 
 
 def _tick():
-	# Run one send cycle periodically
-	db: Session = SessionLocal()
+	# Run one send cycle, then schedule the next from what is due and what the last cycle managed
+	outcome = {"budget": None, "selected": 0}
+	ok = False
+	try:
+		with profiler.run("cycle"):
+			ok = supervisor.run(lambda db: _cycle(db, outcome))
+	finally:
+		retry_in = supervisor.status()["retry_in_seconds"]
+		delay = next_tick_delay(pacer, ok, outcome["selected"], outcome["budget"], retry_in)
+		if _scheduler is not None:
+			# The interval trigger stays as the idle ceiling; this only pulls the next run forward
+			_scheduler.modify_job("tick", next_run_time=datetime.now() + timedelta(seconds=delay))
+
+
+def flush_unsubscribes():
+	if not len(unsubscribes):
+		return
+	db = SessionLocal()
+	try:
+		unsubscribes.flush(db)
+	except Exception as exc:
+		# Batch stays buffered and is retried on the next flush
+		count_error("unsubscribe_flush", exc)
+	finally:
+		db.close()
+
+
+def flush_stats():
+	if not len(stats):
+		return
+	db = SessionLocal()
+	try:
+		stats.flush(db)
+	except Exception as exc:
+		# Deltas are merged back and retried on the next flush
+		count_error("stats_flush", exc)
+	finally:
+		db.close()
+
+
+def _elected() -> bool:
+	# For once-per-deployment jobs; in unsharded mode the tick has usually elected us already
+	db = SessionLocal()
+	try:
+		return leader.elect(db)
+	except Exception as exc:
+		count_error("leader_election", exc)
+		return False
+	finally:
+		db.close()
+
+
+def renew_leases():
+	# Keeps held leases alive through long cycles; elections and handovers happen in the tick
+	db = SessionLocal()
 	try:
-		run_sending_cycle(db)
-	except Exception:
-		# Best-effort background; avoid crashing scheduler
-		pass
+		leader.heartbeat(db)
+		if coordinator.enabled:
+			coordinator.heartbeat(db)
+	except Exception as exc:
+		# Unrenewed leases stop being trusted before they can expire
+		count_error("lease_heartbeat", exc)
 	finally:
 		db.close()
 
 
+def purge_leases():
+	if not _elected():
+		return
+	db = SessionLocal()
+	try:
+		coordinator.store.purge(db)
+	except Exception as exc:
+		count_error("lease_purge", exc)
+	finally:
+		db.close()
+
+
+def release_leases():
+	# Lets a standby take over at its next tick instead of after LEASE_SECONDS
+	db = SessionLocal()
+	try:
+		leader.resign(db)
+		if coordinator.enabled:
+			coordinator.leave(db)
+	except Exception as exc:
+		count_error("lease_release", exc)
+	finally:
+		db.close()
+
+
+def save_mx_cache():
+	try:
+		resolver.save()
+	except OSError as exc:
+		count_error("mx_cache_save", exc)
+
+
+def maintain_event_partitions():
+	# Pre-create upcoming months and drop whole months past retention
+	if not _elected():
+		return
+	try:
+		events.prepare()
+		if EVENT_RETENTION_MONTHS > 0:
+			now = month_start(datetime.utcnow())
+			months = now.year * 12 + now.month - 1 - EVENT_RETENTION_MONTHS
+			events.drop_before(datetime(months // 12, months % 12 + 1, 1))
+	except Exception as exc:
+		count_error("event_partitions", exc)
+
+
 def start_scheduler():
 	global _scheduler
 	if _scheduler is not None:
 		return
 	_scheduler = BackgroundScheduler()
-	_scheduler.add_job(_tick, IntervalTrigger(seconds=10), max_instances=1, coalesce=True)
+	_scheduler.add_job(_tick, IntervalTrigger(seconds=TICK_INTERVAL_SECONDS), id="tick", max_instances=1, coalesce=True)
+	_scheduler.add_job(flush_unsubscribes, IntervalTrigger(seconds=UNSUBSCRIBE_FLUSH_SECONDS), max_instances=1, coalesce=True)
+	_scheduler.add_job(flush_stats, IntervalTrigger(seconds=STATS_FLUSH_SECONDS), max_instances=1, coalesce=True)
+	_scheduler.add_job(renew_leases, IntervalTrigger(seconds=LEASE_HEARTBEAT_SECONDS), max_instances=1, coalesce=True)
+	_scheduler.add_job(purge_leases, IntervalTrigger(hours=1), max_instances=1, coalesce=True)
+	_scheduler.add_job(save_mx_cache, IntervalTrigger(minutes=5), max_instances=1, coalesce=True)
+	_scheduler.add_job(maintain_event_partitions, IntervalTrigger(hours=6), max_instances=1, coalesce=True)
 	_scheduler.start()
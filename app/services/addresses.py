@@ -0,0 +1,75 @@
+from __future__ import annotations
+import re
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+from email_validator import EmailNotValidError, validate_email
+
+DOMAIN_CACHE_SIZE = 65536
+
+# RFC 5322 dot-atom over ASCII: covers practically every real local part, so
+# the full validator only runs for quoted or internationalized ones
+_LOCAL_RE = re.compile(r"^[a-z0-9!#$%&'*+/=?^_`{|}~-]+(\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*$")
+_MAX_LOCAL = 64
+_MAX_ADDRESS = 254
+
+
+class InvalidAddress(ValueError):
+	pass
+
+
+@lru_cache(maxsize=DOMAIN_CACHE_SIZE)
+def _check_domain(domain: str) -> Tuple[str | None, str | None]:
+	# Returns (ascii_domain, error). Errors are cached too: lru_cache would not
+	# memoize a raised exception, and bad domains repeat as much as good ones.
+	try:
+		info = validate_email(f"postmaster@{domain}", check_deliverability=False)
+	except EmailNotValidError as exc:
+		return None, str(exc)
+	return info.ascii_domain, None
+
+
+def normalize_address(address: str) -> str:
+	"""Trim, lower-case and IDNA-encode an address, or raise InvalidAddress."""
+	addr = (address or "").strip().lower()
+	local, at, domain = addr.rpartition("@")
+	if not at or not local or not domain:
+		raise InvalidAddress(f"{address!r} is not an email address")
+	ascii_domain, error = _check_domain(domain)
+	if error:
+		raise InvalidAddress(error)
+	if len(local) > _MAX_LOCAL or not _LOCAL_RE.match(local):
+		try:
+			info = validate_email(f"{local}@{ascii_domain}", check_deliverability=False)
+		except EmailNotValidError as exc:
+			raise InvalidAddress(str(exc)) from None
+		local = info.local_part
+	normalized = f"{local}@{ascii_domain}"
+	if len(normalized) > _MAX_ADDRESS:
+		raise InvalidAddress("The email address is too long.")
+	return normalized
+
+
+def is_valid_address(address: str) -> bool:
+	try:
+		normalize_address(address)
+	except InvalidAddress:
+		return False
+	return True
+
+
+def partition_addresses(addresses: Iterable[str]) -> Tuple[List[str], List[Tuple[str, str]]]:
+	"""Split into (normalized valid addresses, [(raw, reason)] rejects), de-duplicated."""
+	valid: List[str] = []
+	rejected: List[Tuple[str, str]] = []
+	seen: set[str] = set()
+	for raw in addresses:
+		try:
+			addr = normalize_address(raw)
+		except InvalidAddress as exc:
+			rejected.append((raw, str(exc)))
+			continue
+		if addr not in seen:
+			seen.add(addr)
+			valid.append(addr)
+	return valid, rejected
@@ -1,22 +1,53 @@
 from datetime import datetime, timedelta
+from typing import Iterable, List, Tuple
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
-from app.models import EmailSend, EngagementEvent
+from app.models import EmailSend
+from app.services.events import events
+from app.services.stats import stats
 
 
 def record_event(db: Session, send: EmailSend, recipient_id: int, event_type: str, details: str | None = None) -> None:
-	event = EngagementEvent(send_id=send.id, recipient_id=recipient_id, type=event_type, details=details)
-	db.add(event)
+	rows = events.insert(db, [{"send_id": send.id, "recipient_id": recipient_id, "type": event_type, "details": details}])
 	db.commit()
+	stats.add_events(db, rows)
+
+
+def record_events(db: Session, send_id: int, recipient_id: int, event_types: list[str]) -> None:
+	# Batch variant of record_event: one commit for all events of a send
+	now = datetime.utcnow()
+	rows = events.insert(db, [
+		{"send_id": send_id, "recipient_id": recipient_id, "type": event_type, "created_at": now}
+		for event_type in event_types
+	])
+	db.commit()
+	stats.add_events(db, rows)
+
+
+def insert_recipient_events(db: Session, items: Iterable[Tuple[int, str | None]], event_type: str) -> List[dict]:
+	"""Event rows for outcomes that arrive per recipient, not per send (opt-outs, DSN bounces).
+
+	Each (recipient_id, details) is attributed to that recipient's latest send;
+	recipients never sent anything are skipped. Rows are inserted in the
+	caller's transaction; pass the result to ``stats.add_events`` after commit.
+	"""
+	items = list(items)
+	if not items:
+		return []
+	latest = dict(db.execute(
+		select(EmailSend.recipient_id, func.max(EmailSend.id))
+		.where(EmailSend.recipient_id.in_({rid for rid, _ in items}))
+		.group_by(EmailSend.recipient_id)
+	).all())
+	now = datetime.utcnow()
+	return events.insert(db, [
+		{"send_id": latest[rid], "recipient_id": rid, "type": event_type, "details": details, "created_at": now}
+		for rid, details in items
+		if rid in latest
+	])
 
 
 def compute_engagement_trend(db: Session, days: int = 14):
+	# Counted in SQL over only the partitions that overlap the window
 	cutoff = datetime.utcnow() - timedelta(days=days)
-	rows = (
-		db.query(EngagementEvent)
-		.filter(EngagementEvent.created_at >= cutoff)
-		.all()
-	)
-	counts: dict[str, int] = {}
-	for r in rows:
-		counts[r.type] = counts.get(r.type, 0) + 1
-	return counts
+	return events.counts_by_type(db, start=cutoff)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import ATTEMPT_LOG_BATCH
+from app.models import DeliveryAttempt, RelayHost
+
+# Integer-coded outcomes; keep in sync with OUTCOME_NAMES for exports
+DELIVERED = 0
+DEFERRED = 1
+BOUNCED = 2
+ERROR = 3
+OUTCOME_NAMES = {DELIVERED: "delivered", DEFERRED: "deferred", BOUNCED: "bounced", ERROR: "error"}
+
+
+def outcome_for(smtp_code: Optional[int], delivered: Optional[bool]) -> int:
+	if smtp_code is not None and 400 <= smtp_code < 500:
+		return DEFERRED
+	if smtp_code is not None and smtp_code >= 500:
+		return BOUNCED
+	if delivered is None:
+		return ERROR
+	return DELIVERED if delivered else BOUNCED
+
+
+class RelayIds:
+	"""host -> relay_hosts.id, resolved once per process and then served from memory."""
+
+	def __init__(self):
+		self._ids: Dict[str, int] = {}
+		self._lock = threading.Lock()
+
+	def get(self, db: Session, host: str) -> int:
+		rid = self._ids.get(host)
+		if rid is not None:
+			return rid
+		with self._lock:
+			rid = db.execute(select(RelayHost.id).where(RelayHost.host == host)).scalar()
+			if rid is None:
+				try:
+					rid = db.execute(insert(RelayHost).values(host=host)).inserted_primary_key[0]
+					db.commit()
+				except IntegrityError:
+					db.rollback()
+					rid = db.execute(select(RelayHost.id).where(RelayHost.host == host)).scalar_one()
+			self._ids[host] = rid
+			return rid
+
+
+relay_ids = RelayIds()
+
+
+class AttemptLog:
+	"""Buffers delivery attempts and writes them with one executemany per batch."""
+
+	def __init__(self, batch_size: int = ATTEMPT_LOG_BATCH):
+		self.batch_size = max(1, batch_size)
+		self._rows: List[dict] = []
+		self._lock = threading.Lock()
+
+	def add(
+		self,
+		db: Session,
+		send_id: int,
+		relay_host: str,
+		attempt: int,
+		outcome: int,
+		smtp_code: Optional[int],
+		latency_s: float,
+		ts: Optional[float] = None,
+	) -> None:
+		row = {
+			"send_id": send_id,
+			"ts_ms": int((ts if ts is not None else time.time()) * 1000),
+			"relay_id": relay_ids.get(db, relay_host or "unknown"),
+			"attempt": attempt,
+			"outcome": outcome,
+			"smtp_code": smtp_code,
+			"latency_us": int(latency_s * 1_000_000),
+		}
+		with self._lock:
+			self._rows.append(row)
+			full = len(self._rows) >= self.batch_size
+		if full:
+			self.flush(db)
+
+	def flush(self, db: Session) -> int:
+		with self._lock:
+			rows, self._rows = self._rows, []
+		if not rows:
+			return 0
+		try:
+			db.execute(insert(DeliveryAttempt), rows)
+			db.commit()
+		except Exception:
+			db.rollback()
+			with self._lock:
+				self._rows[:0] = rows
+			raise
+		return len(rows)
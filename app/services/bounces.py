@@ -0,0 +1,122 @@
+# SMTP reply and RFC 3464 delivery status notification parsing.
+# Standard library only, so the standalone CLI mailer can import it too.
+from __future__ import annotations
+import mailbox
+import os
+import re
+from dataclasses import dataclass
+from email import message_from_bytes, policy
+from email.message import Message
+from typing import Iterator, List, Optional, Tuple
+
+HARD = "hard"
+SOFT = "soft"
+
+_STATUS_RE = re.compile(r"\b([245])\.(\d{1,3})\.(\d{1,3})\b")
+_CODE_RE = re.compile(r"^\s*([245]\d\d)\b")
+
+# Enhanced status codes (RFC 3463) that look permanent but are not about the address
+_SOFT_PERMANENT = {"5.2.2", "5.3.4", "5.4.5", "5.7.1"}
+# Basic reply codes: 552 is mailbox-full, everything else 5xx is treated as permanent
+_SOFT_REPLY_CODES = {552}
+
+
+@dataclass
+class Bounce:
+	email: str
+	kind: str
+	code: Optional[int] = None
+	status: Optional[str] = None
+	diagnostic: str = ""
+	# Suppression reason override, e.g. "invalid_address" for pre-send rejects
+	reason: Optional[str] = None
+
+
+def parse_smtp_reply(text: str) -> Tuple[Optional[int], Optional[str]]:
+	"""Extract ``(reply_code, enhanced_status)`` from an SMTP reply line."""
+	code_match = _CODE_RE.match(text or "")
+	status_match = _STATUS_RE.search(text or "")
+	code = int(code_match.group(1)) if code_match else None
+	status = ".".join(status_match.groups()) if status_match else None
+	return code, status
+
+
+def classify(code: Optional[int] = None, status: Optional[str] = None) -> Optional[str]:
+	"""Return HARD, SOFT or None (not a bounce) for a reply code / enhanced status."""
+	if status:
+		if status.startswith("2."):
+			return None
+		if status.startswith("4."):
+			return SOFT
+		return SOFT if status in _SOFT_PERMANENT else HARD
+	if code is None:
+		return None
+	if 400 <= code < 500:
+		return SOFT
+	if 500 <= code < 600:
+		return SOFT if code in _SOFT_REPLY_CODES else HARD
+	return None
+
+
+def classify_smtp_reply(email: str, code: Optional[int], reply: str | bytes = "") -> Optional[Bounce]:
+	if isinstance(reply, bytes):
+		reply = reply.decode("utf-8", "replace")
+	parsed_code, status = parse_smtp_reply(reply)
+	code = code if code is not None else parsed_code
+	kind = classify(code, status)
+	if kind is None:
+		return None
+	return Bounce(email=email.strip().lower(), kind=kind, code=code, status=status, diagnostic=reply.strip()[:500])
+
+
+def _strip_addr_type(value: str) -> str:
+	# "rfc822; user@example.com" -> "user@example.com"
+	_, _, addr = value.partition(";")
+	return (addr or value).strip().strip("<>").lower()
+
+
+def parse_dsn(msg: Message) -> List[Bounce]:
+	"""Bounces reported by a multipart/report; report-type=delivery-status message."""
+	if msg.get_content_type() != "multipart/report":
+		return []
+	bounces: List[Bounce] = []
+	for part in msg.walk():
+		if part.get_content_type() != "message/delivery-status":
+			continue
+		# Blocks: the first carries per-message fields, the rest one recipient each
+		blocks = part.get_payload()
+		if not isinstance(blocks, list):
+			continue
+		for block in blocks[1:] or blocks:
+			recipient = block.get("Final-Recipient") or block.get("Original-Recipient")
+			if not recipient:
+				continue
+			action = (block.get("Action") or "").strip().lower()
+			status = (block.get("Status") or "").strip() or None
+			diagnostic = (block.get("Diagnostic-Code") or "").strip()
+			# "smtp; 550 5.1.1 user unknown" -> "550 5.1.1 user unknown"
+			code, diag_status = parse_smtp_reply(diagnostic.partition(";")[2] or diagnostic)
+			if action == "delayed":
+				kind = SOFT
+			elif action in ("delivered", "relayed", "expanded"):
+				kind = None
+			else:
+				kind = classify(code, status or diag_status)
+			if kind is None:
+				continue
+			bounces.append(Bounce(_strip_addr_type(recipient), kind, code, status, diagnostic[:500]))
+	return bounces
+
+
+def parse_dsn_bytes(raw: bytes) -> List[Bounce]:
+	return parse_dsn(message_from_bytes(raw, policy=policy.compat32))
+
+
+def iter_mailbox(path: str) -> Iterator[Message]:
+	"""Messages from a Maildir directory or an mbox file."""
+	box = mailbox.Maildir(path, create=False) if os.path.isdir(path) else mailbox.mbox(path, create=False)
+	try:
+		for msg in box:
+			yield msg
+	finally:
+		box.close()
@@ -0,0 +1,115 @@
+from __future__ import annotations
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Hashable
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.config import RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIZE
+from app.services.metrics import REGISTRY, SENDS_WRITTEN, EVENTS_RECORDED, INBOX_PLACEMENT
+
+CACHE_REQUESTS = REGISTRY.counter("mailer_response_cache_total", "Cached-endpoint requests by outcome.", ["outcome"])
+_HIT = CACHE_REQUESTS.labels("hit")
+_MISS = CACHE_REQUESTS.labels("miss")
+_NOT_MODIFIED = CACHE_REQUESTS.labels("not_modified")
+
+
+def send_path_version() -> Hashable:
+	"""Changes whenever the sending path commits sends, events or placements."""
+	return (SENDS_WRITTEN.value, EVENTS_RECORDED.total(), INBOX_PLACEMENT.total())
+
+
+@dataclass
+class _Entry:
+	version: Hashable
+	expires: float
+	body: bytes
+	media_type: str
+	etag: str
+	last_modified: float
+
+
+class ResponseCache:
+	"""Rendered responses keyed by path and query string, with conditional GET.
+
+	An entry is reused while its version (read from in-process counters) is
+	unchanged and its TTL has not passed. The TTL covers writes that no
+	counter sees, such as other processes or scripts. The ETag is a hash of
+	the body, so a rebuild that renders the same bytes keeps the old
+	ETag and Last-Modified, and clients keep getting 304s.
+	"""
+
+	def __init__(self, ttl: float = RESPONSE_CACHE_TTL, size: int = RESPONSE_CACHE_SIZE, clock: Callable[[], float] = time.time):
+		self.ttl = ttl
+		self.size = max(1, size)
+		self.clock = clock
+		self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+		self._lock = threading.Lock()
+
+	@staticmethod
+	def key(request: Request) -> str:
+		return f"{request.url.path}?{'&'.join(sorted(f'{k}={v}' for k, v in request.query_params.multi_items()))}"
+
+	def serve(
+		self,
+		request: Request,
+		build: Callable[[], Response],
+		version: Callable[[], Hashable] = send_path_version,
+	) -> Response:
+		key = self.key(request)
+		current = version()
+		now = self.clock()
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is not None:
+				self._entries.move_to_end(key)
+		if entry is None or entry.version != current or entry.expires <= now:
+			_MISS.inc()
+			fresh = build()
+			if fresh.status_code != 200:
+				return fresh
+			body = bytes(fresh.body)
+			etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+			last_modified = entry.last_modified if entry is not None and entry.etag == etag else now
+			entry = _Entry(current, now + self.ttl, body, fresh.media_type, etag, last_modified)
+			with self._lock:
+				self._entries[key] = entry
+				self._entries.move_to_end(key)
+				if len(self._entries) > self.size:
+					self._entries.popitem(last=False)
+		else:
+			_HIT.inc()
+		headers = {
+			"ETag": entry.etag,
+			"Last-Modified": formatdate(entry.last_modified, usegmt=True),
+			"Cache-Control": "no-cache",
+		}
+		if self._not_modified(request, entry):
+			_NOT_MODIFIED.inc()
+			return Response(status_code=304, headers=headers)
+		return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+	@staticmethod
+	def _not_modified(request: Request, entry: _Entry) -> bool:
+		inm = request.headers.get("if-none-match")
+		if inm is not None:
+			return entry.etag in (t.strip() for t in inm.split(",")) or inm.strip() == "*"
+		ims = request.headers.get("if-modified-since")
+		if ims:
+			try:
+				return int(entry.last_modified) <= parsedate_to_datetime(ims).timestamp()
+			except (TypeError, ValueError):
+				return False
+		return False
+
+	def clear(self) -> None:
+		with self._lock:
+			self._entries.clear()
+
+
+response_cache = ResponseCache()
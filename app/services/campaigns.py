@@ -0,0 +1,124 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.config import CLICK_TRACKING
+from app.models import Campaign
+from app.services.links import link_rewriter
+from app.services.spam import analyze_spam, optimize_sending_pattern
+
+
+@dataclass
+class CampaignPlan:
+	campaign_id: int
+	subject_template: str
+	body_template: str
+	weight: float
+	volume_mul: float
+	jitter_mul: float
+
+
+def active_campaign_plans(db: Session) -> List[CampaignPlan]:
+	plans = []
+	for c in db.query(Campaign).filter(Campaign.active == True).order_by(Campaign.id).all():
+		# Determine spam score from template to adjust volumes
+		base_spam = analyze_spam(c.subject_template + "\n" + c.body_template)
+		volume_mul, jitter_mul = optimize_sending_pattern(base_spam)
+		weight = c.weight if c.weight is not None else 1
+		if weight > 0:
+			body = link_rewriter.rewrite(db, c.id, c.body_template) if CLICK_TRACKING else c.body_template
+			plans.append(CampaignPlan(c.id, c.subject_template, body, weight, volume_mul, jitter_mul))
+	return plans
+
+
+# Upper bound on one round of weighted_round_robin, whatever the weights
+MAX_ROUND_SLOTS = 500
+
+
+def weighted_round_robin(weights: Dict[int, float]) -> List[int]:
+	"""Smooth weighted round-robin order for one round of the given weights.
+
+	Weights 5:1:1 yield ``a a b a c a a`` rather than ``a a a a a b c`` so
+	campaigns interleave within a round. The round length is the sum of the
+	weights scaled to integers, capped at about ``MAX_ROUND_SLOTS`` (every
+	campaign keeps at least one slot, so extreme ratios are approximated).
+	"""
+	if not weights:
+		return []
+	low = min(weights.values())
+	scale = 1 / low if low < 1 else 1
+	scale = min(scale, MAX_ROUND_SLOTS / sum(weights.values()))
+	slots = {k: max(1, round(w * scale)) for k, w in weights.items()}
+	total = sum(slots.values())
+	current = {k: 0 for k in slots}
+	order = []
+	for _ in range(total):
+		for k, w in slots.items():
+			current[k] += w
+		best = max(current, key=current.get)
+		current[best] -= total
+		order.append(best)
+	return order
+
+
+class CampaignScheduler:
+	"""Shares per-sender cycle quotas among active campaigns by weight.
+
+	The round-robin order is computed once per cycle; allocations walk it from
+	a persistent position so successive senders continue where the previous
+	one stopped. A campaign that runs out of recipients is retired for the
+	rest of the cycle and its unused slots go to the remaining campaigns.
+	"""
+
+	def __init__(self, plans: Sequence[CampaignPlan]):
+		self.plans = {p.campaign_id: p for p in plans}
+		self.order = weighted_round_robin({p.campaign_id: p.weight for p in plans})
+		self.exhausted: set[int] = set()
+		self._pos = 0
+
+	def _weighted(self, attr: str) -> float:
+		live = [p for cid, p in self.plans.items() if cid not in self.exhausted]
+		if not live:
+			return 1.0
+		return sum(getattr(p, attr) * p.weight for p in live) / sum(p.weight for p in live)
+
+	@property
+	def volume_mul(self) -> float:
+		return self._weighted("volume_mul")
+
+	@property
+	def jitter_mul(self) -> float:
+		return self._weighted("jitter_mul")
+
+	def allocate(self, quota: int) -> Dict[int, int]:
+		shares: Dict[int, int] = {}
+		if not self.order or len(self.exhausted) >= len(self.plans):
+			return shares
+		while quota > 0:
+			cid = self.order[self._pos]
+			self._pos = (self._pos + 1) % len(self.order)
+			if cid in self.exhausted:
+				continue
+			shares[cid] = shares.get(cid, 0) + 1
+			quota -= 1
+		return shares
+
+	def fill(self, quota: int, fetch: Callable[[CampaignPlan, int], list]) -> List[tuple[CampaignPlan, list]]:
+		"""Allocate ``quota`` and fetch recipients, re-allocating any shortfall."""
+		batches: List[tuple[CampaignPlan, list]] = []
+		while quota > 0:
+			shares = self.allocate(quota)
+			if not shares:
+				break
+			quota = 0
+			for cid, want in shares.items():
+				plan = self.plans[cid]
+				rows = fetch(plan, want)
+				if rows:
+					batches.append((plan, rows))
+				if len(rows) < want:
+					self.exhausted.add(cid)
+					quota += want - len(rows)
+		return batches
@@ -1,9 +1,57 @@
+import base64
+import hashlib
+import hmac
+from functools import lru_cache
 from urllib.parse import urlencode
 
+from app.config import UNSUBSCRIBE_SECRET
+
+_SIG_BYTES = 12
+# Shipped in old .env files and examples, so anyone could sign with it
+_PUBLIC_SECRETS = {"", "dev-unsubscribe-secret"}
+
+
+def require_secret() -> str:
+	"""The configured signing secret; raises while it is unset or a known public value."""
+	if UNSUBSCRIBE_SECRET in _PUBLIC_SECRETS:
+		raise RuntimeError("UNSUBSCRIBE_SECRET must be set to a private random value")
+	return UNSUBSCRIBE_SECRET
+
+
+def derive_key(purpose: str) -> bytes:
+	# Independent key per token kind, so one kind can never stand in for another
+	return hmac.new(require_secret().encode(), f"key:{purpose}".encode(), hashlib.sha256).digest()
+
+
+@lru_cache(maxsize=1)
+def _mac() -> hmac.HMAC:
+	# Keyed once; copying the primed MAC skips re-deriving the key pads per message
+	return hmac.new(require_secret().encode(), b"unsub:", hashlib.sha256)
+
+
+def _sign(recipient_id: int) -> str:
+	mac = _mac().copy()
+	mac.update(str(recipient_id).encode())
+	return base64.urlsafe_b64encode(mac.digest()[:_SIG_BYTES]).decode().rstrip("=")
+
+
+def make_unsubscribe_token(recipient_id: int) -> str:
+	return f"{recipient_id}.{_sign(recipient_id)}"
+
+
+def verify_unsubscribe_token(token: str) -> int | None:
+	# Self-verifying: the HMAC proves we issued it, so no DB read is needed
+	rid, _, sig = (token or "").partition(".")
+	if not rid.isdigit() or not sig:
+		return None
+	if not hmac.compare_digest(sig, _sign(int(rid))):
+		return None
+	return int(rid)
+
 
 def build_unsubscribe_link(base_url: str, recipient_id: int) -> str:
-	params = urlencode({"rid": recipient_id})
-	return f"{base_url.rstrip('/')}\/unsubscribe?{params}"
+	params = urlencode({"t": make_unsubscribe_token(recipient_id)})
+	return f"{base_url.rstrip('/')}/unsubscribe?{params}"
 
 
 def append_compliance_footer(body: str, sender_identity: str, unsub_link: str) -> str:
@@ -0,0 +1,79 @@
+from __future__ import annotations
+import hashlib
+import json
+import threading
+from typing import Any, Dict
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import BodyTemplate, EmailSend
+from app.services.compliance import append_compliance_footer
+from app.services.links import fill_click_token
+from app.services.personalize import interpolate
+from app.services.tracking import make_tracking_token
+
+# Reserved keys in body_vars next to the template fields
+_SENDER = "_s"
+_UNSUB = "_u"
+
+
+def pack_body_vars(fields: Dict[str, Any], sender_identity: str, unsub_link: str) -> str:
+	"""Everything needed to rebuild one body from its template, as compact JSON."""
+	values = dict(fields)
+	values[_SENDER] = sender_identity
+	values[_UNSUB] = unsub_link
+	return json.dumps(values, separators=(",", ":"), ensure_ascii=False)
+
+
+def render_stored_body(template: str, body_vars: str, click_token: str = "") -> str:
+	values = json.loads(body_vars)
+	sender = values.pop(_SENDER, "")
+	link = values.pop(_UNSUB, "")
+	return fill_click_token(append_compliance_footer(interpolate(template, values), sender, link), click_token)
+
+
+class TemplateStore:
+	"""sha256(template) -> body_templates.id, with an in-process map in front."""
+
+	def __init__(self):
+		self._ids: Dict[str, int] = {}
+		self._text: Dict[int, str] = {}
+		self._lock = threading.Lock()
+
+	def id_for(self, db: Session, content: str) -> int:
+		digest = hashlib.sha256(content.encode()).hexdigest()
+		tid = self._ids.get(digest)
+		if tid is not None:
+			return tid
+		with self._lock:
+			tid = db.execute(select(BodyTemplate.id).where(BodyTemplate.sha256 == digest)).scalar()
+			if tid is None:
+				try:
+					tid = db.execute(insert(BodyTemplate).values(sha256=digest, content=content)).inserted_primary_key[0]
+					db.commit()
+				except IntegrityError:
+					db.rollback()
+					tid = db.execute(select(BodyTemplate.id).where(BodyTemplate.sha256 == digest)).scalar_one()
+			self._ids[digest] = tid
+			self._text[tid] = content
+			return tid
+
+	def text(self, db: Session, template_id: int) -> str:
+		content = self._text.get(template_id)
+		if content is None:
+			content = db.execute(select(BodyTemplate.content).where(BodyTemplate.id == template_id)).scalar_one()
+			self._text[template_id] = content
+		return content
+
+
+templates = TemplateStore()
+
+
+def load_body(db: Session, send: EmailSend) -> str:
+	"""Full body of a send, reconstructed on demand for deduplicated rows."""
+	if send.template_id is None:
+		return send.body
+	token = make_tracking_token(send.id, send.recipient_id)
+	return render_stored_body(templates.text(db, send.template_id), send.body_vars or "{}", token)
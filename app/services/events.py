@@ -0,0 +1,285 @@
+from __future__ import annotations
+import re
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import (
+	Column, DateTime, Index, Integer, MetaData, String, Table, delete, func, insert, inspect, literal_column, select,
+	text, union_all,
+)
+from sqlalchemy.orm import Session
+
+from app.compression import CompressedText
+from app.db import engine, add_missing_columns
+from app.models import EngagementEvent
+
+BASE = EngagementEvent.__tablename__
+_PARTITION = re.compile(rf"^{BASE}_(\d{{4}})(\d{{2}})$")
+
+
+def month_start(ts: datetime) -> datetime:
+	return datetime(ts.year, ts.month, 1)
+
+
+def next_month(ts: datetime) -> datetime:
+	return datetime(ts.year + ts.month // 12, ts.month % 12 + 1, 1)
+
+
+def partition_name(ts: datetime) -> str:
+	return f"{BASE}_{ts.year:04d}{ts.month:02d}"
+
+
+def partition_month(name: str) -> Optional[datetime]:
+	m = _PARTITION.match(name)
+	return datetime(int(m.group(1)), int(m.group(2)), 1) if m else None
+
+
+class EventStore:
+	"""Monthly partitions for engagement events behind one insert/query API.
+
+	SQLite: one ``engagement_events_YYYYMM`` table per month. Reads are a
+	UNION ALL over only the months overlapping the requested range, and the
+	original table is read as one more partition until ``migrate_legacy``
+	has emptied it.
+
+	Postgres, once event_partitions.py --migrate has made
+	``engagement_events`` a native range-partitioned parent: rows go to the
+	parent, the planner prunes, and this class only creates and drops the
+	monthly partitions. Before that, Postgres uses the same routing as SQLite.
+
+	Retention is ``drop_before``: a DROP TABLE per month, not a DELETE.
+	"""
+
+	def __init__(self, bind=engine):
+		self.bind = bind
+		self.metadata = MetaData()
+		self._tables: Dict[str, Table] = {}
+		self._months: Optional[set[datetime]] = None
+		self._legacy_rows: Optional[bool] = None
+		self._native: Optional[bool] = None
+		self._lock = threading.Lock()
+
+	@property
+	def native(self) -> bool:
+		if self._native is None:
+			self._native = False
+			if self.bind.dialect.name == "postgresql":
+				with self.bind.connect() as conn:
+					self._native = conn.execute(text(
+						"SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :name"
+					), {"name": BASE}).first() is not None
+		return self._native
+
+	def _table(self, name: str) -> Table:
+		table = self._tables.get(name)
+		if table is None:
+			table = Table(
+				name,
+				self.metadata,
+				Column("id", Integer, primary_key=True),
+				Column("send_id", Integer),
+				Column("recipient_id", Integer),
+				Column("type", String(50)),
+				Column("details", CompressedText(f"{BASE}.details"), nullable=True),
+				Column("dedup_key", String(32), nullable=True),
+				Column("created_at", DateTime),
+				Index(f"ix_{name}_created_at", "created_at"),
+				Index(f"ux_{name}_dedup", "dedup_key", unique=True),
+			)
+			self._tables[name] = table
+		return table
+
+	def months(self) -> List[datetime]:
+		if self._months is None:
+			names = inspect(self.bind).get_table_names()
+			self._months = {m for m in map(partition_month, names) if m is not None}
+			if not self.native:
+				self._upgrade()
+		return sorted(self._months)
+
+	def _upgrade(self) -> None:
+		# Bring partitions created by older code up to the current columns and indexes
+		tables = [self._table(partition_name(m)) for m in self._months]
+		add_missing_columns(self.bind, self.metadata)
+		for table in tables:
+			for index in table.indexes:
+				index.create(self.bind, checkfirst=True)
+
+	def refresh(self) -> None:
+		# Forget cached partition state after out-of-band DDL
+		self._months = None
+		self._legacy_rows = None
+		self._native = None
+
+	def _create(self, conn, month: datetime, native: Optional[bool] = None) -> None:
+		name = partition_name(month)
+		if self.native if native is None else native:
+			conn.execute(text(
+				f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {BASE} "
+				f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')"
+			))
+		else:
+			self._table(name).create(conn, checkfirst=True)
+
+	def prepare(self, now: Optional[datetime] = None) -> List[str]:
+		"""Create this month's and next month's partitions ahead of the first write."""
+		now = now or datetime.utcnow()
+		created = []
+		with self._lock:
+			known = set(self.months())
+			with self.bind.begin() as conn:
+				for month in (month_start(now), next_month(now)):
+					if month not in known:
+						self._create(conn, month)
+						self._months.add(month)
+						created.append(partition_name(month))
+		return created
+
+	def insert(self, db: Session, rows: Iterable[dict], skip_duplicates: bool = False) -> List[dict]:
+		"""Add event rows (send_id, recipient_id, type, details, created_at) in the caller's transaction.
+
+		With ``skip_duplicates`` rows whose dedup_key is already stored in the
+		row's month are dropped, which makes replaying a batch safe. Returns the
+		rows written. On natively partitioned Postgres the unique index also
+		covers created_at, so there ON CONFLICT only absorbs exact replays; two
+		writers racing with the same key under different timestamps can both
+		insert.
+		"""
+		groups: Dict[datetime, List[dict]] = {}
+		for row in rows:
+			row.setdefault("details", None)
+			row.setdefault("dedup_key", None)
+			row.setdefault("created_at", datetime.utcnow())
+			groups.setdefault(month_start(row["created_at"]), []).append(row)
+		written: List[dict] = []
+		for month, batch in groups.items():
+			if month not in self.months():
+				# Backfilled or unprepared month; created in the caller's transaction
+				with self._lock:
+					self._create(db.connection(), month)
+					self._months.add(month)
+			target = EngagementEvent.__table__ if self.native else self._table(partition_name(month))
+			if skip_duplicates:
+				batch = self._without_stored_keys(db, target, month, batch)
+				if not batch:
+					continue
+			db.execute(self._insert(target, skip_duplicates), batch)
+			written.extend(batch)
+		return written
+
+	def _without_stored_keys(self, db: Session, target: Table, month: datetime, batch: List[dict]) -> List[dict]:
+		# Checked up front so callers learn which rows are new; ON CONFLICT still covers races
+		# where the unique index is on dedup_key alone (the monthly tables)
+		keys = {r["dedup_key"] for r in batch if r["dedup_key"]}
+		if not keys:
+			return batch
+		stored = set(db.execute(
+			select(target.c.dedup_key).where(
+				target.c.dedup_key.in_(keys),
+				target.c.created_at >= month,
+				target.c.created_at < next_month(month),
+			)
+		).scalars())
+		fresh, seen = [], set()
+		for r in batch:
+			key = r["dedup_key"]
+			if key and (key in stored or key in seen):
+				continue
+			seen.add(key)
+			fresh.append(r)
+		return fresh
+
+	def _insert(self, target: Table, skip_duplicates: bool):
+		if not skip_duplicates:
+			return insert(target)
+		if self.bind.dialect.name == "postgresql":
+			from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+			return pg_insert(target).on_conflict_do_nothing()
+		if self.bind.dialect.name == "sqlite":
+			from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+			return sqlite_insert(target).on_conflict_do_nothing()
+		return insert(target).prefix_with("IGNORE")
+
+	def _has_legacy_rows(self) -> bool:
+		if self._legacy_rows is None:
+			with self.bind.connect() as conn:
+				self._legacy_rows = conn.execute(select(EngagementEvent.id).limit(1)).first() is not None
+		return self._legacy_rows
+
+	def sources(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Table]:
+		"""Tables that can hold events in [start, end); the partition-pruning step."""
+		if self.native:
+			return [EngagementEvent.__table__]
+		tables = [
+			self._table(partition_name(m))
+			for m in self.months()
+			if (start is None or next_month(m) > start) and (end is None or m < end)
+		]
+		if self._has_legacy_rows():
+			tables.append(EngagementEvent.__table__)
+		return tables
+
+	def query(self, columns: List[str], start: Optional[datetime] = None, end: Optional[datetime] = None):
+		"""SELECT of ``columns`` over the pruned partitions, usable as a subquery."""
+		parts = []
+		for table in self.sources(start, end):
+			stmt = select(*[table.c[c] for c in columns])
+			if start is not None:
+				stmt = stmt.where(table.c.created_at >= start)
+			if end is not None:
+				stmt = stmt.where(table.c.created_at < end)
+			parts.append(stmt)
+		if not parts:
+			return select(*[literal_column("NULL").label(c) for c in columns]).where(literal_column("1") == 0)
+		return parts[0] if len(parts) == 1 else union_all(*parts)
+
+	def counts_by_type(self, db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, int]:
+		sub = self.query(["type"], start, end).subquery()
+		return dict(db.execute(select(sub.c.type, func.count()).group_by(sub.c.type)).all())
+
+	def drop_before(self, cutoff: datetime) -> List[str]:
+		"""Drop every partition whose whole month lies before ``cutoff``."""
+		dropped = []
+		with self._lock:
+			with self.bind.begin() as conn:
+				for month in self.months():
+					if next_month(month) <= cutoff:
+						name = partition_name(month)
+						conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+						self._months.discard(month)
+						self._tables.pop(name, None)
+						dropped.append(name)
+		for name in dropped:
+			if name in self.metadata.tables:
+				self.metadata.remove(self.metadata.tables[name])
+		return dropped
+
+	def migrate_legacy(self, batch_size: int = 1000) -> int:
+		"""Routing mode only: move rows from the unpartitioned table into monthly tables."""
+		if self.native:
+			return 0
+		legacy = EngagementEvent.__table__
+		cols = ["id", "send_id", "recipient_id", "type", "details", "created_at"]
+		moved = 0
+		while True:
+			with Session(self.bind) as db:
+				rows = [dict(r._mapping) for r in db.execute(select(*[legacy.c[c] for c in cols]).order_by(legacy.c.id).limit(batch_size))]
+				if not rows:
+					break
+				last_id = rows[-1]["id"]
+				for row in rows:
+					# Monthly tables number their own rows; legacy ids would collide with them
+					del row["id"]
+					row["created_at"] = row["created_at"] or datetime.utcnow()
+				self.insert(db, rows)
+				db.execute(delete(legacy).where(legacy.c.id <= last_id))
+				db.commit()
+			moved += len(rows)
+		self._legacy_rows = False
+		return moved
+
+
+events = EventStore()
@@ -0,0 +1,225 @@
+from __future__ import annotations
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import EVENT_SPOOL_DIR, EVENT_BUFFER_MAX, EVENT_FLUSH_BATCH, EVENT_FLUSH_SECONDS
+from app.services.events import events
+from app.services.stats import stats
+from app.services.metrics import REGISTRY, DB_COMMIT_SECONDS, count_error
+
+EVENTS_ACCEPTED = REGISTRY.counter("mailer_events_accepted_total", "Tracking events accepted by the ingestion buffer.")
+EVENTS_FLUSHED = REGISTRY.counter("mailer_events_flushed_total", "Tracking events bulk-inserted into the event store.")
+EVENTS_REJECTED = REGISTRY.counter("mailer_events_rejected_total", "Tracking events refused because the buffer was full.")
+BUFFER_DEPTH = REGISTRY.gauge("mailer_event_buffer_depth", "Tracking events waiting to be flushed.")
+_FLUSH_COMMIT = DB_COMMIT_SECONDS.labels("events_flush")
+
+
+class BufferFull(Exception):
+	pass
+
+
+class EventBuffer:
+	"""Tracking events accepted in memory and bulk-inserted by a flusher thread.
+
+	``add`` appends to a deque and, when a spool directory is set, writes one
+	JSON line to the open log segment, so a request never waits on the
+	database. The flusher runs every ``interval`` seconds, or sooner once
+	``batch_size`` events are waiting. It rotates the segment, inserts the
+	batch in one transaction, and deletes the segment only after the commit.
+
+	After a crash, ``recover`` replays the leftover segments. Every event
+	carries a dedup_key, so any part of them that was already committed is
+	skipped: delivery is at-least-once, and each key is stored at most once.
+	Segments are named after the owning process and stay flock()ed by it
+	until they are deleted, so with several workers sharing the spool
+	directory only segments of dead processes are taken over.
+	"""
+
+	def __init__(
+		self,
+		spool_dir: str = EVENT_SPOOL_DIR,
+		max_events: int = EVENT_BUFFER_MAX,
+		batch_size: int = EVENT_FLUSH_BATCH,
+		interval: float = EVENT_FLUSH_SECONDS,
+	):
+		self.spool_dir = spool_dir
+		self.max_events = max_events
+		self.batch_size = max(1, batch_size)
+		self.interval = interval
+		self._rows: deque = deque()
+		self._lock = threading.Lock()
+		self._fd: Optional[int] = None
+		self._segment = ""
+		# (path, fd) of rotated or recovered segments awaiting a flush; the fd holds the lock
+		self._closed: List[Tuple[str, int]] = []
+		self._wake = threading.Event()
+		self._stop = threading.Event()
+		self._thread: Optional[threading.Thread] = None
+
+	def __len__(self) -> int:
+		return len(self._rows)
+
+	def add(
+		self,
+		send_id: int,
+		recipient_id: int,
+		event_type: str,
+		details: Optional[str] = None,
+		key: Optional[str] = None,
+	) -> str:
+		"""Accept one event and return its dedup key; raises BufferFull under overload."""
+		row = {
+			"send_id": send_id,
+			"recipient_id": recipient_id,
+			"type": event_type,
+			"details": details,
+			"dedup_key": (key or uuid.uuid4().hex)[:32],
+			"created_at": datetime.utcnow(),
+		}
+		with self._lock:
+			if len(self._rows) >= self.max_events:
+				EVENTS_REJECTED.inc()
+				raise BufferFull()
+			if self.spool_dir:
+				line = json.dumps({**row, "created_at": row["created_at"].isoformat()}, separators=(",", ":"))
+				os.write(self._open_segment(), line.encode() + b"\n")
+			self._rows.append(row)
+			depth = len(self._rows)
+		EVENTS_ACCEPTED.inc()
+		if depth >= self.batch_size:
+			self._wake.set()
+		return row["dedup_key"]
+
+	def _open_segment(self) -> int:
+		if self._fd is None:
+			os.makedirs(self.spool_dir, exist_ok=True)
+			self._segment = os.path.join(self.spool_dir, f"events-{os.getpid()}-{time.time_ns()}.log")
+			self._fd = os.open(self._segment, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+			fcntl.flock(self._fd, fcntl.LOCK_EX)
+		return self._fd
+
+	def _rotate(self) -> List[Tuple[str, int]]:
+		# Called under the lock: the events in the closed segment are exactly those being flushed.
+		# Its fd stays open, and locked, until the segment is deleted
+		if self._fd is not None:
+			self._closed.append((self._segment, self._fd))
+			self._fd = None
+		segments, self._closed = self._closed, []
+		return segments
+
+	def flush(self, db: Session) -> int:
+		with self._lock:
+			if not self._rows:
+				return 0
+			batch, self._rows = list(self._rows), deque()
+			segments = self._rotate()
+		written: List[dict] = []
+		try:
+			for i in range(0, len(batch), self.batch_size):
+				written += events.insert(db, batch[i:i + self.batch_size], skip_duplicates=True)
+			with _FLUSH_COMMIT.time():
+				db.commit()
+		except Exception:
+			db.rollback()
+			with self._lock:
+				self._rows.extendleft(reversed(batch))
+				self._closed[:0] = segments
+			raise
+		for path, fd in segments:
+			try:
+				os.remove(path)
+			except FileNotFoundError:
+				pass
+			os.close(fd)
+		stats.add_events(db, written)
+		EVENTS_FLUSHED.inc(len(written))
+		BUFFER_DEPTH.set(len(self._rows))
+		return len(written)
+
+	def recover(self) -> int:
+		"""Reload events from segments whose process exited without flushing them."""
+		if not self.spool_dir or not os.path.isdir(self.spool_dir):
+			return 0
+		loaded = 0
+		with self._lock:
+			mine = {self._segment} | {path for path, _ in self._closed}
+			for name in sorted(os.listdir(self.spool_dir)):
+				path = os.path.join(self.spool_dir, name)
+				if not name.endswith(".log") or path in mine:
+					continue
+				try:
+					fd = os.open(path, os.O_RDONLY)
+				except FileNotFoundError:
+					# Flushed and deleted by its owner meanwhile
+					continue
+				try:
+					fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+				except BlockingIOError:
+					# Still held by a live worker
+					os.close(fd)
+					continue
+				if os.fstat(fd).st_nlink == 0:
+					# Deleted between listing and locking
+					os.close(fd)
+					continue
+				with open(fd, closefd=False) as fh:
+					for line in fh:
+						try:
+							row = json.loads(line)
+						except ValueError:
+							# Torn last line from a crash mid-write
+							continue
+						row["created_at"] = datetime.fromisoformat(row["created_at"])
+						self._rows.append(row)
+						loaded += 1
+				self._closed.append((path, fd))
+		BUFFER_DEPTH.set(len(self._rows))
+		return loaded
+
+	def start(self, session_factory: Callable[[], Session]) -> None:
+		if self._thread is not None:
+			return
+		self.recover()
+		self._stop.clear()
+		self._thread = threading.Thread(target=self._run, args=(session_factory,), name="event-flusher", daemon=True)
+		self._thread.start()
+
+	def stop(self, session_factory: Callable[[], Session]) -> None:
+		if self._thread is not None:
+			self._stop.set()
+			self._wake.set()
+			self._thread.join()
+			self._thread = None
+		# Final flush; anything it cannot write stays in the spool for recover()
+		self._flush_with(session_factory)
+
+	def _run(self, session_factory: Callable[[], Session]) -> None:
+		while not self._stop.is_set():
+			self._wake.wait(self.interval)
+			self._wake.clear()
+			BUFFER_DEPTH.set(len(self._rows))
+			self._flush_with(session_factory)
+
+	def _flush_with(self, session_factory: Callable[[], Session]) -> None:
+		if not self._rows:
+			return
+		db = session_factory()
+		try:
+			self.flush(db)
+		except Exception as exc:
+			# Batch stays buffered and spooled; retried on the next wake-up
+			count_error("event_flush", exc)
+		finally:
+			db.close()
+
+
+tracking_events = EventBuffer()
@@ -0,0 +1,260 @@
+from __future__ import annotations
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import case, delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import WORKER_ID, LEASE_SECONDS, SHARD_COUNT
+from app.models import Lease
+from app.services.metrics import REGISTRY
+
+IS_LEADER = REGISTRY.gauge("mailer_scheduler_leader", "1 while this process holds the scheduler leader lease.")
+SHARDS_OWNED = REGISTRY.gauge("mailer_shards_owned", "Recipient shards this worker currently holds leases on.")
+LIVE_WORKERS = REGISTRY.gauge("mailer_live_workers", "Workers with an unexpired membership lease.")
+LEASE_TAKEOVERS = REGISTRY.counter("mailer_lease_takeovers_total", "Leases taken over from another owner after release or expiry.")
+
+WORKER_PREFIX = "worker:"
+SHARD_PREFIX = "shard:"
+LEADER = "leader:scheduler"
+
+
+class LeaseStore:
+	"""Named, expiring ownership rows in the leases table.
+
+	Every change is a single conditional UPDATE (or an INSERT guarded by the
+	primary key), so two workers racing for the same name cannot both win.
+	Expiry compares wall clocks across hosts, which therefore need to be in
+	sync to well within ``ttl``.
+	"""
+
+	def __init__(self, owner: str = WORKER_ID, ttl: float = LEASE_SECONDS, clock: Callable[[], datetime] = datetime.utcnow):
+		self.owner = owner
+		self.ttl = ttl
+		self.clock = clock
+
+	def acquire(self, db: Session, name: str) -> bool:
+		"""Take or renew ``name``; False while another owner's lease is unexpired."""
+		now = self.clock()
+		previous = db.execute(select(Lease.owner).where(Lease.name == name)).scalar()
+		if previous is None:
+			return self._insert(db, name, now)
+		result = db.execute(
+			update(Lease)
+			.where(Lease.name == name, (Lease.owner == self.owner) | (Lease.expires_at < now))
+			.values(
+				epoch=case((Lease.owner == self.owner, Lease.epoch), else_=Lease.epoch + 1),
+				acquired_at=case((Lease.owner == self.owner, Lease.acquired_at), else_=now),
+				owner=self.owner,
+				expires_at=now + timedelta(seconds=self.ttl),
+			)
+			.execution_options(synchronize_session=False)
+		)
+		if result.rowcount != 1:
+			db.rollback()
+			return False
+		db.commit()
+		if previous != self.owner:
+			LEASE_TAKEOVERS.inc()
+		return True
+
+	def _insert(self, db: Session, name: str, now: datetime) -> bool:
+		db.add(Lease(name=name, owner=self.owner, epoch=1, expires_at=now + timedelta(seconds=self.ttl), acquired_at=now))
+		try:
+			db.commit()
+		except IntegrityError:
+			# Someone else inserted it first
+			db.rollback()
+			return False
+		return True
+
+	def renew(self, db: Session, names: Iterable[str]) -> Set[str]:
+		"""Extend the given leases that are still ours; returns the ones renewed."""
+		names = list(names)
+		if not names:
+			return set()
+		now = self.clock()
+		db.execute(
+			update(Lease)
+			.where(Lease.name.in_(names), Lease.owner == self.owner, Lease.expires_at >= now)
+			.values(expires_at=now + timedelta(seconds=self.ttl))
+			.execution_options(synchronize_session=False)
+		)
+		db.commit()
+		return {
+			n for (n,) in db.execute(
+				select(Lease.name).where(Lease.name.in_(names), Lease.owner == self.owner, Lease.expires_at > now)
+			)
+		}
+
+	def release(self, db: Session, names: Iterable[str]) -> None:
+		names = list(names)
+		if not names:
+			return
+		db.execute(
+			update(Lease)
+			.where(Lease.name.in_(names), Lease.owner == self.owner)
+			.values(expires_at=self.clock() - timedelta(seconds=1))
+			.execution_options(synchronize_session=False)
+		)
+		db.commit()
+
+	def live(self, db: Session, prefix: str) -> Dict[str, str]:
+		"""Unexpired leases whose name starts with ``prefix``, as name -> owner."""
+		rows = db.execute(
+			select(Lease.name, Lease.owner).where(Lease.name.like(prefix + "%"), Lease.expires_at >= self.clock())
+		)
+		return {name: owner for name, owner in rows}
+
+	def purge(self, db: Session, older_than: float = 3600.0) -> None:
+		# Membership rows of workers that are long gone
+		cutoff = self.clock() - timedelta(seconds=older_than)
+		db.execute(delete(Lease).where(Lease.name.like(WORKER_PREFIX + "%"), Lease.expires_at < cutoff))
+		db.commit()
+
+
+class LeaderElection:
+	"""At most one holder of a named lease across all processes and hosts.
+
+	Candidates call ``elect`` (taking the lease if it is free or expired, or
+	renewing it if already theirs); the holder keeps it with ``heartbeat``.
+	Leadership is trusted locally only until shortly before the lease could
+	expire, and send cycles check ``is_leader`` before every claim batch and
+	delivery, so a stalled leader stops acting before anyone else can take over.
+	Callbacks registered with ``on_gain`` run whenever ``elect`` turns this
+	process into the leader, whichever job called it.
+	"""
+
+	def __init__(self, name: str = LEADER, store: Optional[LeaseStore] = None):
+		self.name = name
+		self.store = store or LeaseStore()
+		self._valid_until: Optional[datetime] = None
+		self._lock = threading.Lock()
+		self._on_gain: List[Callable[[], None]] = []
+
+	def on_gain(self, callback: Callable[[], None]) -> None:
+		self._on_gain.append(callback)
+
+	@property
+	def is_leader(self) -> bool:
+		return self._valid_until is not None and self.store.clock() < self._valid_until
+
+	def _set(self, held: bool, renewed_at: datetime) -> bool:
+		self._valid_until = renewed_at + timedelta(seconds=self.store.ttl * 0.8) if held else None
+		IS_LEADER.set(1 if held else 0)
+		return held
+
+	def elect(self, db: Session) -> bool:
+		with self._lock:
+			was_leader = self.is_leader
+			now = self.store.clock()
+			held = self._set(self.store.acquire(db, self.name), now)
+			if held and not was_leader:
+				for callback in self._on_gain:
+					callback()
+			return held
+
+	def heartbeat(self, db: Session) -> bool:
+		with self._lock:
+			if self._valid_until is None:
+				return False
+			now = self.store.clock()
+			return self._set(bool(self.store.renew(db, [self.name])), now)
+
+	def resign(self, db: Session) -> None:
+		with self._lock:
+			if self._valid_until is not None:
+				self.store.release(db, [self.name])
+			self._set(False, self.store.clock())
+
+
+def assign_shards(workers: List[str], count: int = SHARD_COUNT) -> Dict[int, str]:
+	# Deterministic: every worker computes the same plan from the same membership list
+	workers = sorted(workers)
+	return {shard: workers[shard % len(workers)] for shard in range(count)} if workers else {}
+
+
+class ShardCoordinator:
+	"""Splits the recipient shards among live workers, using leases only.
+
+	Each worker keeps a ``worker:<id>`` membership lease alive and, between
+	send cycles, calls ``rebalance``: it computes the same round-robin plan as
+	every other worker from the live membership, releases shards the plan
+	gives away and tries to acquire shards the plan gives it. A shard changes
+	hands only once its old owner has released it or let it expire. A cycle
+	re-checks ``shards()`` before each claim batch and before delivering each
+	message, and ``shards()`` stops vouching for a lease before it can
+	expire, so two workers never select from the same shard at once.
+	``heartbeat`` only renews, and is safe to call while a cycle is running.
+	"""
+
+	def __init__(self, store: Optional[LeaseStore] = None, count: int = SHARD_COUNT):
+		self.store = store or LeaseStore()
+		self.count = max(1, count)
+		self._held: Set[int] = set()
+		self._valid_until: Optional[datetime] = None
+		self._lock = threading.Lock()
+		# heartbeat() runs on its own timer, possibly during rebalance()
+		self._sync = threading.Lock()
+
+	@property
+	def enabled(self) -> bool:
+		return self.count > 1
+
+	@property
+	def member_name(self) -> str:
+		return WORKER_PREFIX + self.store.owner
+
+	def shards(self) -> List[int]:
+		"""Shards this worker may select from now; empty if its leases may have lapsed."""
+		with self._lock:
+			if self._valid_until is None or self.store.clock() >= self._valid_until:
+				return []
+			return sorted(self._held)
+
+	def _set(self, held: Set[int], renewed_at: datetime) -> None:
+		with self._lock:
+			self._held = held
+			# Stop trusting the leases a little before they can expire
+			self._valid_until = renewed_at + timedelta(seconds=self.store.ttl * 0.8)
+		SHARDS_OWNED.set(len(held))
+
+	def heartbeat(self, db: Session) -> List[int]:
+		with self._sync:
+			now = self.store.clock()
+			self.store.acquire(db, self.member_name)
+			renewed = self.store.renew(db, [SHARD_PREFIX + str(s) for s in self._held])
+			self._set({int(n[len(SHARD_PREFIX):]) for n in renewed}, now)
+		return self.shards()
+
+	def rebalance(self, db: Session) -> List[int]:
+		with self._sync:
+			self._rebalance(db)
+		return self.shards()
+
+	def _rebalance(self, db: Session) -> None:
+		now = self.store.clock()
+		self.store.acquire(db, self.member_name)
+		workers = [name[len(WORKER_PREFIX):] for name in self.store.live(db, WORKER_PREFIX)]
+		LIVE_WORKERS.set(len(workers))
+		plan = assign_shards(workers, self.count)
+		target = {shard for shard, owner in plan.items() if owner == self.store.owner}
+		held = set(self._held)
+		self.store.release(db, [SHARD_PREFIX + str(s) for s in held - target])
+		kept = self.store.renew(db, [SHARD_PREFIX + str(s) for s in held & target])
+		owned = {int(n[len(SHARD_PREFIX):]) for n in kept}
+		for shard in sorted(target - owned):
+			if self.store.acquire(db, SHARD_PREFIX + str(shard)):
+				owned.add(shard)
+		self._set(owned, now)
+
+	def leave(self, db: Session) -> None:
+		with self._sync:
+			self.store.release(db, [SHARD_PREFIX + str(s) for s in self._held] + [self.member_name])
+			self._set(set(), self.store.clock() - timedelta(seconds=self.store.ttl))
+
+
+coordinator = ShardCoordinator()
+leader = LeaderElection()
@@ -0,0 +1,114 @@
+from __future__ import annotations
+import hashlib
+import re
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import PUBLIC_BASE_URL, LINK_CACHE_SIZE
+from app.db import engine
+from app.models import TrackedLink
+from app.services.metrics import REGISTRY
+
+LINK_LOOKUPS = REGISTRY.counter("mailer_link_lookups_total", "Click redirect lookups by cache outcome.", ["outcome"])
+_HITS = LINK_LOOKUPS.labels("hit")
+_MISSES = LINK_LOOKUPS.labels("miss")
+
+# Trailing sentence punctuation is not part of the link
+URL_RE = re.compile(r"https?://[^\s<>\"'\])]*[^\s<>\"'\]).,;:!?]")
+# Left in the template and replaced per send once its id exists
+CLICK_TOKEN = "{{_ct}}"
+
+
+def fill_click_token(body: str, token: str) -> str:
+	return body.replace(CLICK_TOKEN, token) if CLICK_TOKEN in body else body
+
+
+class LinkRewriter:
+	"""Rewrites campaign links to tracked short links, once per campaign template.
+
+	Each distinct URL gets a tracked_links row and a random code. The rewritten
+	template is cached by (campaign, template hash), so recipients only pay
+	for the normal placeholder substitution. URLs containing ``{{...}}``
+	placeholders are not rewritten.
+	"""
+
+	def __init__(self, base_url: str = PUBLIC_BASE_URL):
+		self.base_url = base_url.rstrip("/")
+		self._templates: Dict[Tuple[int, str], str] = {}
+		self._lock = threading.Lock()
+
+	def rewrite(self, db: Session, campaign_id: int, template: str) -> str:
+		key = (campaign_id, hashlib.sha256(template.encode()).hexdigest())
+		rewritten = self._templates.get(key)
+		if rewritten is not None:
+			return rewritten
+		with self._lock:
+			codes = {
+				url: self._code_for(db, campaign_id, url)
+				for url in dict.fromkeys(URL_RE.findall(template))
+				# Personalized links differ per recipient and are left untracked rather than
+				# stored, braces and all, as one redirect target for everyone
+				if not url.startswith(self.base_url) and "{{" not in url
+			}
+			rewritten = URL_RE.sub(
+				lambda m: f"{self.base_url}/c/{codes[m.group(0)]}/{CLICK_TOKEN}" if m.group(0) in codes else m.group(0),
+				template,
+			)
+			self._templates[key] = rewritten
+			return rewritten
+
+	def _code_for(self, db: Session, campaign_id: int, url: str) -> str:
+		code = db.execute(
+			select(TrackedLink.code).where(TrackedLink.campaign_id == campaign_id, TrackedLink.url == url)
+		).scalar()
+		while code is None:
+			candidate = secrets.token_urlsafe(6)
+			try:
+				db.execute(insert(TrackedLink).values(campaign_id=campaign_id, url=url, code=candidate))
+				db.commit()
+				code = candidate
+			except IntegrityError:
+				# Code collision; draw another
+				db.rollback()
+		return code
+
+
+class LinkResolver:
+	"""code -> URL with an in-memory LRU in front of tracked_links.
+
+	Codes never change once issued, so cached entries need no invalidation.
+	"""
+
+	def __init__(self, size: int = LINK_CACHE_SIZE, bind=engine):
+		self.size = max(1, size)
+		self.bind = bind
+		self._cache: "OrderedDict[str, str]" = OrderedDict()
+		self._lock = threading.Lock()
+
+	def resolve(self, code: str) -> Optional[str]:
+		with self._lock:
+			url = self._cache.get(code)
+			if url is not None:
+				self._cache.move_to_end(code)
+		if url is not None:
+			_HITS.inc()
+			return url
+		_MISSES.inc()
+		with self.bind.connect() as conn:
+			url = conn.execute(select(TrackedLink.url).where(TrackedLink.code == code)).scalar()
+		if url is not None:
+			with self._lock:
+				self._cache[code] = url
+				if len(self._cache) > self.size:
+					self._cache.popitem(last=False)
+		return url
+
+
+link_rewriter = LinkRewriter()
+links = LinkResolver()
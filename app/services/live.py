@@ -0,0 +1,159 @@
+from __future__ import annotations
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Callable, Dict, Optional, Set
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import DASHBOARD_PUSH_SECONDS, DASHBOARD_RESYNC_SECONDS
+from app.models import EmailSend, Recipient
+from app.services.events import events
+from app.services.metrics import REGISTRY, SENDS_WRITTEN, EVENTS_RECORDED, INBOX_PLACEMENT, count_error
+
+SUBSCRIBERS = REGISTRY.gauge("mailer_dashboard_subscribers", "Open live-dashboard streams.")
+HEARTBEAT_SECONDS = 15.0
+
+# Dashboard key -> engagement event type
+_EVENT_KEYS = {"opens": "opened", "replies": "replied", "bounces": "bounced", "unsubs": "unsubscribed"}
+
+
+def load_counts(db: Session) -> Dict[str, int]:
+	"""The dashboard numbers straight from the database."""
+	by_type = events.counts_by_type(db)
+	placed = dict(db.execute(
+		select(EmailSend.inbox_placement, func.count()).where(EmailSend.inbox_placement.isnot(None)).group_by(EmailSend.inbox_placement)
+	).all())
+	counts = {
+		"recipients_count": db.execute(select(func.count()).select_from(Recipient)).scalar(),
+		"sends": db.execute(select(func.count()).select_from(EmailSend)).scalar(),
+		"inbox_known": sum(placed.values()),
+		"inbox_success": placed.get(True, 0),
+	}
+	for key, event_type in _EVENT_KEYS.items():
+		counts[key] = by_type.get(event_type, 0)
+	return counts
+
+
+def with_success_pct(counts: Dict[str, int]) -> Dict[str, object]:
+	known = counts["inbox_known"]
+	return {**counts, "success_pct": round(counts["inbox_success"] / known * 100, 2) if known else None}
+
+
+def _readings() -> Dict[str, float]:
+	readings = {key: EVENTS_RECORDED.labels(t).value for key, t in _EVENT_KEYS.items()}
+	inbox = INBOX_PLACEMENT.labels("inbox").value
+	readings["sends"] = SENDS_WRITTEN.value
+	readings["inbox_success"] = inbox
+	readings["inbox_known"] = inbox + INBOX_PLACEMENT.labels("other").value
+	return readings
+
+
+class DashboardFeed:
+	"""Live dashboard numbers, computed once per interval for every viewer.
+
+	A baseline is read from the database every ``resync`` seconds. Between
+	resyncs, snapshots add how far this process's counters have moved, so
+	an interval costs no queries however many streams are open. Each
+	stream gets the full snapshot once, then only the keys that changed.
+
+	Only the process running send cycles (the scheduler leader, or a shard
+	owner) moves the send counters, so dashboards served by other workers
+	lag by up to ``resync`` (DASHBOARD_RESYNC_SECONDS) seconds.
+	"""
+
+	def __init__(
+		self,
+		session_factory: Callable[[], Session],
+		interval: float = DASHBOARD_PUSH_SECONDS,
+		resync: float = DASHBOARD_RESYNC_SECONDS,
+	):
+		self.session_factory = session_factory
+		self.interval = interval
+		self.resync_every = resync
+		self._baseline: Optional[Dict[str, int]] = None
+		self._marks: Dict[str, float] = {}
+		self._synced_at = 0.0
+		self._current: Dict[str, object] = {}
+		self._subscribers: Set[asyncio.Queue] = set()
+		self._task: Optional[asyncio.Task] = None
+
+	def resync(self) -> None:
+		marks = _readings()
+		db = self.session_factory()
+		try:
+			baseline = load_counts(db)
+		finally:
+			db.close()
+		self._baseline, self._marks = baseline, marks
+		self._synced_at = time.monotonic()
+
+	def snapshot(self) -> Dict[str, object]:
+		if self._baseline is None:
+			self.resync()
+		now = _readings()
+		counts = dict(self._baseline)
+		for key, value in now.items():
+			counts[key] += int(value - self._marks.get(key, 0))
+		return with_success_pct(counts)
+
+	def subscribe(self) -> asyncio.Queue:
+		q: asyncio.Queue = asyncio.Queue(maxsize=8)
+		self._subscribers.add(q)
+		SUBSCRIBERS.set(len(self._subscribers))
+		return q
+
+	def unsubscribe(self, q: asyncio.Queue) -> None:
+		self._subscribers.discard(q)
+		SUBSCRIBERS.set(len(self._subscribers))
+
+	def _publish(self, message: str) -> None:
+		for q in list(self._subscribers):
+			try:
+				q.put_nowait(message)
+			except asyncio.QueueFull:
+				# Slow client: drop its backlog and resend everything
+				while not q.empty():
+					q.get_nowait()
+				q.put_nowait(_sse("snapshot", self._current))
+
+	async def run(self) -> None:
+		while True:
+			try:
+				if self._baseline is None or time.monotonic() - self._synced_at >= self.resync_every:
+					await run_in_threadpool(self.resync)
+				snap = self.snapshot()
+				delta = {k: v for k, v in snap.items() if self._current.get(k) != v}
+				self._current = snap
+				if delta and self._subscribers:
+					self._publish(_sse("delta", delta))
+			except Exception as exc:
+				count_error("dashboard_feed", exc)
+			await asyncio.sleep(self.interval)
+
+	def start(self) -> None:
+		if self._task is None:
+			self._task = asyncio.get_running_loop().create_task(self.run())
+
+	def stop(self) -> None:
+		if self._task is not None:
+			self._task.cancel()
+			self._task = None
+
+	async def stream(self, is_disconnected: Callable) -> AsyncIterator[str]:
+		q = self.subscribe()
+		try:
+			yield _sse("snapshot", self._current or self.snapshot())
+			while not await is_disconnected():
+				try:
+					yield await asyncio.wait_for(q.get(), timeout=HEARTBEAT_SECONDS)
+				except asyncio.TimeoutError:
+					yield ": keep-alive\n\n"
+		finally:
+			self.unsubscribe(q)
+
+
+def _sse(event: str, data: Dict[str, object]) -> str:
+	return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
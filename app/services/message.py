@@ -0,0 +1,61 @@
+from __future__ import annotations
+from email.message import EmailMessage
+from functools import lru_cache
+from typing import Dict
+from urllib.parse import quote, urlsplit
+
+from app.config import PUBLIC_BASE_URL, UNSUBSCRIBE_MAILTO
+from app.services.compliance import make_unsubscribe_token
+
+
+class CampaignHeaders:
+	"""Per-campaign header parts, so each message only splices in its token.
+
+	The unsubscribe URL in the headers is the same signed link as the footer,
+	and it accepts the RFC 8058 one-click POST.
+	"""
+
+	def __init__(self, campaign_id: int, base_url: str, mailto: str):
+		base = base_url.rstrip("/")
+		self.url_prefix = f"{base}/unsubscribe?t="
+		mailto_part = f"<mailto:{mailto}?subject={quote(f'unsubscribe-{campaign_id}')}>, " if mailto else ""
+		self.header_prefix = f"{mailto_part}<{self.url_prefix}"
+		# One-click is only honoured by providers for https targets
+		self.one_click = base.startswith("https://")
+		host = urlsplit(base).hostname or "localhost"
+		self.list_id = f"<campaign-{campaign_id}.{host}>"
+
+	def link(self, token: str) -> str:
+		return self.url_prefix + token
+
+	def for_token(self, token: str) -> Dict[str, str]:
+		headers = {
+			"List-Id": self.list_id,
+			"List-Unsubscribe": f"{self.header_prefix}{token}>",
+		}
+		if self.one_click:
+			headers["List-Unsubscribe-Post"] = "List-Unsubscribe=One-Click"
+		return headers
+
+
+@lru_cache(maxsize=1024)
+def campaign_headers(campaign_id: int, base_url: str = PUBLIC_BASE_URL, mailto: str = UNSUBSCRIBE_MAILTO) -> CampaignHeaders:
+	return CampaignHeaders(campaign_id, base_url, mailto)
+
+
+def unsubscribe_parts(campaign_id: int, recipient_id: int) -> tuple[str, Dict[str, str]]:
+	"""Footer link and list headers for one recipient, from a single signed token."""
+	parts = campaign_headers(campaign_id)
+	token = make_unsubscribe_token(recipient_id)
+	return parts.link(token), parts.for_token(token)
+
+
+def build_message(sender: str, recipient: str, subject: str, body: str, headers: Dict[str, str] | None = None) -> EmailMessage:
+	msg = EmailMessage()
+	msg["Subject"] = subject
+	msg["From"] = sender
+	msg["To"] = recipient
+	for name, value in (headers or {}).items():
+		msg[name] = value
+	msg.set_content(body)
+	return msg
@@ -0,0 +1,202 @@
+from __future__ import annotations
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+# Latency buckets in seconds, shared by all histograms unless overridden
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+	parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+	if extra:
+		parts.append(extra)
+	return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+	return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_value(value: float) -> str:
+	if value == float("inf"):
+		return "+Inf"
+	return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+	kind = ""
+
+	def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+		self.name = name
+		self.doc = doc
+		self.labelnames = tuple(labelnames)
+		self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+		self._lock = threading.Lock()
+
+	def labels(self, *values: str):
+		key = tuple(str(v) for v in values)
+		child = self._children.get(key)
+		if child is None:
+			with self._lock:
+				child = self._children.get(key)
+				if child is None:
+					child = self._new_child()
+					self._children[key] = child
+		return child
+
+	def _new_child(self):
+		raise NotImplementedError
+
+	def _series(self) -> Iterator[Tuple[Tuple[str, ...], "_Metric"]]:
+		if self.labelnames:
+			yield from list(self._children.items())
+		else:
+			yield (), self
+
+	def expose(self) -> List[str]:
+		lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+		for values, child in self._series():
+			lines.extend(child._samples(self.name, self.labelnames, values))
+		return lines
+
+
+class Counter(_Metric):
+	kind = "counter"
+
+	def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+		super().__init__(name, doc, labelnames)
+		self.value = 0.0
+
+	def _new_child(self):
+		return Counter(self.name, self.doc)
+
+	def inc(self, amount: float = 1.0) -> None:
+		with self._lock:
+			self.value += amount
+
+	def total(self) -> float:
+		# Sum over all label values; cheap enough to read per request
+		if self.labelnames:
+			return sum(child.value for child in list(self._children.values()))
+		return self.value
+
+	def _samples(self, name, labelnames, values):
+		return [f"{name}{_fmt_labels(labelnames, values)} {_fmt_value(self.value)}"]
+
+
+class Gauge(_Metric):
+	kind = "gauge"
+
+	def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+		super().__init__(name, doc, labelnames)
+		self.value = 0.0
+
+	def _new_child(self):
+		return Gauge(self.name, self.doc)
+
+	def set(self, value: float) -> None:
+		# Plain attribute store is atomic under the GIL; no lock needed
+		self.value = value
+
+	def inc(self, amount: float = 1.0) -> None:
+		with self._lock:
+			self.value += amount
+
+	def _samples(self, name, labelnames, values):
+		return [f"{name}{_fmt_labels(labelnames, values)} {_fmt_value(self.value)}"]
+
+
+class Histogram(_Metric):
+	kind = "histogram"
+
+	def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+		super().__init__(name, doc, labelnames)
+		self.buckets = tuple(sorted(buckets))
+		self._counts = [0] * (len(self.buckets) + 1)
+		self.sum = 0.0
+		self.count = 0
+
+	def _new_child(self):
+		return Histogram(self.name, self.doc, buckets=self.buckets)
+
+	def observe(self, value: float) -> None:
+		# Store per-bucket counts and accumulate only at exposition time
+		idx = bisect_left(self.buckets, value)
+		with self._lock:
+			self._counts[idx] += 1
+			self.sum += value
+			self.count += 1
+
+	@contextmanager
+	def time(self):
+		t0 = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.observe(time.perf_counter() - t0)
+
+	def _samples(self, name, labelnames, values):
+		with self._lock:
+			counts = list(self._counts)
+			total, count = self.sum, self.count
+		lines = []
+		cumulative = 0
+		for bound, n in zip(self.buckets + (float("inf"),), counts):
+			cumulative += n
+			le = f'le="{_fmt_value(bound)}"'
+			lines.append(f"{name}_bucket{_fmt_labels(labelnames, values, le)} {cumulative}")
+		lines.append(f"{name}_sum{_fmt_labels(labelnames, values)} {_fmt_value(total)}")
+		lines.append(f"{name}_count{_fmt_labels(labelnames, values)} {count}")
+		return lines
+
+
+class Registry:
+	def __init__(self):
+		self._metrics: Dict[str, _Metric] = {}
+		self._lock = threading.Lock()
+
+	def register(self, metric: _Metric) -> _Metric:
+		with self._lock:
+			existing = self._metrics.get(metric.name)
+			if existing is not None:
+				return existing
+			self._metrics[metric.name] = metric
+			return metric
+
+	def counter(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> Counter:
+		return self.register(Counter(name, doc, labelnames))
+
+	def gauge(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> Gauge:
+		return self.register(Gauge(name, doc, labelnames))
+
+	def histogram(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+		return self.register(Histogram(name, doc, labelnames, buckets))
+
+	def expose(self) -> str:
+		lines: List[str] = []
+		for metric in list(self._metrics.values()):
+			lines.extend(metric.expose())
+		return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+CYCLE_SECONDS = REGISTRY.histogram("mailer_cycle_seconds", "Wall time of one sending cycle.")
+RECIPIENTS_SELECTED = REGISTRY.counter("mailer_recipients_selected_total", "Recipients selected for sending.")
+STAGE_SECONDS = REGISTRY.histogram("mailer_stage_seconds", "Per-item processing time by pipeline stage.", ["stage"])
+RENDER_SECONDS = REGISTRY.histogram("mailer_render_seconds", "Time to personalize and render one message.")
+DB_COMMIT_SECONDS = REGISTRY.histogram("mailer_db_commit_seconds", "Latency of database commits in the send path.", ["op"])
+SMTP_SECONDS = REGISTRY.histogram("mailer_smtp_seconds", "Latency of one SMTP delivery (simulated or real).")
+QUEUE_DEPTH = REGISTRY.gauge("mailer_queue_depth", "Items waiting in a pipeline stage inbox.", ["stage"])
+SENDS_WRITTEN = REGISTRY.counter("mailer_sends_written_total", "Send rows committed by the persist stage.")
+EVENTS_RECORDED = REGISTRY.counter("mailer_events_recorded_total", "Engagement events committed, by type.", ["type"])
+INBOX_PLACEMENT = REGISTRY.counter("mailer_inbox_placement_total", "Delivered messages by simulated placement.", ["result"])
+ERRORS = REGISTRY.counter("mailer_errors_total", "Errors by where they happened and exception class.", ["source", "error"])
+
+
+def count_error(source: str, exc: BaseException) -> None:
+	ERRORS.labels(source, type(exc).__name__).inc()
@@ -0,0 +1,189 @@
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Protocol, Tuple
+
+from app.config import MX_BACKEND, MX_CACHE_PATH, MX_ZONE_FILE, MX_NEGATIVE_TTL, SMTP_HOST
+from app.services.metrics import REGISTRY
+
+MX_LOOKUPS = REGISTRY.counter("mailer_mx_lookups_total", "MX lookups by cache outcome.", ["outcome"])
+_HITS = MX_LOOKUPS.labels("hit")
+_MISSES = MX_LOOKUPS.labels("miss")
+
+MxSet = List[Tuple[int, str]]
+
+
+class NoSuchDomain(LookupError):
+	"""The domain does not exist (NXDOMAIN): nothing can be delivered there."""
+
+
+class MxUnavailable(LookupError):
+	"""The lookup itself failed (timeout, no reachable nameserver); worth retrying later."""
+
+
+class MXBackend(Protocol):
+	def resolve(self, domain: str) -> Tuple[MxSet, int]:
+		"""Return ([(preference, host)], ttl_seconds); an empty list means no MX.
+
+		Raises NoSuchDomain for a domain that does not exist and MxUnavailable
+		when the answer could not be obtained.
+		"""
+
+
+class RelayBackend:
+	"""Every domain is served by the single configured relay (SMTP_HOST)."""
+
+	def __init__(self, host: str = SMTP_HOST, ttl: int = 86400):
+		self.host = host
+		self.ttl = ttl
+
+	def resolve(self, domain: str) -> Tuple[MxSet, int]:
+		return [(0, self.host)], self.ttl
+
+
+class StaticZoneBackend:
+	"""MX records from a BIND-style zone file, for tests and offline runs.
+
+	Understands ``$TTL`` and ``<name> [ttl] [IN] MX <preference> <host>``
+	lines; everything else is ignored.
+	"""
+
+	def __init__(self, path: str, default_ttl: int = 3600):
+		self.records: Dict[str, Tuple[MxSet, int]] = {}
+		ttl_default = default_ttl
+		with open(path) as fh:
+			for line in fh:
+				line = line.split(";", 1)[0].strip()
+				if not line:
+					continue
+				parts = line.split()
+				if parts[0].upper() == "$TTL" and len(parts) > 1:
+					ttl_default = int(parts[1])
+					continue
+				upper = [p.upper() for p in parts]
+				if "MX" not in upper:
+					continue
+				idx = upper.index("MX")
+				if idx + 2 >= len(parts):
+					continue
+				name = parts[0].rstrip(".").lower()
+				ttl = next((int(p) for p in parts[1:idx] if p.isdigit()), ttl_default)
+				pref, host = int(parts[idx + 1]), parts[idx + 2].rstrip(".").lower()
+				records, _ = self.records.get(name, ([], ttl))
+				records.append((pref, host))
+				self.records[name] = (records, ttl)
+
+	def resolve(self, domain: str) -> Tuple[MxSet, int]:
+		return self.records.get(domain, ([], 3600))
+
+
+class DnsBackend:
+	"""Live lookups through dnspython (installed with email-validator)."""
+
+	def __init__(self, lifetime: float = 5.0):
+		import dns.exception
+		import dns.resolver
+
+		self._dns = dns
+		self.resolver = dns.resolver.Resolver()
+		self.resolver.lifetime = lifetime
+
+	def resolve(self, domain: str) -> Tuple[MxSet, int]:
+		try:
+			answer = self.resolver.resolve(domain, "MX")
+		except self._dns.resolver.NoAnswer:
+			# The name exists without MX records: implicit MX, the domain itself (RFC 5321 5.1)
+			return [], MX_NEGATIVE_TTL
+		except self._dns.resolver.NXDOMAIN as exc:
+			raise NoSuchDomain(f"{domain}: domain does not exist") from exc
+		except (self._dns.resolver.NoNameservers, self._dns.exception.Timeout) as exc:
+			raise MxUnavailable(f"{domain}: MX lookup failed ({type(exc).__name__})") from exc
+		records = [(r.preference, str(r.exchange).rstrip(".").lower()) for r in answer]
+		return records, int(answer.rrset.ttl)
+
+
+@dataclass
+class _Entry:
+	records: MxSet
+	expires_at: float
+
+
+class MXResolver:
+	"""TTL-respecting MX cache in front of a pluggable backend.
+
+	Entries are persisted to ``cache_path`` as JSON with absolute expiry
+	times, so a restart starts warm. A domain without MX records falls back
+	to the domain itself, as SMTP's implicit MX rule requires. A domain that
+	does not exist is cached for the negative TTL as an empty entry and raises
+	NoSuchDomain; failed lookups (MxUnavailable) are not cached.
+	"""
+
+	def __init__(self, backend: MXBackend, cache_path: str = "", clock: Callable[[], float] = time.time):
+		self.backend = backend
+		self.cache_path = cache_path
+		self.clock = clock
+		self._cache: Dict[str, _Entry] = {}
+		self._lock = threading.Lock()
+		self._dirty = False
+
+	def load(self) -> int:
+		if not self.cache_path or not os.path.exists(self.cache_path):
+			return 0
+		with open(self.cache_path) as fh:
+			raw = json.load(fh)
+		now = self.clock()
+		with self._lock:
+			for domain, (records, expires_at) in raw.items():
+				if expires_at > now:
+					self._cache[domain] = _Entry([tuple(r) for r in records], expires_at)
+		return len(self._cache)
+
+	def save(self) -> None:
+		if not self.cache_path or not self._dirty:
+			return
+		now = self.clock()
+		with self._lock:
+			data = {d: (e.records, e.expires_at) for d, e in self._cache.items() if e.expires_at > now}
+			self._dirty = False
+		tmp = f"{self.cache_path}.tmp"
+		with open(tmp, "w") as fh:
+			json.dump(data, fh)
+		os.replace(tmp, self.cache_path)
+
+	def lookup(self, domain: str) -> MxSet:
+		domain = domain.lower().rstrip(".")
+		entry = self._cache.get(domain)
+		if entry is not None and entry.expires_at > self.clock():
+			_HITS.inc()
+			if not entry.records:
+				raise NoSuchDomain(f"{domain}: domain does not exist")
+			return entry.records
+		_MISSES.inc()
+		try:
+			records, ttl = self.backend.resolve(domain)
+			records = sorted(records) or [(0, domain)]
+		except NoSuchDomain:
+			records, ttl = [], MX_NEGATIVE_TTL
+		with self._lock:
+			self._cache[domain] = _Entry(records, self.clock() + max(ttl, 1))
+			self._dirty = True
+		if not records:
+			raise NoSuchDomain(f"{domain}: domain does not exist")
+		return records
+
+	def primary(self, domain: str) -> str:
+		return self.lookup(domain)[0][1]
+
+
+def make_backend(kind: str = MX_BACKEND) -> MXBackend:
+	if kind == "dns":
+		return DnsBackend()
+	if kind == "static":
+		return StaticZoneBackend(MX_ZONE_FILE)
+	return RelayBackend()
+
+
+resolver = MXResolver(make_backend(), MX_CACHE_PATH)
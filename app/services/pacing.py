@@ -0,0 +1,206 @@
+from __future__ import annotations
+import math
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pytz
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.config import (
+	TIMEZONE,
+	SEND_WINDOW_START_HOUR,
+	SEND_WINDOW_END_HOUR,
+	TICK_INTERVAL_SECONDS,
+	TICK_MIN_SECONDS,
+	TICK_TARGET_CYCLE_SECONDS,
+)
+from app.models import EmailSend, Recipient
+from app.services.metrics import REGISTRY
+from app.services.pipeline import PipelineResult
+
+SENDS_DUE = REGISTRY.gauge("mailer_sends_due", "Messages the pacing schedule says are due now, over all senders.")
+CYCLE_BUDGET = REGISTRY.gauge("mailer_cycle_budget", "Recipients the next cycle may select, from measured capacity.")
+TICK_DELAY = REGISTRY.gauge("mailer_tick_delay_seconds", "Delay chosen before the next scheduler tick.")
+
+
+class SendWindow:
+	"""Daily sending hours in a local timezone, converted to naive UTC bounds."""
+
+	def __init__(self, start_hour: int = SEND_WINDOW_START_HOUR, end_hour: int = SEND_WINDOW_END_HOUR, tz: str = TIMEZONE):
+		if not 0 <= start_hour < end_hour <= 24:
+			start_hour, end_hour = 0, 24
+		self.start_hour = start_hour
+		self.end_hour = end_hour
+		self.tz = pytz.timezone(tz)
+
+	def day_bounds(self, now: datetime) -> Tuple[date, datetime, datetime, datetime]:
+		"""(local day, local midnight, window start, window end), all but the day as naive UTC."""
+		local = pytz.utc.localize(now).astimezone(self.tz)
+		day = local.date()
+
+		def at(hours: int) -> datetime:
+			moment = self.tz.localize(datetime(day.year, day.month, day.day)) + timedelta(hours=hours)
+			return self.tz.normalize(moment).astimezone(pytz.utc).replace(tzinfo=None)
+
+		return day, at(0), at(self.start_hour), at(self.end_hour)
+
+	def elapsed(self, now: datetime) -> float:
+		_, _, start, end = self.day_bounds(now)
+		if now <= start:
+			return 0.0
+		if now >= end:
+			return 1.0
+		return (now - start).total_seconds() / (end - start).total_seconds()
+
+
+class SendPacer:
+	"""Spreads each sender's daily cap evenly over the sending window.
+
+	A sender is due ``floor(cap * elapsed_fraction) - sent_today`` messages, so
+	a late or short cycle is caught up by the next one instead of being lost,
+	and nothing is sent ahead of schedule. Today's counts are read from
+	email_sends once per local day, then kept in memory. When this worker
+	holds only some recipient shards, ``scope`` restricts those counts to
+	sends to its shards, and callers pass the matching share of the cap.
+	"""
+
+	def __init__(self, window: Optional[SendWindow] = None, clock: Callable[[], datetime] = datetime.utcnow):
+		self.window = window or SendWindow()
+		self.clock = clock
+		self._day: Optional[date] = None
+		self._sent: Dict[int, int] = {}
+		self._caps: Dict[int, float] = {}
+		self._shards: Optional[Tuple[int, ...]] = None
+		self._lock = threading.Lock()
+
+	def scope(self, shards: Optional[List[int]]) -> None:
+		shards = None if shards is None else tuple(sorted(shards))
+		if shards != self._shards:
+			with self._lock:
+				self._shards = shards
+				# Recount today's sends for the new set of shards
+				self._day = None
+				self._caps = {}
+
+	def reset(self) -> None:
+		# Another process may have sent for these senders; recount on next use
+		with self._lock:
+			self._day = None
+
+	def _roll(self, db: Session, now: datetime) -> None:
+		day, midnight, _, _ = self.window.day_bounds(now)
+		if day == self._day:
+			return
+		query = select(EmailSend.sender_id, func.count()).where(EmailSend.sent_at >= midnight)
+		if self._shards is not None:
+			query = query.join(Recipient, Recipient.id == EmailSend.recipient_id).where(Recipient.shard.in_(self._shards))
+		rows = db.execute(query.group_by(EmailSend.sender_id)).all()
+		with self._lock:
+			self._day = day
+			self._sent = {sender_id: n for sender_id, n in rows}
+
+	def quota(self, db: Session, sender_id: int, cap: float, now: Optional[datetime] = None) -> int:
+		now = now or self.clock()
+		self._roll(db, now)
+		self._caps[sender_id] = cap
+		target = math.floor(cap * self.window.elapsed(now) + 1e-9)
+		return max(0, target - self._sent.get(sender_id, 0))
+
+	def remaining(self, sender_id: int) -> int:
+		return max(0, int(self._caps.get(sender_id, 0)) - self._sent.get(sender_id, 0))
+
+	def record(self, sender_id: int, n: int = 1) -> None:
+		with self._lock:
+			self._sent[sender_id] = self._sent.get(sender_id, 0) + n
+
+	def due(self, now: Optional[datetime] = None) -> int:
+		now = now or self.clock()
+		fraction = self.window.elapsed(now)
+		total = sum(max(0, math.floor(cap * fraction + 1e-9) - self._sent.get(sid, 0)) for sid, cap in self._caps.items())
+		SENDS_DUE.set(total)
+		return total
+
+	def next_due_in(self, now: Optional[datetime] = None) -> Optional[float]:
+		"""Seconds until the next sender's next message falls due; None if all are done for the day."""
+		now = now or self.clock()
+		_, _, start, end = self.window.day_bounds(now)
+		span = (end - start).total_seconds()
+		soonest: Optional[float] = None
+		for sid, cap in self._caps.items():
+			sent = self._sent.get(sid, 0)
+			if cap <= 0 or sent >= cap:
+				continue
+			at = start + timedelta(seconds=span * (sent + 1) / cap)
+			wait = max(0.0, (at - now).total_seconds())
+			soonest = wait if soonest is None else min(soonest, wait)
+		if soonest is None and now >= end:
+			# Finished for today; the next window opens tomorrow
+			tomorrow_start = self.window.day_bounds(now + timedelta(days=1))[2]
+			return (tomorrow_start - now).total_seconds()
+		return soonest
+
+
+class CapacityEstimate:
+	"""Measured per-recipient cost of a send cycle, smoothed across cycles.
+
+	Persist and record time is mostly database commits and deliver time is
+	relay latency, so the busiest stage shows whichever is the bottleneck;
+	wall time per item adds what no stage reports, such as per-domain
+	throttle waits. ``budget`` turns the cost into how many recipients fit
+	in a cycle of about ``target_seconds``.
+	"""
+
+	def __init__(self, target_seconds: float = TICK_TARGET_CYCLE_SECONDS, alpha: float = 0.3, floor: int = 10):
+		self.target_seconds = target_seconds
+		self.alpha = alpha
+		self.floor = floor
+		self.item_seconds: Optional[float] = None
+
+	def observe(self, result: PipelineResult) -> None:
+		processed = result.stages[0].processed if result.stages else 0
+		if not processed:
+			return
+		slowest = max((s.busy_seconds / s.processed / s.workers for s in result.stages if s.processed), default=0.0)
+		cost = max(slowest, result.source_seconds / processed, result.wall_seconds / processed)
+		if cost <= 0:
+			return
+		self.item_seconds = cost if self.item_seconds is None else self.alpha * cost + (1 - self.alpha) * self.item_seconds
+
+	def budget(self) -> Optional[int]:
+		if self.item_seconds is None:
+			CYCLE_BUDGET.set(0)
+			return None
+		n = max(self.floor, int(self.target_seconds / self.item_seconds))
+		CYCLE_BUDGET.set(n)
+		return n
+
+
+def next_tick_delay(
+	pacer: SendPacer,
+	ok: bool,
+	selected: int,
+	budget: Optional[int],
+	retry_in: float = 0.0,
+	min_delay: float = TICK_MIN_SECONDS,
+	max_delay: float = TICK_INTERVAL_SECONDS,
+) -> float:
+	if not ok:
+		# Failed or skipped: the breaker's backoff, or a normal idle wait
+		delay = retry_in or max_delay
+	elif budget is not None and selected >= budget:
+		# Capacity-limited, so more is already due
+		delay = min_delay
+	elif pacer.due() > 0:
+		# Due work but nothing was claimable: recipients ran out, so do not spin
+		delay = min_delay if selected else max_delay
+	else:
+		wait = pacer.next_due_in()
+		delay = max_delay if wait is None else min(max(wait, min_delay), max_delay)
+	TICK_DELAY.set(delay)
+	return delay
+
+
+pacer = SendPacer()
+capacity = CapacityEstimate()
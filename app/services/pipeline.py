@@ -0,0 +1,171 @@
+from __future__ import annotations
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, List, Optional
+
+from app.services.metrics import QUEUE_DEPTH, STAGE_SECONDS, count_error
+from app.services.profiling import profiler
+
+# End-of-stream marker; custom inboxes must hand it out only once drained
+DONE = object()
+
+
+@dataclass
+class StageStats:
+	name: str
+	workers: int
+	processed: int = 0
+	dropped: int = 0
+	failed: int = 0
+	busy_seconds: float = 0.0
+	# Time spent blocked handing results downstream, i.e. back-pressure
+	blocked_seconds: float = 0.0
+
+	@property
+	def avg_ms(self) -> float:
+		return (self.busy_seconds / self.processed) * 1000 if self.processed else 0.0
+
+
+@dataclass
+class StageError:
+	stage: str
+	item: Any
+	exc: BaseException
+
+
+@dataclass
+class PipelineResult:
+	stages: List[StageStats]
+	source_seconds: float = 0.0
+	wall_seconds: float = 0.0
+	errors: List[StageError] = field(default_factory=list)
+
+
+class PipelineError(Exception):
+	def __init__(self, result: PipelineResult):
+		self.result = result
+		first = result.errors[0]
+		super().__init__(f"{len(result.errors)} item(s) failed; first in stage '{first.stage}': {first.exc!r}")
+
+
+class Stage:
+	"""One step of a streaming pipeline.
+
+	``func`` receives an item and returns the item for the next stage, or None
+	to drop it. ``teardown`` runs once in each worker thread when it exits.
+	``inbox`` replaces the default FIFO with any object offering ``put``,
+	``get`` and ``qsize``, e.g. one that reorders items for fairness.
+	"""
+
+	def __init__(
+		self,
+		name: str,
+		func: Callable[[Any], Any],
+		workers: int = 1,
+		teardown: Optional[Callable[[], None]] = None,
+		inbox: Any = None,
+	):
+		self.name = name
+		self.func = func
+		self.workers = max(1, workers)
+		self.teardown = teardown
+		self.inbox = inbox
+
+
+class Pipeline:
+	"""Stages connected by bounded queues, each served by its own worker threads.
+
+	A full queue blocks the upstream stage (and ultimately the source), so a
+	slow stage applies back-pressure instead of buffering without limit.
+	"""
+
+	def __init__(self, stages: List[Stage], queue_size: int = 64):
+		if not stages:
+			raise ValueError("pipeline needs at least one stage")
+		self.stages = stages
+		self.queue_size = max(1, queue_size)
+
+	def run(self, source: Iterable[Any]) -> PipelineResult:
+		queues = [s.inbox if s.inbox is not None else queue.Queue(maxsize=self.queue_size) for s in self.stages]
+		stats = [StageStats(s.name, s.workers) for s in self.stages]
+		result = PipelineResult(stages=stats)
+		lock = threading.Lock()
+		remaining = [s.workers for s in self.stages]
+		threads: list[threading.Thread] = []
+
+		def worker(idx: int) -> None:
+			with profiler.thread_scope():
+				_work(idx)
+
+		def _work(idx: int) -> None:
+			stage = self.stages[idx]
+			st = stats[idx]
+			inbox = queues[idx]
+			outbox = queues[idx + 1] if idx + 1 < len(queues) else None
+			# Resolve labelled children once per worker, not per item
+			depth = QUEUE_DEPTH.labels(stage.name)
+			timing = STAGE_SECONDS.labels(stage.name)
+			try:
+				while True:
+					item = inbox.get()
+					if item is DONE:
+						break
+					depth.set(inbox.qsize())
+					t0 = time.perf_counter()
+					try:
+						out = stage.func(item)
+					except Exception as exc:
+						count_error(f"stage:{stage.name}", exc)
+						with lock:
+							st.failed += 1
+							st.busy_seconds += time.perf_counter() - t0
+							result.errors.append(StageError(stage.name, item, exc))
+						continue
+					t1 = time.perf_counter()
+					timing.observe(t1 - t0)
+					if out is not None and outbox is not None:
+						outbox.put(out)
+					t2 = time.perf_counter()
+					with lock:
+						st.busy_seconds += t1 - t0
+						st.blocked_seconds += t2 - t1
+						if out is None:
+							st.dropped += 1
+						else:
+							st.processed += 1
+			finally:
+				depth.set(0)
+				if stage.teardown is not None:
+					stage.teardown()
+				with lock:
+					remaining[idx] -= 1
+					last = remaining[idx] == 0
+				if last and outbox is not None:
+					for _ in range(self.stages[idx + 1].workers):
+						outbox.put(DONE)
+
+		started = time.perf_counter()
+		for idx, stage in enumerate(self.stages):
+			for n in range(stage.workers):
+				t = threading.Thread(target=worker, args=(idx,), name=f"pipeline-{stage.name}-{n}", daemon=True)
+				t.start()
+				threads.append(t)
+
+		try:
+			for item in source:
+				queues[0].put(item)
+		finally:
+			result.source_seconds = time.perf_counter() - started
+			for _ in range(self.stages[0].workers):
+				queues[0].put(DONE)
+			for t in threads:
+				t.join()
+			result.wall_seconds = time.perf_counter() - started
+		return result
+
+
+def bench_stage(stage: Stage, items: Iterable[Any], queue_size: int = 64) -> StageStats:
+	"""Run a single stage in isolation over ``items`` and return its timings."""
+	return Pipeline([stage], queue_size=queue_size).run(items).stages[0]
@@ -0,0 +1,108 @@
+from __future__ import annotations
+import cProfile
+import logging
+import os
+import pstats
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, List
+
+from app.config import PROFILE_DIR
+
+log = logging.getLogger(__name__)
+
+
+class RuntimeProfiler:
+	"""cProfile that is armed for the next N runs and otherwise costs nothing.
+
+	``run(label)`` wraps one unit of work (a scheduler cycle). Worker threads
+	started during that run join in via ``thread_scope()``; their profiles are
+	merged into a single pstats file per run, since cProfile only sees the
+	thread it was enabled in. Python 3.12+ refuses a second active profiler,
+	so there worker threads run unprofiled; the run then logs a warning and
+	``status()`` reports how many threads were missed.
+	"""
+
+	def __init__(self, output_dir: str = PROFILE_DIR):
+		self.output_dir = output_dir
+		self.remaining = 0
+		self.written: List[str] = []
+		self._active: List[cProfile.Profile] | None = None
+		self._unprofiled = 0
+		self.last_unprofiled = 0
+		self._lock = threading.Lock()
+
+	def arm(self, runs: int) -> None:
+		with self._lock:
+			self.remaining = max(0, runs)
+
+	def status(self) -> dict:
+		return {
+			"remaining": self.remaining,
+			"active": self._active is not None,
+			"output_dir": self.output_dir,
+			"written": self.written[-20:],
+			"last_unprofiled_threads": self.last_unprofiled,
+		}
+
+	@contextmanager
+	def run(self, label: str) -> Iterator[None]:
+		with self._lock:
+			armed = self.remaining > 0 and self._active is None
+			if armed:
+				self.remaining -= 1
+				self._active = []
+				self._unprofiled = 0
+		if not armed:
+			yield
+			return
+		try:
+			with self.thread_scope():
+				yield
+		finally:
+			with self._lock:
+				profiles, self._active = self._active, None
+				self.last_unprofiled = missed = self._unprofiled
+			if missed:
+				log.warning("%s profile is missing %d worker thread(s): this Python allows only one active profiler", label, missed)
+			self._dump(label, profiles)
+
+	@contextmanager
+	def thread_scope(self) -> Iterator[None]:
+		profiles = self._active
+		if profiles is None:
+			yield
+			return
+		prof = cProfile.Profile()
+		try:
+			prof.enable()
+		except ValueError:
+			# Python 3.12+ allows one active profiler per interpreter; run this thread unprofiled
+			prof = None
+			with self._lock:
+				self._unprofiled += 1
+		if prof is None:
+			yield
+			return
+		try:
+			yield
+		finally:
+			prof.disable()
+			with self._lock:
+				profiles.append(prof)
+
+	def _dump(self, label: str, profiles: List[cProfile.Profile]) -> None:
+		if not profiles:
+			return
+		stats = pstats.Stats(profiles[0])
+		for prof in profiles[1:]:
+			stats.add(prof)
+		os.makedirs(self.output_dir, exist_ok=True)
+		stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+		path = os.path.join(self.output_dir, f"{label}-{stamp}.pstats")
+		stats.dump_stats(path)
+		self.written.append(path)
+
+
+profiler = RuntimeProfiler()
@@ -0,0 +1,228 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import exists, func, select, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import LEASE_SECONDS, MAX_CLAIM_RESUMES
+from app.models import Campaign, CampaignCursor, CampaignRecipient, EmailSend, Recipient
+from app.sharding import ALL_SHARDS
+from app.services.content import load_body
+from app.services.windows import windows
+
+PENDING = "pending"
+QUEUED = "queued"
+SENT = "sent"
+FAILED = "failed"
+# Claimed, then dropped before delivery (opted out meanwhile, invalid address)
+SKIPPED = "skipped"
+
+
+@dataclass
+class Claim:
+	# Plain values: the claim commit expires ORM instances, and re-loading
+	# them one by one would cost a query per recipient
+	progress_id: int
+	recipient_id: int
+	email: str
+	fields: dict
+	# Set when resuming a message that was already written but not delivered
+	send: dict | None = None
+	shard: int = ALL_SHARDS
+
+
+def _fields(r: Recipient) -> dict:
+	return {"name": r.name, "role": r.role, "company": r.company, "industry": r.industry}
+
+
+def _send_snapshot(db: Session, s: EmailSend) -> dict:
+	return {
+		"id": s.id,
+		"sender_id": s.sender_id,
+		"subject": s.subject,
+		"body": load_body(db, s),
+		"personalization_score": s.personalization_score,
+		"spam_score": s.spam_score,
+	}
+
+
+def _resumable(db: Session, campaign_id: int, limit: int, shards: Optional[List[int]] = None) -> List[Claim]:
+	# Only one scheduler runs cycles per shard at a time, so anything still pending
+	# or queued at selection time was left behind by an interrupted cycle. Claims
+	# touched within the last lease period may still be in flight at a previous
+	# owner that has not yet noticed losing its lease, so they are left alone, and
+	# like fresh claims they wait for their recipient's sending window.
+	zones = windows.open_zones(db)
+	if not zones:
+		return []
+	settled = datetime.utcnow() - timedelta(seconds=LEASE_SECONDS)
+	query = (
+		db.query(CampaignRecipient, Recipient, EmailSend)
+		.join(Recipient, Recipient.id == CampaignRecipient.recipient_id)
+		.outerjoin(EmailSend, EmailSend.id == CampaignRecipient.send_id)
+		.filter(
+			CampaignRecipient.campaign_id == campaign_id,
+			CampaignRecipient.state.in_((PENDING, QUEUED)),
+			CampaignRecipient.updated_at < settled,
+			Recipient.timezone.in_(zones),
+			Recipient.unsubscribed == False,
+			Recipient.suppressed == False,
+		)
+	)
+	if shards is not None:
+		query = query.filter(Recipient.shard.in_(shards))
+	rows = query.order_by(CampaignRecipient.id).limit(limit).all()
+	if not rows:
+		return []
+	# Count the resume (which also restarts the lease clock on the claim); claims
+	# already resumed MAX_CLAIM_RESUMES times are given up on instead
+	exhausted = [p.id for p, _, _ in rows if (p.resumes or 0) >= MAX_CLAIM_RESUMES]
+	rows = [(p, r, s) for p, r, s in rows if (p.resumes or 0) < MAX_CLAIM_RESUMES]
+	claims = [
+		Claim(p.id, r.id, r.email, _fields(r), _send_snapshot(db, s) if p.state == QUEUED and s is not None else None, r.shard)
+		for p, r, s in rows
+	]
+	if rows:
+		db.execute(
+			update(CampaignRecipient)
+			.where(CampaignRecipient.id.in_([p.id for p, _, _ in rows]))
+			.values(resumes=func.coalesce(CampaignRecipient.resumes, 0) + 1, updated_at=datetime.utcnow())
+		)
+	db.commit()
+	mark_failed(db, exhausted)
+	return claims
+
+
+def claim_recipients(
+	db: Session, campaign_id: int, limit: int, resume: bool = True, shards: Optional[List[int]] = None
+) -> List[Claim]:
+	"""Claim up to ``limit`` recipients of a campaign that have not been sent it.
+
+	With ``resume`` interrupted claims are taken first (pass it only on the
+	first claim per campaign in a cycle, since this cycle's own claims are
+	pending too until they are delivered); fresh recipients are then taken in id
+	order from the timezones whose sending window is open, each after its own
+	campaign cursor, so selection is an index range scan per zone whose cost
+	does not grow with campaign progress. Recipients in closed zones keep their
+	place until their window opens. With ``shards`` only those recipient
+	shards are considered, with a cursor per shard, so workers holding
+	different shards never contend for a recipient. New claims and the cursor moves are
+	committed together, and the (campaign, recipient) unique constraint makes a
+	second claim of the same pair impossible. Delivery is at-least-once, not
+	exactly-once: a resumed queued claim may already have been handed to the
+	relay before the crash, in which case it is delivered again. A claim is
+	resumed at most ``MAX_CLAIM_RESUMES`` times before it is marked failed.
+	"""
+	if limit <= 0:
+		return []
+	claims = _resumable(db, campaign_id, limit, shards) if resume else []
+	need = limit - len(claims)
+	if need <= 0:
+		return claims
+
+	zones = windows.open_zones(db)
+	if not zones:
+		return claims
+	slices = [ALL_SHARDS] if shards is None else list(shards)
+	campaign = db.get(Campaign, campaign_id)
+	known = db.query(CampaignCursor).filter(CampaignCursor.campaign_id == campaign_id, CampaignCursor.timezone.in_(zones)).all()
+	cursors = {(c.shard, c.timezone): c for c in known}
+	legacy = campaign.cursor_recipient_id or 0
+
+	def start(shard: int, zone: str) -> int:
+		if (shard, zone) in cursors:
+			return cursors[(shard, zone)].recipient_id
+		# A new slice (first run, resharding): every id below the lowest cursor of the
+		# zone was claimed under some earlier slicing; the anti-join covers the rest
+		return min([legacy] + [c.recipient_id for c in known if c.timezone == zone])
+
+	# One statement: an index range scan per (shard, open zone), each bounded by the limit, merged by id
+	branches = []
+	for shard in slices:
+		for zone in zones:
+			q = select(Recipient.id).where(
+				Recipient.timezone == zone,
+				Recipient.id > start(shard, zone),
+				Recipient.unsubscribed == False,
+				Recipient.suppressed == False,
+				~exists().where(CampaignRecipient.campaign_id == campaign_id, CampaignRecipient.recipient_id == Recipient.id),
+			)
+			if shard != ALL_SHARDS:
+				q = q.where(Recipient.shard == shard)
+			branches.append(q.order_by(Recipient.id).limit(need).subquery())
+	candidates = union_all(*[select(b.c.id) for b in branches]).subquery()
+	fresh = (
+		db.query(Recipient)
+		.join(candidates, candidates.c.id == Recipient.id)
+		.order_by(Recipient.id)
+		.limit(need)
+		.all()
+	)
+	if not fresh:
+		return claims
+
+	snapshot = [(r.id, r.email, _fields(r), r.shard) for r in fresh]
+	rows = [CampaignRecipient(campaign_id=campaign_id, recipient_id=rid, state=PENDING) for rid, _, _, _ in snapshot]
+	db.add_all(rows)
+	# Ids come back in order, so the last one seen per slice is that slice's new cursor
+	for r in fresh:
+		key = (ALL_SHARDS if shards is None else r.shard, r.timezone)
+		cursor = cursors.get(key)
+		if cursor is None:
+			cursor = cursors[key] = CampaignCursor(campaign_id=campaign_id, shard=key[0], timezone=r.timezone)
+			db.add(cursor)
+		cursor.recipient_id = r.id
+	try:
+		db.flush()
+		ids = [row.id for row in rows]
+		db.commit()
+	except IntegrityError:
+		# Another claimer got there first; the next cycle resumes from its cursor
+		db.rollback()
+		return claims
+	return claims + [Claim(pid, rid, email, fields, shard=shard) for pid, (rid, email, fields, shard) in zip(ids, snapshot)]
+
+
+def mark_queued(db: Session, progress_id: int, send_id: int) -> bool:
+	# Conditional transition: False means someone else already handled this claim
+	result = db.execute(
+		update(CampaignRecipient)
+		.where(CampaignRecipient.id == progress_id, CampaignRecipient.state == PENDING)
+		.values(state=QUEUED, send_id=send_id)
+	)
+	return result.rowcount == 1
+
+
+def mark_done(db: Session, progress_id: int, delivered: bool) -> None:
+	db.execute(
+		update(CampaignRecipient)
+		.where(CampaignRecipient.id == progress_id)
+		.values(state=SENT if delivered else FAILED)
+	)
+
+
+def mark_skipped(db: Session, progress_ids: List[int]) -> None:
+	# Otherwise they would stay pending and be resumed, and dropped again, every cycle
+	if not progress_ids:
+		return
+	db.execute(
+		update(CampaignRecipient)
+		.where(CampaignRecipient.id.in_(progress_ids), CampaignRecipient.state.in_((PENDING, QUEUED)))
+		.values(state=SKIPPED)
+	)
+	db.commit()
+
+
+def mark_failed(db: Session, progress_ids: List[int]) -> None:
+	# Claims whose message errored in a pipeline stage; not retried
+	if not progress_ids:
+		return
+	db.execute(
+		update(CampaignRecipient)
+		.where(CampaignRecipient.id.in_(progress_ids), CampaignRecipient.state.in_((PENDING, QUEUED)))
+		.values(state=FAILED)
+	)
+	db.commit()
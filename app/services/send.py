@@ -1,16 +1,176 @@
 from __future__ import annotations
 import math
 import random
+import smtplib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import List
+from email.message import EmailMessage
+from typing import Callable, Iterator, List, Optional
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
-from app.models import SenderAccount, Recipient, Campaign, EmailSend
-from app.config import DAILY_WARMUP_START, DAILY_WARMUP_MAX, WARMUP_RAMP_DAYS
-from app.services.spam import analyze_spam, optimize_sending_pattern
+from app.models import SenderAccount, EmailSend, DeliveryAttempt
+from app.config import (
+	DAILY_WARMUP_START,
+	DAILY_WARMUP_MAX,
+	WARMUP_RAMP_DAYS,
+	PIPELINE_QUEUE_SIZE,
+	PIPELINE_RENDER_WORKERS,
+	PIPELINE_PERSIST_WORKERS,
+	PIPELINE_DELIVER_WORKERS,
+	PIPELINE_RECORD_WORKERS,
+	SHARD_COUNT,
+	SEND_REAL_EMAILS,
+	SMTP_HOST,
+	SMTP_PORT,
+	SMTP_USER,
+	SMTP_PASSWORD,
+)
+from app.sharding import ALL_SHARDS
+from app.services.spam import analyze_spam
+from app.services.campaigns import CampaignScheduler, active_campaign_plans
+from app.services.progress import claim_recipients, mark_queued, mark_done, mark_failed, mark_skipped
+from app.services.bounces import HARD, Bounce, classify_smtp_reply
+from app.services.addresses import InvalidAddress, normalize_address
+from app.services.suppression import BounceBuffer
+from app.services.unsubscribe import unsubscribes
+from app.services.mx import MxUnavailable, NoSuchDomain, resolver
+from app.services.throttle import DomainQueue, throttle
+from app.services.attempts import ERROR, AttemptLog, outcome_for
 from app.services.personalize import generate_variation
-from app.services.analytics import record_event
-from app.services.compliance import build_unsubscribe_link, append_compliance_footer
+from app.services.analytics import record_events
+from app.services.compliance import append_compliance_footer
+from app.services.message import build_message, unsubscribe_parts
+from app.services.content import pack_body_vars, templates
+from app.services.links import fill_click_token
+from app.services.tracking import make_tracking_token
+from app.services.stats import stats
+from app.services.pacing import pacer
+from app.services.pipeline import Pipeline, PipelineError, PipelineResult, Stage, StageError
+from app.services.metrics import CYCLE_SECONDS, RECIPIENTS_SELECTED, RENDER_SECONDS, DB_COMMIT_SECONDS, SMTP_SECONDS, SENDS_WRITTEN, INBOX_PLACEMENT, count_error
+
+_PERSIST_COMMIT = DB_COMMIT_SECONDS.labels("persist")
+# Shards this worker may act on right now; None means all of them
+Authority = Callable[[], Optional[List[int]]]
+_RECORD_COMMIT = DB_COMMIT_SECONDS.labels("record")
+
+
+@dataclass
+class SendJob:
+	# Plain values only: jobs cross threads and must not hold session-bound ORM objects
+	sender_id: int
+	sender_email: str
+	sender_reputation: float
+	campaign_id: int
+	subject_template: str
+	body_template: str
+	recipient_id: int
+	recipient_email: str
+	progress_id: int
+	fields: dict
+	shard: int = ALL_SHARDS
+	subject: str = ""
+	body: str = ""
+	personalization_score: float = 0.0
+	spam_score: float = 0.0
+	send_id: int | None = None
+	placed_in_inbox: bool | None = None
+	smtp_code: int | None = None
+	smtp_reply: str = ""
+	mx_host: str = ""
+	attempt: int = 1
+	delivery_seconds: float = 0.0
+	headers: dict = field(default_factory=dict)
+	body_vars: str = ""
+	events: List[str] = field(default_factory=list)
+
+
+class _WorkerSessions:
+	"""Hands each pipeline worker thread its own session on the caller's bind."""
+
+	def __init__(self, db: Session):
+		self._bind = db.get_bind()
+		self._local = threading.local()
+
+	def get(self) -> Session:
+		session = getattr(self._local, "session", None)
+		if session is None:
+			session = Session(bind=self._bind, autoflush=False)
+			self._local.session = session
+		return session
+
+	def release(self) -> None:
+		session = getattr(self._local, "session", None)
+		if session is not None:
+			session.close()
+			self._local.session = None
+
+
+class _MxConnections:
+	"""Open SMTP connections per deliver worker thread, keyed by MX host.
+
+	Messages to the same MX host, whatever their recipient domain, reuse one
+	session instead of paying connect/EHLO/TLS/AUTH per message. Each worker
+	keeps at most ``max_hosts`` idle connections, dropping the least recent.
+	"""
+
+	def __init__(self, max_hosts: int = 8):
+		self.max_hosts = max_hosts
+		self._local = threading.local()
+
+	def _open(self) -> "OrderedDict[str, smtplib.SMTP]":
+		conns = getattr(self._local, "conns", None)
+		if conns is None:
+			conns = self._local.conns = OrderedDict()
+		return conns
+
+	def get(self, host: str) -> smtplib.SMTP:
+		conns = self._open()
+		smtp = conns.pop(host, None)
+		if smtp is None:
+			smtp = _connect(host)
+		conns[host] = smtp
+		while len(conns) > self.max_hosts:
+			_, stale = conns.popitem(last=False)
+			_close(stale)
+		return smtp
+
+	def drop(self, host: str) -> None:
+		smtp = self._open().pop(host, None)
+		if smtp is not None:
+			_close(smtp, polite=False)
+
+	def release(self) -> None:
+		conns = self._open()
+		while conns:
+			_close(conns.popitem()[1])
+
+
+def _connect(host: str) -> smtplib.SMTP:
+	# The configured relay takes submission with credentials; a real MX takes port 25
+	relay = host == SMTP_HOST
+	smtp = smtplib.SMTP(host, SMTP_PORT if relay else 25, timeout=30)
+	smtp.ehlo()
+	if smtp.has_extn("starttls") and (SMTP_USER or not relay):
+		smtp.starttls()
+		smtp.ehlo()
+	if relay and SMTP_USER:
+		smtp.login(SMTP_USER, SMTP_PASSWORD)
+	return smtp
+
+
+def _close(smtp: smtplib.SMTP, polite: bool = True) -> None:
+	try:
+		if polite:
+			smtp.quit()
+		else:
+			smtp.close()
+	except (smtplib.SMTPException, OSError):
+		smtp.close()
 
 
 def _current_warmup_cap(days_active: int) -> int:
@@ -24,10 +184,6 @@ def _select_sender_accounts(db: Session) -> List[SenderAccount]:
 	return db.query(SenderAccount).filter(SenderAccount.active == True).all()
 
 
-def _eligible_recipients(db: Session, limit: int) -> List[Recipient]:
-	return db.query(Recipient).filter(Recipient.unsubscribed == False).limit(limit).all()
-
-
 def _estimated_days_active(sender: SenderAccount) -> int:
 	# Simulate warmup progression using reputation and last_sent timestamps
 	base = 10 if sender.warmup_enabled else WARMUP_RAMP_DAYS
@@ -35,77 +191,387 @@ def _estimated_days_active(sender: SenderAccount) -> int:
 	return min(WARMUP_RAMP_DAYS, base + boost)
 
 
-def run_sending_cycle(db: Session) -> None:
+def _authorized(authority: Optional[Authority], shard: int) -> bool:
+	if authority is None:
+		return True
+	allowed = authority()
+	return allowed is None or shard in allowed
+
+
+def select_jobs(
+	db: Session,
+	rejects: BounceBuffer | None = None,
+	budget: Optional[int] = None,
+	shards: Optional[List[int]] = None,
+	authority: Optional[Authority] = None,
+) -> Iterator[SendJob]:
+	"""Claim recipients for this cycle and yield one job per message.
+
+	``authority`` is asked before every claim batch which shards this worker
+	still holds (None: all, while it is the leader); shards lost mid-cycle (an
+	expired lease) are dropped from the rest of the cycle, and selection stops
+	once none are left.
+	"""
+	shards = None if shards is None else list(shards)
 	senders = _select_sender_accounts(db)
 	if not senders:
 		return
 
-	campaign = db.query(Campaign).filter(Campaign.active == True).first()
-	if not campaign:
+	# Every active campaign shares each sender's quota according to its weight
+	scheduler = CampaignScheduler(active_campaign_plans(db))
+	if not scheduler.plans:
 		return
+	resumed: set[int] = set()
+	lost = False
+
+	def fetch(plan, n):
+		nonlocal lost
+		if authority is not None:
+			allowed = authority()
+			if allowed is not None:
+				if shards is None:
+					lost = not allowed
+				else:
+					shards[:] = [s for s in shards if s in allowed]
+					lost = not shards
+		if lost:
+			return []
+		resume = plan.campaign_id not in resumed
+		resumed.add(plan.campaign_id)
+		return claim_recipients(db, plan.campaign_id, n, resume=resume, shards=shards)
 
-	# Determine global spam score from template to adjust volumes
-	base_spam = analyze_spam(campaign.subject_template + "\n" + campaign.body_template)
-	volume_mul, jitter_mul = optimize_sending_pattern(base_spam)
+	# Each worker gets the share of every sender's allowance and domain rate that matches its shards
+	share = 1.0 if shards is None else len(shards) / SHARD_COUNT
+	pacer.scope(shards)
+	throttle.share = share
 
 	for sender in random.sample(senders, len(senders)):
+		# Claims commit on this session, which expires loaded instances
+		sender_id, sender_email, sender_reputation = sender.id, sender.email, sender.reputation_score
 		days_active = _estimated_days_active(sender)
 		cap = _current_warmup_cap(days_active)
-		cap = max(1, int(cap * volume_mul))
+		cap = max(1, int(cap * scheduler.volume_mul)) * share
 
-		# Randomize actual sends this cycle
-		cycle_quota = max(1, int(cap / 12))  # roughly per-hour in 12 ticks/day
-		cycle_quota = max(1, int(random.uniform(0.6, 1.2 * jitter_mul) * cycle_quota))
+		# Whatever the sending window says is due by now, jittered downwards only: the pacer
+		# never sends ahead of schedule, and what is held back is due again next cycle
+		due = pacer.quota(db, sender_id, cap)
+		if due <= 0:
+			continue
+		cycle_quota = min(due, max(1, int(random.uniform(0.6, 1.2 * scheduler.jitter_mul) * due)))
+		cycle_quota = min(cycle_quota, pacer.remaining(sender_id))
+		if budget is not None:
+			if budget <= 0:
+				return
+			cycle_quota = min(cycle_quota, budget)
 
-		recipients = _eligible_recipients(db, cycle_quota)
-		if not recipients:
+		batches = scheduler.fill(cycle_quota, fetch)
+		if lost:
+			# Claims made before the loss stay pending for whoever holds the shards now
+			return
+		if not batches:
+			if len(scheduler.exhausted) >= len(scheduler.plans):
+				return
 			continue
+		for plan, claims in batches:
+			RECIPIENTS_SELECTED.inc(len(claims))
+			if budget is not None:
+				budget -= len(claims)
+			skipped = []
+			for claim in claims:
+				if unsubscribes.contains(claim.recipient_id):
+					# Opted out moments ago; the buffered write has not landed yet
+					skipped.append(claim.progress_id)
+					continue
+				try:
+					email = normalize_address(claim.email)
+				except InvalidAddress as exc:
+					# Rejected here in microseconds instead of after a relay round trip
+					if rejects is not None:
+						rejects.add(Bounce(claim.email, HARD, diagnostic=str(exc), reason="invalid_address"))
+					skipped.append(claim.progress_id)
+					continue
+				job = SendJob(
+					sender_id=sender_id,
+					sender_email=sender_email,
+					sender_reputation=sender_reputation,
+					campaign_id=plan.campaign_id,
+					subject_template=plan.subject_template,
+					body_template=plan.body_template,
+					recipient_id=claim.recipient_id,
+					recipient_email=email,
+					progress_id=claim.progress_id,
+					fields=claim.fields,
+					shard=claim.shard,
+				)
+				if claim.send is not None:
+					# Resume an interrupted delivery of the message already written
+					job.send_id = claim.send["id"]
+					job.sender_id = claim.send["sender_id"]
+					job.subject = claim.send["subject"]
+					job.body = claim.send["body"]
+					job.personalization_score = claim.send["personalization_score"]
+					job.spam_score = claim.send["spam_score"]
+					previous = db.query(func.max(DeliveryAttempt.attempt)).filter(DeliveryAttempt.send_id == job.send_id).scalar()
+					job.attempt = (previous or 0) + 1
+				yield job
+			mark_skipped(db, skipped)
+
+
+def render_job(job: SendJob) -> SendJob:
+	with RENDER_SECONDS.time():
+		return _render(job)
+
+
+def _render(job: SendJob) -> SendJob:
+	if job.send_id is not None:
+		# Resumed delivery: body is stored, headers are cheap to rebuild
+		_, job.headers = unsubscribe_parts(job.campaign_id, job.recipient_id)
+		return _route(job)
+	p = generate_variation(job.subject_template, job.body_template, job.fields)
+	job.spam_score = analyze_spam(p.personalized_subject + "\n" + p.personalized_body)
+	unsub_link, job.headers = unsubscribe_parts(job.campaign_id, job.recipient_id)
+	job.subject = p.personalized_subject
+	job.body = append_compliance_footer(p.personalized_body, job.sender_email, unsub_link)
+	job.body_vars = pack_body_vars(p.fields, job.sender_email, unsub_link)
+	job.personalization_score = p.score
+	return _route(job)
+
+
+def _route(job: SendJob) -> SendJob:
+	# NoSuchDomain propagates: the pipeline turns it into a hard bounce before anything is written
+	try:
+		job.mx_host = resolver.primary(job.recipient_email.rpartition("@")[2])
+	except MxUnavailable as exc:
+		_defer(job, 451, f"451 4.4.3 {exc}")
+	return job
 
-		for r in recipients:
-			fields = {
-				"name": r.name,
-				"role": r.role,
-				"company": r.company,
-				"industry": r.industry,
-			}
-			p = generate_variation(campaign.subject_template, campaign.body_template, fields)
-			spam_score = analyze_spam(p.personalized_subject + "\n" + p.personalized_body)
-
-			unsub_link = build_unsubscribe_link("/", r.id)
-			body_with_footer = append_compliance_footer(p.personalized_body, sender.email, unsub_link)
-
-			send = EmailSend(
-				sender_id=sender.id,
-				recipient_id=r.id,
-				campaign_id=campaign.id,
-				subject=p.personalized_subject,
-				body=body_with_footer,
-				personalization_score=p.score,
-				spam_score=spam_score,
-				inbox_placement=None,
-				sent_at=datetime.utcnow(),
-			)
-			db.add(send)
-			db.commit()
 
-			# Simulate deliverability based on spam and personalization
-			deliver_prob = max(0.05, 0.9 - spam_score * 0.7 + p.score * 0.4 + sender.reputation_score * 0.2)
-			placed_in_inbox = random.random() < deliver_prob
-			send.inbox_placement = placed_in_inbox
+def _defer(job: SendJob, code: int, reply: str) -> None:
+	# Settled as a temporary failure without (further) delivery attempts this cycle
+	job.smtp_code, job.smtp_reply = code, reply
+	job.placed_in_inbox = False
+	job.events.append("deferred")
+
+
+def persist_job(db: Session, job: SendJob) -> SendJob | None:
+	if job.send_id is not None:
+		return job
+	# Only the substitution values are stored; the template row is shared
+	template_id = templates.id_for(db, job.body_template)
+	send = EmailSend(
+		sender_id=job.sender_id,
+		recipient_id=job.recipient_id,
+		campaign_id=job.campaign_id,
+		subject=job.subject,
+		body="",
+		template_id=template_id,
+		body_vars=job.body_vars,
+		personalization_score=job.personalization_score,
+		spam_score=job.spam_score,
+		inbox_placement=None,
+		sent_at=datetime.utcnow(),
+	)
+	db.add(send)
+	try:
+		db.flush()
+		# The send row and the claim transition commit together, or not at all
+		if not mark_queued(db, job.progress_id, send.id):
+			db.rollback()
+			return None
+		with _PERSIST_COMMIT.time():
 			db.commit()
+	except Exception:
+		db.rollback()
+		raise
+	job.send_id = send.id
+	pacer.record(job.sender_id)
+	stats.note_send(send.id, job.campaign_id, job.sender_id, send.sent_at)
+	SENDS_WRITTEN.inc()
+	job.body = fill_click_token(job.body, make_tracking_token(send.id, job.recipient_id))
+	return job
+
+
+def deliver_job(job: SendJob, connections: _MxConnections | None = None) -> SendJob:
+	t0 = time.perf_counter()
+	try:
+		return _deliver(job, connections)
+	finally:
+		job.delivery_seconds = time.perf_counter() - t0
+		SMTP_SECONDS.observe(job.delivery_seconds)
+
+
+def _deliver(job: SendJob, connections: _MxConnections | None = None) -> SendJob:
+	if job.smtp_code is not None:
+		# Deferred before delivery (MX lookup failed)
+		return job
+	# Built for every job, so the list headers are on whatever actually goes out
+	msg = build_message(job.sender_email, job.recipient_email, job.subject, job.body, job.headers)
+	if SEND_REAL_EMAILS:
+		if connections is not None:
+			return _submit(job, msg, connections)
+		once = _MxConnections()
+		try:
+			return _submit(job, msg, once)
+		finally:
+			once.release()
+	# Simulate deliverability based on spam and personalization
+	deliver_prob = max(0.05, 0.9 - job.spam_score * 0.7 + job.personalization_score * 0.4 + job.sender_reputation * 0.2)
+	job.placed_in_inbox = random.random() < deliver_prob
+	if job.placed_in_inbox:
+		job.smtp_code, job.smtp_reply = 250, "250 2.0.0 OK queued"
+
+	# Engagement simulation
+	if job.placed_in_inbox:
+		job.events.append("delivered")
+		open_prob = min(0.85, 0.25 + job.personalization_score * 0.5)
+		if random.random() < open_prob:
+			job.events.append("opened")
+			reply_prob = max(0.01, 0.03 + job.personalization_score * 0.2)
+			if random.random() < reply_prob:
+				job.events.append("replied")
+	else:
+		job.events.append("bounced")
+		# Simulated relay verdict; a share of bounces are permanent address failures
+		if random.random() < 0.25:
+			job.smtp_code, job.smtp_reply = 550, "550 5.1.1 Recipient address rejected: user unknown"
+		else:
+			job.smtp_code, job.smtp_reply = 451, "451 4.7.1 Temporary deferral, try again later"
+
+	# Occasional unsubscribe
+	if random.random() < 0.002:
+		job.events.append("unsubscribed")
+	return job
+
+
+def _submit(job: SendJob, msg: EmailMessage, connections: _MxConnections) -> SendJob:
+	host = job.mx_host or SMTP_HOST
+	try:
+		try:
+			connections.get(host).send_message(msg)
+		except smtplib.SMTPServerDisconnected:
+			# A reused connection the server has since timed out; one fresh try
+			connections.drop(host)
+			connections.get(host).send_message(msg)
+	except smtplib.SMTPRecipientsRefused as exc:
+		job.smtp_code, reply = next(iter(exc.recipients.values()))
+		job.smtp_reply = reply.decode(errors="replace") if isinstance(reply, bytes) else str(reply)
+	except smtplib.SMTPResponseException as exc:
+		job.smtp_code = exc.smtp_code
+		job.smtp_reply = exc.smtp_error.decode(errors="replace") if isinstance(exc.smtp_error, bytes) else str(exc.smtp_error)
+	except (smtplib.SMTPException, OSError) as exc:
+		# Unreachable or misbehaving MX: a temporary failure of this message, not of the cycle
+		connections.drop(host)
+		_defer(job, 421, f"421 4.4.1 {host}: {exc}")
+		return job
+	else:
+		job.smtp_code, job.smtp_reply = 250, "250 OK"
+	# Accepted by the relay; inbox placement is not observable from here
+	job.placed_in_inbox = job.smtp_code == 250
+	if 400 <= job.smtp_code < 500:
+		job.events.append("deferred")
+	else:
+		job.events.append("delivered" if job.placed_in_inbox else "bounced")
+	return job
+
+
+def record_job(db: Session, job: SendJob, bounces: BounceBuffer, attempts: AttemptLog) -> SendJob:
+	if job.smtp_code is not None:
+		bounce = classify_smtp_reply(job.recipient_email, job.smtp_code, job.smtp_reply)
+		if bounce is not None:
+			bounces.add(bounce)
+	try:
+		db.query(EmailSend).filter(EmailSend.id == job.send_id).update(
+			{EmailSend.inbox_placement: job.placed_in_inbox}, synchronize_session=False
+		)
+		mark_done(db, job.progress_id, bool(job.placed_in_inbox))
+		with _RECORD_COMMIT.time():
+			record_events(db, job.send_id, job.recipient_id, job.events)
+	except Exception:
+		db.rollback()
+		raise
+	if job.placed_in_inbox is not None:
+		INBOX_PLACEMENT.labels("inbox" if job.placed_in_inbox else "other").inc()
+	attempts.add(
+		db,
+		job.send_id,
+		job.mx_host,
+		job.attempt,
+		outcome_for(job.smtp_code, job.placed_in_inbox),
+		job.smtp_code,
+		job.delivery_seconds,
+	)
+	return job
+
+
+def build_send_pipeline(db: Session, bounces: BounceBuffer, attempts: AttemptLog, authority: Optional[Authority] = None) -> Pipeline:
+	sessions = _WorkerSessions(db)
+	domains = DomainQueue(throttle, lambda job: job.recipient_email.rpartition("@")[2], maxsize=PIPELINE_QUEUE_SIZE)
+	connections = _MxConnections()
+
+	def render(job: SendJob) -> SendJob | None:
+		try:
+			return render_job(job)
+		except NoSuchDomain as exc:
+			# Like an invalid address: a hard bounce with no send row, and the claim is settled
+			bounces.add(Bounce(job.recipient_email, HARD, code=550, status="5.1.2", diagnostic=str(exc), reason="no_such_domain"))
+			mark_skipped(sessions.get(), [job.progress_id])
+			return None
+
+	def deliver(job: SendJob) -> SendJob | None:
+		try:
+			if not _authorized(authority, job.shard):
+				# Shard lost since selection; its new owner resumes the claim
+				return None
+			return deliver_job(job, connections)
+		except Exception:
+			attempts.add(sessions.get(), job.send_id, job.mx_host, job.attempt, ERROR, None, job.delivery_seconds)
+			raise
+		finally:
+			domains.done(job)
+
+	return Pipeline(
+		[
+			Stage("render", render, workers=PIPELINE_RENDER_WORKERS, teardown=sessions.release),
+			Stage("persist", lambda job: persist_job(sessions.get(), job), workers=PIPELINE_PERSIST_WORKERS, teardown=sessions.release),
+			Stage("deliver", deliver, workers=PIPELINE_DELIVER_WORKERS, teardown=lambda: (connections.release(), sessions.release()), inbox=domains),
+			Stage("record", lambda job: record_job(sessions.get(), job, bounces, attempts), workers=PIPELINE_RECORD_WORKERS, teardown=sessions.release),
+		],
+		queue_size=PIPELINE_QUEUE_SIZE,
+	)
+
+
+def run_sending_cycle(
+	db: Session,
+	budget: Optional[int] = None,
+	shards: Optional[List[int]] = None,
+	authority: Optional[Authority] = None,
+) -> PipelineResult:
+	bounces = BounceBuffer()
+	attempts = AttemptLog()
+	flush_errors: List[StageError] = []
+	with CYCLE_SECONDS.time():
+		try:
+			pipeline = build_send_pipeline(db, bounces, attempts, authority)
+			result = pipeline.run(select_jobs(db, bounces, budget, shards, authority))
+		finally:
+			# Bounces and attempt rows are written in batches, not per message; a failed
+			# flush is reported next to the stage errors instead of replacing them
+			for name, buffer in (("bounces", bounces), ("attempts", attempts)):
+				try:
+					buffer.flush(db)
+				except Exception as exc:
+					db.rollback()
+					count_error(f"flush:{name}", exc)
+					flush_errors.append(StageError(f"flush:{name}", None, exc))
+	result.errors.extend(flush_errors)
+	# A message that failed on its own is settled and the cycle carries on; the
+	# supervisor logs it without counting the tick as failed
+	mark_failed(db, [e.item.progress_id for e in result.errors if not _fails_cycle(e) and isinstance(e.item, SendJob)])
+	if any(_fails_cycle(e) for e in result.errors):
+		raise PipelineError(result)
+	return result
+
 
-			# Engagement simulation
-			if placed_in_inbox:
-				record_event(db, send, r.id, "delivered")
-				open_prob = min(0.85, 0.25 + p.score * 0.5)
-				if random.random() < open_prob:
-					record_event(db, send, r.id, "opened")
-					reply_prob = max(0.01, 0.03 + p.score * 0.2)
-					if random.random() < reply_prob:
-						record_event(db, send, r.id, "replied")
-			else:
-				record_event(db, send, r.id, "bounced")
-
-			# Occasional unsubscribe
-			if random.random() < 0.002:
-				record_event(db, send, r.id, "unsubscribed")
+def _fails_cycle(err: StageError) -> bool:
+	# Database trouble and buffer flushes affect every message alike; anything else is about one item
+	return not isinstance(err.item, SendJob) or isinstance(err.exc, SQLAlchemyError)
@@ -0,0 +1,199 @@
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.models import DailyStats, EmailSend
+from app.services.events import events
+from app.services.metrics import REGISTRY, EVENTS_RECORDED
+
+STATS_FLUSHES = REGISTRY.counter("mailer_stats_flushes_total", "Flushes that changed stats_daily (upserts and rebuilds).")
+
+CAMPAIGN = "campaign"
+SENDER = "sender"
+COUNTERS = ("sends", "delivered", "opens", "clicks", "replies", "bounces", "unsubscribes")
+# engagement_events.type -> counter column
+EVENT_COUNTERS = {
+	"delivered": "delivered",
+	"opened": "opens",
+	"clicked": "clicks",
+	"replied": "replies",
+	"bounced": "bounces",
+	"unsubscribed": "unsubscribes",
+}
+
+Key = Tuple[str, int, date]
+
+
+def _day(value) -> date:
+	if isinstance(value, datetime):
+		return value.date()
+	if isinstance(value, str):
+		return date.fromisoformat(value[:10])
+	return value
+
+
+class StatsAggregator:
+	"""Per-campaign and per-sender daily counters, maintained from the write paths.
+
+	The send path, the event flusher and the opt-out and DSN handlers report
+	what they wrote; the last two store events on the recipient's latest send,
+	so rebuild() sees them too. Deltas collect in memory and are upserted as
+	``counter = counter + delta`` every few seconds, so reads never touch
+	email_sends or the event partitions. Deltas still in memory at a crash are
+	lost; rebuild_stats.py recomputes everything from the raw rows.
+	"""
+
+	def __init__(self, owner_cache_size: int = 100_000):
+		self.owner_cache_size = owner_cache_size
+		self._owners: "OrderedDict[int, Tuple[Optional[int], int]]" = OrderedDict()
+		self._deltas: Dict[Key, Dict[str, int]] = {}
+		self._lock = threading.Lock()
+
+	def __len__(self) -> int:
+		return len(self._deltas)
+
+	def _bump(self, campaign_id: Optional[int], sender_id: Optional[int], day: date, counter: str) -> None:
+		# Caller holds the lock
+		for key in ((CAMPAIGN, campaign_id, day), (SENDER, sender_id, day)):
+			if key[1] is not None:
+				d = self._deltas.setdefault(key, {})
+				d[counter] = d.get(counter, 0) + 1
+
+	def _remember(self, send_id: int, campaign_id: Optional[int], sender_id: int) -> None:
+		self._owners[send_id] = (campaign_id, sender_id)
+		if len(self._owners) > self.owner_cache_size:
+			self._owners.popitem(last=False)
+
+	def note_send(self, send_id: int, campaign_id: Optional[int], sender_id: int, sent_at: Optional[datetime] = None) -> None:
+		with self._lock:
+			self._remember(send_id, campaign_id, sender_id)
+			self._bump(campaign_id, sender_id, _day(sent_at or datetime.utcnow()), "sends")
+
+	def add_events(self, db: Session, rows: Iterable[dict]) -> None:
+		rows = list(rows)
+		for r in rows:
+			EVENTS_RECORDED.labels(r["type"]).inc()
+		rows = [r for r in rows if r["type"] in EVENT_COUNTERS]
+		if not rows:
+			return
+		missing = {r["send_id"] for r in rows if r["send_id"] not in self._owners}
+		if missing:
+			found = db.execute(
+				select(EmailSend.id, EmailSend.campaign_id, EmailSend.sender_id).where(EmailSend.id.in_(missing))
+			).all()
+			with self._lock:
+				for send_id, campaign_id, sender_id in found:
+					self._remember(send_id, campaign_id, sender_id)
+		with self._lock:
+			for r in rows:
+				owner = self._owners.get(r["send_id"])
+				if owner is not None:
+					self._bump(owner[0], owner[1], _day(r["created_at"]), EVENT_COUNTERS[r["type"]])
+
+	def flush(self, db: Session) -> int:
+		with self._lock:
+			if not self._deltas:
+				return 0
+			deltas, self._deltas = self._deltas, {}
+		try:
+			stmt = self._upsert(db)
+			now = datetime.utcnow()
+			db.execute(stmt, [
+				{"kind": k, "entity_id": eid, "day": day, "updated_at": now, **{c: d.get(c, 0) for c in COUNTERS}}
+				for (k, eid, day), d in deltas.items()
+			])
+			db.commit()
+		except Exception:
+			db.rollback()
+			with self._lock:
+				for key, d in deltas.items():
+					merged = self._deltas.setdefault(key, {})
+					for counter, n in d.items():
+						merged[counter] = merged.get(counter, 0) + n
+			raise
+		STATS_FLUSHES.inc()
+		return len(deltas)
+
+	@staticmethod
+	def _upsert(db: Session):
+		dialect = db.get_bind().dialect.name
+		if dialect == "postgresql":
+			from sqlalchemy.dialects.postgresql import insert as dialect_insert
+		else:
+			from sqlalchemy.dialects.sqlite import insert as dialect_insert
+		table = DailyStats.__table__
+		stmt = dialect_insert(table)
+		return stmt.on_conflict_do_update(
+			index_elements=[table.c.kind, table.c.entity_id, table.c.day],
+			set_={**{c: table.c[c] + stmt.excluded[c] for c in COUNTERS}, "updated_at": stmt.excluded.updated_at},
+		)
+
+	def rebuild(self, db: Session) -> int:
+		"""Recompute every row from email_sends and the event partitions."""
+		totals: Dict[Key, Dict[str, int]] = {}
+
+		def add(kind: str, entity_id, day, counter: str, n: int) -> None:
+			if entity_id is None:
+				return
+			row = totals.setdefault((kind, entity_id, _day(day)), {})
+			row[counter] = row.get(counter, 0) + n
+
+		sent_day = func.date(EmailSend.sent_at)
+		for kind, col in ((CAMPAIGN, EmailSend.campaign_id), (SENDER, EmailSend.sender_id)):
+			for entity_id, day, n in db.execute(
+				select(col, sent_day, func.count()).where(EmailSend.sent_at.isnot(None)).group_by(col, sent_day)
+			):
+				add(kind, entity_id, day, "sends", n)
+			ev = events.query(["send_id", "type", "created_at"]).subquery()
+			ev_day = func.date(ev.c.created_at)
+			for entity_id, day, event_type, n in db.execute(
+				select(col, ev_day, ev.c.type, func.count())
+				.join(EmailSend, EmailSend.id == ev.c.send_id)
+				.where(ev.c.type.in_(list(EVENT_COUNTERS)))
+				.group_by(col, ev_day, ev.c.type)
+			):
+				add(kind, entity_id, day, EVENT_COUNTERS[event_type], n)
+		with self._lock:
+			self._deltas = {}
+		db.execute(delete(DailyStats))
+		if totals:
+			now = datetime.utcnow()
+			db.execute(insert(DailyStats), [
+				{"kind": k, "entity_id": eid, "day": day, "updated_at": now, **{c: d.get(c, 0) for c in COUNTERS}}
+				for (k, eid, day), d in totals.items()
+			])
+		db.commit()
+		STATS_FLUSHES.inc()
+		return len(totals)
+
+	def report(self, db: Session, kind: str, entity_id: int, page: int = 1, per_page: int = 30) -> dict:
+		"""Totals plus one page of the daily series, newest day first."""
+		t = DailyStats.__table__
+		match = (t.c.kind == kind) & (t.c.entity_id == entity_id)
+		sums = db.execute(select(func.count(), *[func.coalesce(func.sum(t.c[c]), 0) for c in COUNTERS]).where(match)).one()
+		days = sums[0]
+		rows = db.execute(
+			select(t.c.day, *[t.c[c] for c in COUNTERS])
+			.where(match)
+			.order_by(t.c.day.desc())
+			.limit(per_page)
+			.offset((page - 1) * per_page)
+		).all()
+		return {
+			"kind": kind,
+			"id": entity_id,
+			"totals": dict(zip(COUNTERS, (int(v) for v in sums[1:]))),
+			"series": [{"day": r[0].isoformat(), **dict(zip(COUNTERS, r[1:]))} for r in rows],
+			"page": page,
+			"per_page": per_page,
+			"days": days,
+			"next_page": page + 1 if page * per_page < days else None,
+		}
+
+
+stats = StatsAggregator()
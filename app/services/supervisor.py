@@ -0,0 +1,153 @@
+from __future__ import annotations
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.config import TICK_INTERVAL_SECONDS, TICK_BREAKER_THRESHOLD, TICK_BACKOFF_MAX_SECONDS, TICK_ERROR_ROWS_PER_CYCLE
+from app.models import TickError
+from app.services.metrics import REGISTRY, count_error
+from app.services.pipeline import PipelineError, PipelineResult
+
+CONSECUTIVE_FAILURES = REGISTRY.gauge("mailer_tick_consecutive_failures", "Scheduler ticks failed in a row.")
+CIRCUIT_OPEN = REGISTRY.gauge("mailer_tick_circuit_open", "1 while the tick circuit breaker is skipping cycles.")
+TICKS = REGISTRY.counter("mailer_ticks_total", "Scheduler ticks by outcome.", ["outcome"])
+
+
+def _format_trace(exc: BaseException) -> str:
+	return "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+
+
+class TickSupervisor:
+	"""Runs scheduler ticks, records their failures and trips a circuit breaker.
+
+	A cycle fails when it raises; per-item stage errors in a returned
+	PipelineResult are written to tick_errors without counting against it.
+	After ``threshold`` consecutive failures further ticks are skipped for an
+	exponentially growing backoff (capped at ``max_backoff``); the first tick
+	after the backoff is a trial run that either closes or re-opens the circuit.
+	"""
+
+	def __init__(
+		self,
+		session_factory: Callable[[], Session],
+		bind: Engine,
+		threshold: int = TICK_BREAKER_THRESHOLD,
+		base_backoff: float = TICK_INTERVAL_SECONDS,
+		max_backoff: float = TICK_BACKOFF_MAX_SECONDS,
+		clock: Callable[[], float] = time.monotonic,
+	):
+		self.session_factory = session_factory
+		self.bind = bind
+		self.threshold = max(1, threshold)
+		self.base_backoff = base_backoff
+		self.max_backoff = max_backoff
+		self.clock = clock
+		self.consecutive_failures = 0
+		self.open_until: float | None = None
+		self.last_cycle_id: str | None = None
+		self.last_error: str | None = None
+		self.last_success_at: datetime | None = None
+		self._lock = threading.Lock()
+
+	@property
+	def circuit_open(self) -> bool:
+		return self.open_until is not None and self.clock() < self.open_until
+
+	def status(self) -> dict:
+		remaining = max(0.0, self.open_until - self.clock()) if self.circuit_open else 0.0
+		return {
+			"consecutive_failures": self.consecutive_failures,
+			"circuit_open": self.circuit_open,
+			"retry_in_seconds": round(remaining, 1),
+			"last_cycle_id": self.last_cycle_id,
+			"last_error": self.last_error,
+			"last_success_at": self.last_success_at.isoformat() if self.last_success_at else None,
+		}
+
+	def run(self, cycle: Callable[[Session], object]) -> bool:
+		"""Run one cycle under supervision. Returns False if it failed or was skipped."""
+		if self.circuit_open:
+			TICKS.labels("skipped").inc()
+			return False
+
+		cycle_id = uuid.uuid4().hex
+		self.last_cycle_id = cycle_id
+		db = self.session_factory()
+		try:
+			outcome = cycle(db)
+		except Exception as exc:
+			try:
+				db.rollback()
+			finally:
+				# Counted even when the rollback itself fails, e.g. the connection is gone
+				self._on_failure(cycle_id, exc)
+			return False
+		finally:
+			db.close()
+		self._on_success()
+		if isinstance(outcome, PipelineResult) and outcome.errors:
+			# Items that failed on their own: logged, but the tick itself was healthy
+			self._record(cycle_id, PipelineError(outcome), 0)
+		return True
+
+	def _on_success(self) -> None:
+		with self._lock:
+			self.consecutive_failures = 0
+			self.open_until = None
+			self.last_success_at = datetime.utcnow()
+		CONSECUTIVE_FAILURES.set(0)
+		CIRCUIT_OPEN.set(0)
+		TICKS.labels("ok").inc()
+
+	def _on_failure(self, cycle_id: str, exc: BaseException) -> None:
+		count_error("tick", exc)
+		TICKS.labels("failed").inc()
+		with self._lock:
+			self.consecutive_failures += 1
+			failures = self.consecutive_failures
+			self.last_error = f"{type(exc).__name__}: {exc}"
+			if failures >= self.threshold:
+				backoff = min(self.max_backoff, self.base_backoff * 2 ** (failures - self.threshold))
+				self.open_until = self.clock() + backoff
+		CONSECUTIVE_FAILURES.set(failures)
+		CIRCUIT_OPEN.set(1 if self.open_until is not None else 0)
+		self._record(cycle_id, exc, failures)
+
+	def _record(self, cycle_id: str, exc: BaseException, failures: int) -> None:
+		rows: List[TickError] = []
+		if isinstance(exc, PipelineError):
+			for err in exc.result.errors[:TICK_ERROR_ROWS_PER_CYCLE]:
+				rows.append(self._row(cycle_id, f"stage:{err.stage}", err.exc, failures, err.item))
+		else:
+			rows.append(self._row(cycle_id, "tick", exc, failures, None))
+
+		# A fresh session on the same bind: the cycle's own (thread-scoped) session may be what broke
+		db = Session(bind=self.bind)
+		try:
+			db.add_all(rows)
+			db.commit()
+		except Exception as write_exc:
+			# The database itself may be down; the breaker still backs off
+			db.rollback()
+			count_error("tick_error_log", write_exc)
+		finally:
+			db.close()
+
+	@staticmethod
+	def _row(cycle_id: str, source: str, exc: BaseException, failures: int, item: Optional[object]) -> TickError:
+		return TickError(
+			cycle_id=cycle_id,
+			source=source,
+			error_class=type(exc).__name__,
+			message=str(exc)[:2000],
+			stack_trace=_format_trace(exc),
+			sender_id=getattr(item, "sender_id", None),
+			campaign_id=getattr(item, "campaign_id", None),
+			consecutive_failures=failures,
+		)
@@ -0,0 +1,100 @@
+from __future__ import annotations
+import threading
+from collections import Counter
+from typing import Iterable, List
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.config import SOFT_BOUNCE_LIMIT
+from app.models import Recipient, Suppression
+from app.services.analytics import insert_recipient_events
+from app.services.bounces import HARD, SOFT, Bounce
+from app.services.stats import stats
+
+
+def apply_bounces(db: Session, bounces: Iterable[Bounce], record_events: bool = False) -> dict:
+	"""Write a batch of classified bounces in a handful of set-based statements.
+
+	Hard bounces suppress the address outright. Soft bounces increment the
+	recipient's counter and suppress it once SOFT_BOUNCE_LIMIT is reached.
+	With ``record_events`` each bounce is also stored as a "bounced" event on
+	the recipient's latest send, for DSNs that arrive after delivery; replies
+	seen by the send pipeline already have their event.
+	"""
+	bounces = list(bounces)
+	hard: dict[str, Bounce] = {}
+	soft = Counter()
+	for b in bounces:
+		if b.kind == HARD:
+			hard.setdefault(b.email, b)
+		elif b.kind == SOFT:
+			soft[b.email] += 1
+	for email in hard:
+		soft.pop(email, None)
+
+	# Soft counters grouped by increment so each distinct count is one UPDATE
+	by_count: dict[int, List[str]] = {}
+	for email, n in soft.items():
+		by_count.setdefault(n, []).append(email)
+	for n, emails in by_count.items():
+		db.execute(
+			update(Recipient)
+			.where(Recipient.email.in_(emails))
+			.values(soft_bounces=Recipient.soft_bounces + n)
+		)
+	if soft:
+		over = (
+			db.query(Recipient.email)
+			.filter(Recipient.email.in_(list(soft)), Recipient.soft_bounces >= SOFT_BOUNCE_LIMIT, Recipient.suppressed == False)
+			.all()
+		)
+		for (email,) in over:
+			hard.setdefault(email, Bounce(email, SOFT, diagnostic=f"{SOFT_BOUNCE_LIMIT} soft bounces"))
+
+	added = 0
+	if hard:
+		known = {e for (e,) in db.query(Suppression.email).filter(Suppression.email.in_(list(hard))).all()}
+		rows = [
+			Suppression(
+				email=email,
+				reason=b.reason or ("hard_bounce" if b.kind == HARD else "soft_bounce_limit"),
+				status=b.status or (str(b.code) if b.code else None),
+				detail=b.diagnostic or None,
+			)
+			for email, b in hard.items()
+			if email not in known
+		]
+		db.add_all(rows)
+		added = len(rows)
+		db.execute(update(Recipient).where(Recipient.email.in_(list(hard))).values(suppressed=True))
+	rows: List[dict] = []
+	if record_events and bounces:
+		ids = dict(db.execute(
+			select(Recipient.email, Recipient.id).where(Recipient.email.in_({b.email for b in bounces}))
+		).all())
+		rows = insert_recipient_events(
+			db, [(ids[b.email], b.status or b.kind) for b in bounces if b.email in ids], "bounced"
+		)
+	db.commit()
+	stats.add_events(db, rows)
+	return {"suppressed": added, "soft": sum(soft.values())}
+
+
+class BounceBuffer:
+	"""Thread-safe collector the send pipeline fills and the cycle flushes once."""
+
+	def __init__(self):
+		self._items: List[Bounce] = []
+		self._lock = threading.Lock()
+
+	def add(self, bounce: Bounce) -> None:
+		with self._lock:
+			self._items.append(bounce)
+
+	def flush(self, db: Session) -> dict | None:
+		with self._lock:
+			items, self._items = self._items, []
+		if not items:
+			return None
+		return apply_bounces(db, items)
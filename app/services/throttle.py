@@ -0,0 +1,155 @@
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict
+
+from app.config import DOMAIN_MAX_CONNECTIONS, DOMAIN_MAX_PER_MINUTE, DOMAIN_BURST, DOMAIN_LIMITS
+from app.services.pipeline import DONE
+
+
+@dataclass(frozen=True)
+class DomainLimit:
+	max_connections: int
+	per_minute: float
+
+
+def parse_domain_limits(spec: str) -> Dict[str, DomainLimit]:
+	# "gmail.com=2:60,outlook.com=1:30" -> connections:messages-per-minute
+	limits: Dict[str, DomainLimit] = {}
+	for entry in (spec or "").split(","):
+		domain, _, value = entry.strip().partition("=")
+		if not domain or not value:
+			continue
+		conns, _, rate = value.partition(":")
+		limits[domain.lower()] = DomainLimit(int(conns), float(rate or DOMAIN_MAX_PER_MINUTE))
+	return limits
+
+
+@dataclass
+class _Bucket:
+	tokens: float
+	updated: float
+	active: int = 0
+
+
+class DomainThrottle:
+	"""Per-destination-domain connection slots and token-bucket message rates.
+
+	Long-lived, so rates carry over from one cycle to the next. Not locked by
+	itself: DomainQueue calls it under its own condition lock.
+	"""
+
+	def __init__(
+		self,
+		default: DomainLimit = DomainLimit(DOMAIN_MAX_CONNECTIONS, DOMAIN_MAX_PER_MINUTE),
+		overrides: Dict[str, DomainLimit] | None = None,
+		burst: int = DOMAIN_BURST,
+		clock: Callable[[], float] = time.monotonic,
+	):
+		self.default = default
+		self.overrides = overrides or {}
+		self.burst = burst
+		self.clock = clock
+		# Fraction of each domain's rate this process may use (its share of the recipient shards)
+		self.share = 1.0
+		self._buckets: Dict[str, _Bucket] = {}
+
+	def limit_for(self, domain: str) -> DomainLimit:
+		return self.overrides.get(domain, self.default)
+
+	def _capacity(self, limit: DomainLimit) -> float:
+		return float(max(self.burst, limit.max_connections, 1))
+
+	def wait_time(self, domain: str) -> float | None:
+		"""0 if a message may start now, seconds until a token, or None if all connections are busy."""
+		limit = self.limit_for(domain)
+		now = self.clock()
+		b = self._buckets.get(domain)
+		if b is None:
+			b = self._buckets[domain] = _Bucket(self._capacity(limit), now)
+		if b.active >= limit.max_connections:
+			return None
+		rate = limit.per_minute * self.share / 60.0
+		b.tokens = min(self._capacity(limit), b.tokens + (now - b.updated) * rate)
+		b.updated = now
+		if b.tokens >= 1:
+			return 0.0
+		return (1 - b.tokens) / rate if rate > 0 else None
+
+	def acquire(self, domain: str) -> None:
+		b = self._buckets[domain]
+		b.tokens -= 1
+		b.active += 1
+
+	def release(self, domain: str) -> None:
+		b = self._buckets.get(domain)
+		if b is not None and b.active > 0:
+			b.active -= 1
+
+
+class DomainQueue:
+	"""Pipeline inbox keeping one FIFO per destination domain.
+
+	``get`` serves domains round-robin and skips any that is at its
+	connection limit or out of rate tokens, so a list dominated by one
+	provider no longer sends to it back to back while other domains wait.
+	The stage must call ``done(item)`` when delivery of an item finishes.
+	"""
+
+	def __init__(self, throttle: DomainThrottle, key: Callable[[Any], str], maxsize: int = 64):
+		self.throttle = throttle
+		self.key = key
+		self.maxsize = max(1, maxsize)
+		self._domains: "OrderedDict[str, deque]" = OrderedDict()
+		self._size = 0
+		self._done = 0
+		self._cond = threading.Condition()
+
+	def qsize(self) -> int:
+		return self._size
+
+	def put(self, item: Any) -> None:
+		with self._cond:
+			if item is DONE:
+				self._done += 1
+			else:
+				while self._size >= self.maxsize:
+					self._cond.wait()
+				self._domains.setdefault(self.key(item), deque()).append(item)
+				self._size += 1
+			self._cond.notify_all()
+
+	def get(self) -> Any:
+		with self._cond:
+			while True:
+				if not self._size and self._done:
+					self._done -= 1
+					return DONE
+				soonest: float | None = None
+				for domain in list(self._domains):
+					wait = self.throttle.wait_time(domain)
+					if wait == 0:
+						items = self._domains[domain]
+						item = items.popleft()
+						if items:
+							# Served domains go to the back of the rotation
+							self._domains.move_to_end(domain)
+						else:
+							del self._domains[domain]
+						self._size -= 1
+						self.throttle.acquire(domain)
+						self._cond.notify_all()
+						return item
+					if wait is not None:
+						soonest = wait if soonest is None else min(soonest, wait)
+				self._cond.wait(timeout=soonest)
+
+	def done(self, item: Any) -> None:
+		with self._cond:
+			self.throttle.release(self.key(item))
+			self._cond.notify_all()
+
+
+throttle = DomainThrottle(overrides=parse_domain_limits(DOMAIN_LIMITS))
@@ -0,0 +1,36 @@
+import base64
+import hashlib
+import hmac
+from functools import lru_cache
+from typing import Tuple
+
+from app.services.compliance import derive_key
+
+_SIG_BYTES = 12
+
+
+@lru_cache(maxsize=1)
+def _mac() -> hmac.HMAC:
+	# Own derived key: tracking tokens are public in every message and must not help forge opt-outs
+	return hmac.new(derive_key("track"), digestmod=hashlib.sha256)
+
+
+def _sign(payload: str) -> str:
+	mac = _mac().copy()
+	mac.update(payload.encode())
+	return base64.urlsafe_b64encode(mac.digest()[:_SIG_BYTES]).decode().rstrip("=")
+
+
+def make_tracking_token(send_id: int, recipient_id: int) -> str:
+	payload = f"{send_id}-{recipient_id}"
+	return f"{payload}.{_sign(payload)}"
+
+
+def verify_tracking_token(token: str) -> Tuple[int, int] | None:
+	payload, _, sig = (token or "").partition(".")
+	sid, _, rid = payload.partition("-")
+	if not sid.isdigit() or not rid.isdigit() or not sig:
+		return None
+	if not hmac.compare_digest(sig, _sign(payload)):
+		return None
+	return int(sid), int(rid)
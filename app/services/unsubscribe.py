@@ -0,0 +1,68 @@
+from __future__ import annotations
+import threading
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.models import Recipient
+from app.services.analytics import insert_recipient_events
+from app.services.metrics import REGISTRY
+from app.services.stats import stats
+
+UNSUBSCRIBES = REGISTRY.counter("mailer_unsubscribes_total", "Opt-outs accepted by the unsubscribe endpoint.")
+UNSUBSCRIBE_FLUSH_ROWS = REGISTRY.counter("mailer_unsubscribe_flushed_total", "Opt-outs written to the database.")
+
+
+class UnsubscribeBuffer:
+	"""Opt-outs accepted in memory and written to the database in batches.
+
+	Requests only touch a set under a lock, so a burst of clicks after a large
+	send never waits on the database or on the sending cycle. Until a flush
+	lands, ``contains()`` lets the send path honour the opt-out anyway.
+	"""
+
+	def __init__(self):
+		self._pending: set[int] = set()
+		self._flushing: set[int] = set()
+		self._lock = threading.Lock()
+
+	def add(self, recipient_id: int) -> None:
+		with self._lock:
+			self._pending.add(recipient_id)
+		UNSUBSCRIBES.inc()
+
+	def contains(self, recipient_id: int) -> bool:
+		# Lock-free read: set membership is atomic under the GIL
+		return recipient_id in self._pending or recipient_id in self._flushing
+
+	def __len__(self) -> int:
+		return len(self._pending)
+
+	def flush(self, db: Session) -> int:
+		with self._lock:
+			if not self._pending:
+				return 0
+			batch, self._pending = self._pending, set()
+			self._flushing |= batch
+		try:
+			# Repeat clicks from already opted-out recipients are not counted again
+			fresh = [rid for (rid,) in db.execute(
+				select(Recipient.id).where(Recipient.id.in_(list(batch)), Recipient.unsubscribed == False)
+			)]
+			db.execute(update(Recipient).where(Recipient.id.in_(list(batch))).values(unsubscribed=True))
+			rows = insert_recipient_events(db, [(rid, None) for rid in fresh], "unsubscribed")
+			db.commit()
+		except Exception:
+			db.rollback()
+			with self._lock:
+				self._pending |= batch
+			raise
+		finally:
+			with self._lock:
+				self._flushing -= batch
+		UNSUBSCRIBE_FLUSH_ROWS.inc(len(batch))
+		stats.add_events(db, rows)
+		return len(batch)
+
+
+unsubscribes = UnsubscribeBuffer()
@@ -0,0 +1,90 @@
+from __future__ import annotations
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import pytz
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import TIMEZONE, RECIPIENT_WINDOW_START_HOUR, RECIPIENT_WINDOW_END_HOUR, RECIPIENT_ZONES_REFRESH_SECONDS
+from app.models import Recipient
+from app.services.metrics import REGISTRY
+
+OPEN_ZONES = REGISTRY.gauge("mailer_recipient_zones_open", "Recipient timezones whose sending window is open.")
+
+
+def valid_timezone(name: Optional[str]) -> Optional[str]:
+	if not name:
+		return None
+	try:
+		return pytz.timezone(name.strip()).zone
+	except pytz.UnknownTimeZoneError:
+		return None
+
+
+class RecipientWindows:
+	"""Which recipient timezones are inside the local sending window right now.
+
+	Recipients are indexed by (timezone, id), so selection is one range scan per
+	open zone. The window is evaluated once per distinct UTC offset among the
+	known zones, never per row. The zone list is read from the index and cached
+	for ``refresh_seconds``; a zone that first appears in another process is
+	picked up at the next refresh.
+	"""
+
+	def __init__(
+		self,
+		start_hour: int = RECIPIENT_WINDOW_START_HOUR,
+		end_hour: int = RECIPIENT_WINDOW_END_HOUR,
+		refresh_seconds: float = RECIPIENT_ZONES_REFRESH_SECONDS,
+		clock: Callable[[], float] = time.monotonic,
+	):
+		if not 0 <= start_hour < end_hour <= 24:
+			start_hour, end_hour = 0, 24
+		self.start_hour = start_hour
+		self.end_hour = end_hour
+		self.refresh_seconds = refresh_seconds
+		self.clock = clock
+		self._zones: Optional[List[str]] = None
+		self._loaded_at = 0.0
+		self._lock = threading.Lock()
+
+	@property
+	def always_open(self) -> bool:
+		return self.start_hour == 0 and self.end_hour == 24
+
+	def zones(self, db: Session) -> List[str]:
+		if self._zones is None or self.clock() - self._loaded_at >= self.refresh_seconds:
+			found = [z for (z,) in db.execute(select(Recipient.timezone).distinct()) if z]
+			with self._lock:
+				self._zones = sorted(set(found) | {TIMEZONE})
+				self._loaded_at = self.clock()
+		return self._zones
+
+	def open_zones(self, db: Session, now: Optional[datetime] = None) -> List[str]:
+		zones = self.zones(db)
+		if self.always_open:
+			OPEN_ZONES.set(len(zones))
+			return zones
+		now = now or datetime.utcnow()
+		utc_now = pytz.utc.localize(now)
+		by_offset: Dict[object, bool] = {}
+		result: List[str] = []
+		for zone in zones:
+			offset = utc_now.astimezone(pytz.timezone(valid_timezone(zone) or TIMEZONE)).utcoffset()
+			if offset not in by_offset:
+				hour = (now + offset).hour
+				by_offset[offset] = self.start_hour <= hour < self.end_hour
+			if by_offset[offset]:
+				result.append(zone)
+		OPEN_ZONES.set(len(result))
+		return result
+
+	def reset(self) -> None:
+		with self._lock:
+			self._zones = None
+
+
+windows = RecipientWindows()
@@ -0,0 +1,20 @@
+from __future__ import annotations
+import hashlib
+from typing import Optional
+
+from app.config import SHARD_COUNT
+
+# Cursor and selection key for "every shard" when sharding is off
+ALL_SHARDS = -1
+
+
+def shard_for(email: Optional[str], count: int = SHARD_COUNT) -> int:
+	# Stable across processes and releases, unlike hash(); email is already normalized
+	if not email or count <= 1:
+		return 0
+	digest = hashlib.blake2b(email.encode(), digest_size=8).digest()
+	return int.from_bytes(digest, "big") % count
+
+
+def default_shard(context) -> int:
+	return shard_for(context.get_current_parameters().get("email"))
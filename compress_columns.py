@@ -0,0 +1,119 @@
+import argparse
+import time
+import zlib
+from sqlalchemy import bindparam, inspect, select, text, update
+from app.db import Base, engine, add_missing_columns
+from app.compression import compress, decompress, registry, train_dictionary
+from app.models import Campaign, EmailSend, EngagementEvent, CompressionDictionary
+
+BATCH_SIZE = 500
+SAMPLE_SIZE = 2000
+
+# (model, attribute); the dictionary slot is "<table>.<column>"
+COLUMNS = [
+	(Campaign, "body_template"),
+	(EmailSend, "body"),
+	(EmailSend, "body_vars"),
+	(EngagementEvent, "details"),
+]
+
+
+def _slot(model, attr: str) -> str:
+	return f"{model.__tablename__}.{attr}"
+
+
+def _sample(conn, model, attr: str, limit: int = SAMPLE_SIZE) -> list[str]:
+	col = getattr(model, attr)
+	rows = conn.execute(select(col).where(col.isnot(None)).order_by(model.id.desc()).limit(limit)).scalars()
+	return [v for v in rows if v]
+
+
+def convert_postgres_columns() -> list[str]:
+	# SQLite keeps bytes in the old TEXT columns as-is; Postgres needs bytea.
+	# Existing text gets the raw-format tag so it decodes unchanged.
+	if engine.dialect.name != "postgresql":
+		return []
+	inspector = inspect(engine)
+	changed = []
+	with engine.begin() as conn:
+		for model, attr in COLUMNS:
+			table = model.__tablename__
+			current = {c["name"]: c["type"] for c in inspector.get_columns(table)}
+			if attr in current and current[attr].python_type is str:
+				conn.execute(text(
+					f"ALTER TABLE {table} ALTER COLUMN {attr} TYPE bytea "
+					f"USING CASE WHEN {attr} IS NULL THEN NULL ELSE 'r'::bytea || convert_to({attr}, 'UTF8') END"
+				))
+				changed.append(f"{table}.{attr}")
+	return changed
+
+
+def train() -> dict:
+	trained = {}
+	with engine.begin() as conn:
+		for model, attr in COLUMNS:
+			data = train_dictionary(_sample(conn, model, attr))
+			if not data:
+				continue
+			slot = _slot(model, attr)
+			dict_id = conn.execute(CompressionDictionary.__table__.insert().values(column=slot, data=data)).inserted_primary_key[0]
+			registry.register(dict_id, data, slot)
+			trained[slot] = len(data)
+	return trained
+
+
+def rewrite(model, attr: str) -> int:
+	# Round-trips every row through CompressedText, so legacy and older-dictionary
+	# rows come back out in the current format
+	table = model.__table__
+	col = table.c[attr]
+	stmt = update(table).where(table.c.id == bindparam("_id")).values({attr: bindparam("_value")})
+	last_id, total = 0, 0
+	while True:
+		with engine.begin() as conn:
+			rows = conn.execute(
+				select(table.c.id, col).where(table.c.id > last_id, col.isnot(None)).order_by(table.c.id).limit(BATCH_SIZE)
+			).all()
+			if not rows:
+				return total
+			conn.execute(stmt, [{"_id": rid, "_value": value} for rid, value in rows])
+		last_id = rows[-1][0]
+		total += len(rows)
+
+
+def benchmark() -> None:
+	print(f"{'column':28} {'rows':>6} {'raw':>10} {'zlib':>10} {'stored':>10} {'write_us':>9} {'read_us':>8}")
+	with engine.connect() as conn:
+		for model, attr in COLUMNS:
+			values = _sample(conn, model, attr)
+			if not values:
+				continue
+			slot = _slot(model, attr)
+			raw = sum(len(v.encode("utf-8")) for v in values)
+			plain = sum(len(zlib.compress(v.encode("utf-8"))) for v in values)
+			start = time.perf_counter()
+			packed = [compress(v, slot) for v in values]
+			write_us = (time.perf_counter() - start) / len(values) * 1e6
+			start = time.perf_counter()
+			for p in packed:
+				decompress(p)
+			read_us = (time.perf_counter() - start) / len(values) * 1e6
+			print(f"{slot:28} {len(values):>6} {raw:>10} {plain:>10} {sum(len(p) for p in packed):>10} {write_us:>9.1f} {read_us:>8.1f}")
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Compress large text columns in place and report size vs CPU cost.")
+	parser.add_argument("--train", action="store_true", help="train new zlib dictionaries from the current rows first")
+	parser.add_argument("--benchmark", action="store_true", help="only report sizes and per-row cost; change nothing")
+	args = parser.parse_args()
+	Base.metadata.create_all(bind=engine)
+	add_missing_columns(engine)
+	registry.load()
+	if args.benchmark:
+		benchmark()
+	else:
+		print({"converted": convert_postgres_columns()})
+		if args.train:
+			print({"trained": train()})
+		for model, attr in COLUMNS:
+			print({_slot(model, attr): rewrite(model, attr)})
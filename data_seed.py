@@ -1,10 +1,11 @@
 from sqlalchemy.orm import Session
-from app.db import Base, engine, SessionLocal
+from app.db import Base, engine, SessionLocal, add_missing_columns
 from app.models import SenderAccount, Recipient, Campaign
 
 
 def seed():
 	Base.metadata.create_all(bind=engine)
+	add_missing_columns(engine)
 	db: Session = SessionLocal()
 	try:
 		if db.query(SenderAccount).count() == 0:
@@ -0,0 +1,76 @@
+import argparse
+from datetime import datetime
+from sqlalchemy import create_engine, select
+from app.config import DATABASE_URL
+from app.models import DeliveryAttempt, RelayHost
+from app.services.attempts import OUTCOME_NAMES
+
+CHUNK_ROWS = 100_000
+
+
+def export(out_path: str, database_url: str = DATABASE_URL, since: datetime | None = None, compression: str = "zstd") -> int:
+	# Streams the table in chunks so memory stays flat for millions of attempts
+	try:
+		import pyarrow as pa
+		import pyarrow.parquet as pq
+	except ImportError:
+		raise SystemExit("Exporting delivery attempts requires pyarrow (pip install pyarrow).")
+
+	engine = create_engine(database_url)
+	relay_type = pa.dictionary(pa.int16(), pa.string())
+	outcome_type = pa.dictionary(pa.int8(), pa.string())
+	schema = pa.schema([
+		("send_id", pa.int64()),
+		("ts", pa.timestamp("ms", tz="UTC")),
+		("relay", relay_type),
+		("attempt", pa.int16()),
+		("outcome", outcome_type),
+		("smtp_code", pa.int16()),
+		("latency_us", pa.int32()),
+	])
+	outcome_labels = pa.array([OUTCOME_NAMES[k] for k in sorted(OUTCOME_NAMES)])
+
+	query = select(
+		DeliveryAttempt.send_id,
+		DeliveryAttempt.ts_ms,
+		DeliveryAttempt.relay_id,
+		DeliveryAttempt.attempt,
+		DeliveryAttempt.outcome,
+		DeliveryAttempt.smtp_code,
+		DeliveryAttempt.latency_us,
+	).order_by(DeliveryAttempt.id)
+	if since is not None:
+		query = query.where(DeliveryAttempt.ts_ms >= int(since.timestamp() * 1000))
+
+	total = 0
+	with engine.connect() as conn:
+		relays = dict(conn.execute(select(RelayHost.id, RelayHost.host)).all())
+		relay_codes = {rid: i for i, rid in enumerate(sorted(relays))}
+		relay_labels = pa.array([relays[rid] for rid in sorted(relays)] or ["unknown"])
+		result = conn.execution_options(stream_results=True, yield_per=CHUNK_ROWS).execute(query)
+		with pq.ParquetWriter(out_path, schema, compression=compression) as writer:
+			for chunk in result.partitions(CHUNK_ROWS):
+				cols = list(zip(*chunk))
+				relay_idx = pa.array([relay_codes.get(r, 0) for r in cols[2]], pa.int16())
+				batch = pa.record_batch([
+					pa.array(cols[0], pa.int64()),
+					pa.array(cols[1], pa.int64()).cast(pa.timestamp("ms", tz="UTC")),
+					pa.DictionaryArray.from_arrays(relay_idx, relay_labels),
+					pa.array(cols[3], pa.int16()),
+					pa.DictionaryArray.from_arrays(pa.array(cols[4], pa.int8()), outcome_labels),
+					pa.array(cols[5], pa.int16()),
+					pa.array(cols[6], pa.int32()),
+				], schema=schema)
+				writer.write_batch(batch)
+				total += len(chunk)
+	return total
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Export the delivery-attempt log to a compressed Parquet file.")
+	parser.add_argument("out", help="Output .parquet path")
+	parser.add_argument("--database-url", default=DATABASE_URL, help="Read from this database, e.g. a replica")
+	parser.add_argument("--since", type=datetime.fromisoformat, help="Only attempts at or after this ISO timestamp")
+	parser.add_argument("--compression", default="zstd", help="Parquet codec: zstd, snappy, gzip or none")
+	args = parser.parse_args()
+	print(f"Exported {export(args.out, args.database_url, args.since, args.compression)} attempts to {args.out}")
@@ -0,0 +1,72 @@
+import argparse
+import csv
+from sqlalchemy.orm import Session
+from app.db import Base, engine, SessionLocal, add_missing_columns
+from app.models import Recipient
+from app.services.addresses import InvalidAddress, normalize_address
+from app.services.windows import valid_timezone
+
+FIELDS = ("email", "name", "role", "company", "industry", "timezone")
+BATCH_SIZE = 1000
+
+
+def _rows(path: str):
+	with open(path, newline="") as fh:
+		reader = csv.reader(fh)
+		for row in reader:
+			if not row or not row[0].strip():
+				continue
+			if row[0].strip().lower() == "email":
+				continue
+			yield dict(zip(FIELDS, (c.strip() or None for c in row)))
+
+
+def _insert(db: Session, batch: dict) -> int:
+	existing = {e for (e,) in db.query(Recipient.email).filter(Recipient.email.in_(list(batch))).all()}
+	new = [Recipient(**fields) for email, fields in batch.items() if email not in existing]
+	db.add_all(new)
+	db.commit()
+	return len(new)
+
+
+def import_csv(path: str) -> dict:
+	# Addresses are normalized and validated before they ever reach the table
+	Base.metadata.create_all(bind=engine)
+	add_missing_columns(engine)
+	db: Session = SessionLocal()
+	totals = {"imported": 0, "duplicates": 0, "rejected": 0}
+	batch: dict = {}
+	try:
+		for fields in _rows(path):
+			try:
+				fields["email"] = normalize_address(fields["email"])
+			except InvalidAddress as exc:
+				totals["rejected"] += 1
+				print(f"Rejected {fields['email']!r}: {exc}")
+				continue
+			# Missing or unknown zones fall back to the configured TIMEZONE
+			zone = valid_timezone(fields.pop("timezone", None))
+			if zone:
+				fields["timezone"] = zone
+			if fields["email"] in batch:
+				totals["duplicates"] += 1
+				continue
+			batch[fields["email"]] = fields
+			if len(batch) >= BATCH_SIZE:
+				added = _insert(db, batch)
+				totals["imported"] += added
+				totals["duplicates"] += len(batch) - added
+				batch = {}
+		if batch:
+			added = _insert(db, batch)
+			totals["imported"] += added
+			totals["duplicates"] += len(batch) - added
+	finally:
+		db.close()
+	return totals
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Import recipients from CSV (email,name,role,company,industry,timezone).")
+	parser.add_argument("path", help="CSV file; only the email column is required")
+	print(import_csv(parser.parse_args().path))
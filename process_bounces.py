@@ -0,0 +1,36 @@
+import argparse
+from sqlalchemy.orm import Session
+from app.db import Base, engine, SessionLocal, add_missing_columns
+from app.services.bounces import iter_mailbox, parse_dsn
+from app.services.suppression import apply_bounces
+
+BATCH_SIZE = 500
+
+
+def process(path: str) -> dict:
+	# Read DSNs from an mbox file or Maildir and apply them in batches
+	Base.metadata.create_all(bind=engine)
+	add_missing_columns(engine)
+	db: Session = SessionLocal()
+	totals = {"messages": 0, "bounces": 0, "suppressed": 0}
+	batch = []
+	try:
+		for msg in iter_mailbox(path):
+			totals["messages"] += 1
+			batch.extend(parse_dsn(msg))
+			if len(batch) >= BATCH_SIZE:
+				totals["bounces"] += len(batch)
+				totals["suppressed"] += apply_bounces(db, batch, record_events=True)["suppressed"]
+				batch = []
+		if batch:
+			totals["bounces"] += len(batch)
+			totals["suppressed"] += apply_bounces(db, batch, record_events=True)["suppressed"]
+	finally:
+		db.close()
+	return totals
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Apply bounce notifications from a mailbox to the suppression list.")
+	parser.add_argument("path", help="mbox file or Maildir directory containing DSN messages")
+	print(process(parser.parse_args().path))
@@ -0,0 +1,20 @@
+import argparse
+from sqlalchemy.orm import Session
+from app.db import Base, engine, SessionLocal, add_missing_columns
+from app.services.stats import stats
+
+
+def rebuild() -> int:
+	# Recompute stats_daily from email_sends and every event partition
+	Base.metadata.create_all(bind=engine)
+	add_missing_columns(engine)
+	db: Session = SessionLocal()
+	try:
+		return stats.rebuild(db)
+	finally:
+		db.close()
+
+
+if __name__ == "__main__":
+	argparse.ArgumentParser(description="Recompute per-campaign and per-sender daily stats from the raw tables.").parse_args()
+	print({"rows": rebuild()})
@@ -0,0 +1,45 @@
+import argparse
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+from app.config import SHARD_COUNT
+from app.db import Base, engine, SessionLocal, add_missing_columns
+from app.models import Recipient
+from app.sharding import shard_for
+
+BATCH_SIZE = 5000
+
+
+def assign(count: int = SHARD_COUNT, only_missing: bool = False) -> dict:
+	# Stop the send workers first when changing the shard count
+	Base.metadata.create_all(bind=engine)
+	add_missing_columns(engine)
+	db: Session = SessionLocal()
+	totals = {"scanned": 0, "updated": 0}
+	stmt = update(Recipient.__table__).where(Recipient.__table__.c.id == bindparam("rid")).values(shard=bindparam("s"))
+	last = 0
+	try:
+		while True:
+			query = select(Recipient.id, Recipient.email, Recipient.shard).where(Recipient.id > last)
+			if only_missing:
+				query = query.where(Recipient.shard.is_(None))
+			rows = db.execute(query.order_by(Recipient.id).limit(BATCH_SIZE)).all()
+			if not rows:
+				break
+			changes = [{"rid": rid, "s": shard_for(email, count)} for rid, email, shard in rows if shard != shard_for(email, count)]
+			if changes:
+				db.execute(stmt, changes)
+				db.commit()
+			totals["scanned"] += len(rows)
+			totals["updated"] += len(changes)
+			last = rows[-1][0]
+	finally:
+		db.close()
+	return totals
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Assign recipients to shards by a stable hash of their email.")
+	parser.add_argument("--count", type=int, default=SHARD_COUNT, help="number of shards (default: SHARD_COUNT)")
+	parser.add_argument("--missing", action="store_true", help="only fill recipients that have no shard yet")
+	args = parser.parse_args()
+	print(assign(args.count, args.missing))
@@ -25,19 +25,174 @@ Usage:
 The subject and body can also be provided via environment variables
 ``EMAIL_SUBJECT`` and ``EMAIL_BODY``. Delay defaults to 1 second.
 
+When the ``email-validator`` package is installed, each address is trimmed,
+lower-cased and IDNA-normalized before sending, and syntactically invalid
+ones are skipped without an SMTP round trip.
+
+Pass ``--suppression-file`` to skip addresses listed in that file and to
+append every address that hard-bounces (permanent 5xx reply) to it, so dead
+addresses stop consuming relay capacity on later runs.
+
+Pass ``--list-unsubscribe`` with one or more comma-separated ``mailto:`` or
+``https://`` targets to add a ``List-Unsubscribe`` header to every message.
+When ``UNSUBSCRIBE_SECRET`` is set, https targets are made per-recipient
+(``e=<address>&t=<HMAC-SHA256 signature>`` is appended) and the RFC 8058
+``List-Unsubscribe-Post`` one-click header is added as well. The endpoint
+behind those URLs is yours to run (the dashboard's ``/unsubscribe`` takes a
+different token); it must check each request with
+``verify_address_signature`` before opting the address out.
+
+Pass ``--interleave-domains`` to send round-robin across recipient domains
+rather than in file order, so no provider receives a long back-to-back run.
+
+Pass ``--profile N`` to run the first N sends under ``cProfile``; the
+combined statistics are written in pstats format to ``--profile-out``
+(default ``smtp_bulk_mailer.pstats``) and can be inspected with
+``python -m pstats`` or snakeviz.
+
 Note: To comply with bulk email best practices, ensure that your
 recipients have opted in to receive your emails and that your SMTP
 provider allows sending in bulk. Adjust the delay as needed to stay
 within rate limits and to avoid triggering spam filters.
 """
 
+import base64
 import csv
+import hashlib
+import hmac
 import os
 import time
 import ssl
 import smtplib
 import argparse
+import cProfile
 from email.message import EmailMessage
+from urllib.parse import urlencode
+
+from app.services.bounces import HARD, classify_smtp_reply
+
+try:
+    from app.services.addresses import InvalidAddress, normalize_address
+except ImportError:  # email-validator not installed: send addresses as given
+    InvalidAddress = ValueError
+    normalize_address = None
+
+
+def load_suppressions(path: str) -> set:
+    """Read one lower-cased address per line; a missing file is empty."""
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path) as fh:
+        return {line.strip().lower() for line in fh if line.strip()}
+
+
+def _address_key():
+    # Same derivation as the app's per-purpose keys, without importing its settings
+    secret = os.environ.get("UNSUBSCRIBE_SECRET", "")
+    if not secret:
+        return None
+    return hmac.new(secret.encode(), b"key:list-unsubscribe", hashlib.sha256).digest()
+
+
+def _address_signature(key: bytes, address: str) -> str:
+    digest = hmac.new(key, address.lower().encode(), hashlib.sha256).digest()[:12]
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+def address_signer():
+    """HMAC signer for recipient addresses, or None without UNSUBSCRIBE_SECRET."""
+    key = _address_key()
+    if key is None:
+        return None
+    return lambda address: _address_signature(key, address)
+
+
+def verify_address_signature(address: str, token: str) -> bool:
+    """Check an ``e``/``t`` pair from a one-click URL built by this script.
+
+    Nothing in this repository serves those URLs: the endpoint behind
+    ``--list-unsubscribe`` must call this (or repeat the computation with the
+    same UNSUBSCRIBE_SECRET) before honouring the opt-out.
+    """
+    key = _address_key()
+    if key is None or not address or not token:
+        return False
+    return hmac.compare_digest(_address_signature(key, address), token)
+
+
+def list_unsubscribe_headers(targets: str, recipient: str = "", sign=None) -> dict:
+    """Build the List-Unsubscribe headers for one recipient.
+
+    With a signer, https targets get the recipient's address and its
+    signature appended as ``e`` and ``t`` query parameters, and only then is
+    the RFC 8058 one-click header added: one-click must not be offered on a
+    URL that does not identify the recipient.
+    """
+    uris = [t.strip() for t in (targets or "").split(",") if t.strip()]
+    if not uris:
+        return {}
+    one_click = bool(sign and recipient)
+    if one_click:
+        params = urlencode({"e": recipient, "t": sign(recipient)})
+        uris = [f"{u}{'&' if '?' in u else '?'}{params}" if u.startswith("https://") else u for u in uris]
+    headers = {"List-Unsubscribe": ", ".join(f"<{u}>" for u in uris)}
+    if one_click and any(u.startswith("https://") for u in uris):
+        headers["List-Unsubscribe-Post"] = "List-Unsubscribe=One-Click"
+    return headers
+
+
+def read_recipients(recipients_file: str, suppressed: set):
+    """Yield normalized, non-suppressed addresses from the first CSV column."""
+    with open(recipients_file, newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        for row in reader:
+            if not row:
+                continue
+            recipient = row[0].strip()
+            if not recipient:
+                continue
+            if normalize_address is not None:
+                try:
+                    recipient = normalize_address(recipient)
+                except InvalidAddress as exc:
+                    print(f"Skipped invalid address {recipient}: {exc}")
+                    continue
+            if recipient.lower() in suppressed:
+                print(f"Skipped suppressed {recipient}")
+                continue
+            yield recipient
+
+
+def interleave_by_domain(recipients) -> list:
+    """Reorder addresses round-robin across destination domains.
+
+    A list heavy in one provider otherwise hits it back to back, which is
+    what triggers its 4xx deferrals.
+    """
+    queues = {}
+    for addr in recipients:
+        queues.setdefault(addr.rpartition("@")[2].lower(), []).append(addr)
+    ordered = []
+    columns = [iter(q) for q in queues.values()]
+    while columns:
+        alive = []
+        for col in columns:
+            addr = next(col, None)
+            if addr is not None:
+                ordered.append(addr)
+                alive.append(col)
+        columns = alive
+    return ordered
+
+
+def classify_send_error(recipient: str, exc: Exception):
+    """Map an smtplib exception to a bounce, or None if it is not one."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        for addr, (code, reply) in exc.recipients.items():
+            return classify_smtp_reply(addr, code, reply)
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return classify_smtp_reply(recipient, exc.smtp_code, exc.smtp_error)
+    return None
 
 
 def send_bulk_emails(
@@ -50,6 +205,11 @@ def send_bulk_emails(
     body: str,
     recipients_file: str,
     delay: float = 1.0,
+    profile_sends: int = 0,
+    profile_out: str = "smtp_bulk_mailer.pstats",
+    suppression_file: str = "",
+    list_unsubscribe: str = "",
+    interleave_domains: bool = False,
 ) -> None:
     """Send a simple text email to a list of recipients.
 
@@ -63,29 +223,60 @@ def send_bulk_emails(
         body: Plain text body of the email.
         recipients_file: Path to a CSV file containing recipient email addresses.
         delay: Seconds to wait between sending messages.
+        profile_sends: Number of initial sends to profile with ``cProfile``.
+        profile_out: Path of the pstats file written when profiling.
+        suppression_file: Addresses to skip; hard bounces are appended to it.
+        list_unsubscribe: Comma-separated mailto:/https:// unsubscribe targets.
+        interleave_domains: Send round-robin across recipient domains.
     """
+    sign = address_signer() if list_unsubscribe else None
+    suppressed = load_suppressions(suppression_file)
+    new_hard_bounces = []
+    profiler = cProfile.Profile() if profile_sends > 0 else None
+    profiled = 0
     context = ssl.create_default_context()
     with smtplib.SMTP_SSL(smtp_server, smtp_port, context=context) as server:
         server.login(username, password)
-        with open(recipients_file, newline='') as csvfile:
-            reader = csv.reader(csvfile)
-            for row in reader:
-                if not row:
-                    continue
-                recipient = row[0].strip()
-                if not recipient:
-                    continue
-                msg = EmailMessage()
-                msg["Subject"] = subject
-                msg["From"] = sender_email
-                msg["To"] = recipient
-                msg.set_content(body)
-                try:
-                    server.send_message(msg)
-                    print(f"Sent to {recipient}")
-                except Exception as exc:
-                    print(f"Failed to send to {recipient}: {exc}")
-                time.sleep(delay)
+        recipients = read_recipients(recipients_file, suppressed)
+        if interleave_domains:
+            recipients = interleave_by_domain(recipients)
+        for recipient in recipients:
+            msg = EmailMessage()
+            msg["Subject"] = subject
+            msg["From"] = sender_email
+            msg["To"] = recipient
+            for name, value in list_unsubscribe_headers(list_unsubscribe, recipient, sign).items():
+                msg[name] = value
+            msg.set_content(body)
+            # The delay is kept outside the profiled region on purpose
+            profiling = profiler is not None and profiled < profile_sends
+            if profiling:
+                profiler.enable()
+            try:
+                server.send_message(msg)
+                print(f"Sent to {recipient}")
+            except Exception as exc:
+                bounce = classify_send_error(recipient, exc)
+                kind = f" ({bounce.kind} bounce)" if bounce else ""
+                print(f"Failed to send to {recipient}{kind}: {exc}")
+                if bounce is not None and bounce.kind == HARD:
+                    suppressed.add(bounce.email)
+                    new_hard_bounces.append(bounce.email)
+            finally:
+                if profiling:
+                    profiler.disable()
+                    profiled += 1
+                    if profiled == profile_sends:
+                        profiler.dump_stats(profile_out)
+                        print(f"Wrote profile of {profiled} sends to {profile_out}")
+            time.sleep(delay)
+    if profiler is not None and 0 < profiled < profile_sends:
+        profiler.dump_stats(profile_out)
+        print(f"Wrote profile of {profiled} sends to {profile_out}")
+    if suppression_file and new_hard_bounces:
+        with open(suppression_file, "a") as fh:
+            fh.writelines(f"{addr}\n" for addr in new_hard_bounces)
+        print(f"Added {len(new_hard_bounces)} hard bounces to {suppression_file}")
 
 
 
@@ -112,6 +303,33 @@ def main() -> None:
         default=float(os.environ.get("EMAIL_DELAY", 1.0)),
         help="Delay between sending emails, in seconds. Defaults to 1."
     )
+    parser.add_argument(
+        "--profile",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Profile the first N sends with cProfile. Disabled by default."
+    )
+    parser.add_argument(
+        "--profile-out",
+        default="smtp_bulk_mailer.pstats",
+        help="Where to write the pstats profile when --profile is set."
+    )
+    parser.add_argument(
+        "--suppression-file",
+        default=os.environ.get("EMAIL_SUPPRESSION_FILE", ""),
+        help="File of addresses to skip; hard bounces are appended to it."
+    )
+    parser.add_argument(
+        "--list-unsubscribe",
+        default=os.environ.get("EMAIL_LIST_UNSUBSCRIBE", ""),
+        help="Comma-separated mailto:/https:// targets for the List-Unsubscribe header."
+    )
+    parser.add_argument(
+        "--interleave-domains",
+        action="store_true",
+        help="Reorder recipients round-robin by domain instead of file order."
+    )
     args = parser.parse_args()
 
     smtp_server = os.environ.get("SMTP_SERVER", "smtp.gmail.com")
@@ -135,6 +353,11 @@ def main() -> None:
         body=args.body,
         recipients_file=args.recipients,
         delay=args.delay,
+        profile_sends=args.profile,
+        profile_out=args.profile_out,
+        suppression_file=args.suppression_file,
+        list_unsubscribe=args.list_unsubscribe,
+        interleave_domains=args.interleave_domains,
     )
 
 